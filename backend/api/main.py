@@ -1,11 +1,38 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, field_validator
 from typing import List, Optional
 
-from backend.rag.pipeline import plan_recipe
-from backend.rag.embeddings import build_ingredient_index, build_recipe_index
+from backend.rag.pipeline import GEN_CONCURRENCY, aplan_recipe, astream_recipe, plan_recipes
+from backend.rag.aio import StageTimeout, run_blocking
+from backend.rag.response_cache import get_response_cache
+from backend.rag.embeddings import rebuild_all
+from backend.rag.jobs import get_job_manager
+from backend.rag import metrics, warmup
+from backend.rag.filters import DIETS, known_diet
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start warming indexes in the background: the process is live at once
+    and reports ready (/health/ready) only when the indexes are hot.
+    """
+    task = None
+    if warmup.WARMUP_ENABLED:
+        task = asyncio.create_task(run_blocking(warmup.warm_up))
+    else:
+        warmup.mark_ready()
+    yield
+    if task is not None and not task.done():
+        task.cancel()
+
 
-app = FastAPI(title="Recipe RAG API (Gemini)")
+app = FastAPI(title="Recipe RAG API (Gemini)", lifespan=lifespan)
 
 
 class GenerateRequest(BaseModel):
@@ -15,28 +42,145 @@ class GenerateRequest(BaseModel):
     allergens: Optional[List[str]] = []
     k_ing: int = 15
     k_rec: int = 8
+    bypass_cache: bool = False  # skip response-cache lookup (the fresh answer is still cached)
+    timings: bool = False       # include a per-stage latency breakdown (ms)
+
+    @field_validator("diet")
+    @classmethod
+    def _known_diet(cls, diet: Optional[str]) -> Optional[str]:
+        if not known_diet(diet):
+            raise ValueError(f"unknown diet {diet!r}; supported: {', '.join(sorted(DIETS))}")
+        return diet
 
 
 @app.post("/generate_recipe")
-def generate_recipe_ep(body: GenerateRequest):
-    out = plan_recipe(
-        user_query=body.query,
-        calories=body.calories,
-        diet=body.diet,
-        allergens=body.allergens or [],
-        k_ing=body.k_ing,
-        k_rec=body.k_rec,
-    )
+async def generate_recipe_ep(body: GenerateRequest):
+    try:
+        out = await aplan_recipe(
+            user_query=body.query,
+            calories=body.calories,
+            diet=body.diet,
+            allergens=body.allergens or [],
+            k_ing=body.k_ing,
+            k_rec=body.k_rec,
+            use_cache=not body.bypass_cache,
+            timings=body.timings,
+        )
+    except StageTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     return out
 
 
-@app.post("/rebuild_indices")
-def rebuild_indices():
-    build_ingredient_index()
-    build_recipe_index()
-    return {"status": "ok"}
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/generate_recipe/stream")
+async def generate_recipe_stream_ep(body: GenerateRequest):
+    """
+    Server-sent events: one `meta` event with the retrieved recipe ids and
+    context, `chunk` events as Gemini produces text, then `done` (or `error`).
+    """
+    async def events():
+        try:
+            async for event, data in astream_recipe(
+                user_query=body.query,
+                calories=body.calories,
+                diet=body.diet,
+                allergens=body.allergens or [],
+                k_ing=body.k_ing,
+                k_rec=body.k_rec,
+                use_cache=not body.bypass_cache,
+                timings=body.timings,
+            ):
+                yield _sse(event, data)
+        except Exception as e:  # headers are already sent; report in-band
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+class BatchGenerateRequest(BaseModel):
+    items: List[GenerateRequest]
+    concurrency: int = GEN_CONCURRENCY
+
+
+@app.post("/generate_recipes")
+async def generate_recipes_ep(body: BatchGenerateRequest):
+    """
+    Batch generation streamed as NDJSON: one line per item, in completion
+    order, each carrying the item's position in `items` as "index".
+    """
+    items = [
+        {"user_query": it.query, "calories": it.calories, "diet": it.diet,
+         "allergens": it.allergens or [], "k_ing": it.k_ing, "k_rec": it.k_rec,
+         "use_cache": not it.bypass_cache}
+        for it in body.items
+    ]
+
+    async def lines():
+        try:
+            async for i, result in plan_recipes(items, body.concurrency):
+                yield json.dumps({"index": i, **result}) + "\n"
+        except Exception as e:  # headers are already sent; report in-band
+            yield json.dumps({"index": None, "error": str(e)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def _rebuild_and_warm(job, force: bool) -> dict:
+    """rebuild_all, then re-run warm-up so a process that was not built (or failed) becomes ready."""
+    out = rebuild_all(force=force, job=job)
+    if warmup.WARMUP_ENABLED:
+        job.report("warm_up")
+        out["warm_up"] = warmup.warm_up()["status"]
+    else:
+        warmup.mark_ready("rebuilt; warm-up disabled")
+    return out
+
+
+@app.post("/rebuild_indices", status_code=202)
+def rebuild_indices(force: bool = False):
+    """Start (or join) a background rebuild; poll /rebuild_indices/{job_id} for progress."""
+    job = get_job_manager().submit("rebuild_indices", lambda j: _rebuild_and_warm(j, force), force=force)
+    return {"job_id": job.id, "status": job.status}
+
+
+@app.get("/rebuild_indices")
+def list_rebuild_jobs():
+    return [job.to_dict() for job in get_job_manager().list()]
+
+
+@app.get("/rebuild_indices/{job_id}")
+def rebuild_job_status(job_id: str):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.to_dict()
+
+
+@app.get("/response_cache/stats")
+def response_cache_stats():
+    cache = get_response_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_ep():
+    """Prometheus scrape endpoint: stage latencies, request/cache counters, prompt and token sizes."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 
 @app.get("/health")
+@app.get("/health/live")
 def health():
-    return {"status": "ok"}
\ No newline at end of file
+    """Liveness: the process is up and serving HTTP."""
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+def ready():
+    """Readiness: 200 once warm-up has loaded and touched the indexes, else 503."""
+    state = warmup.status()
+    return JSONResponse(state, status_code=200 if state["status"] == "ready" else 503)
\ No newline at end of file
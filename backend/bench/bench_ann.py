@@ -0,0 +1,87 @@
+# backend/bench/bench_ann.py
+"""
+Recall@k / latency report: FAISS flat, IVF and HNSW vs exact dense search.
+
+    python -m backend.bench.bench_ann                      # recipe_embeddings from recipes.sqlite
+    python -m backend.bench.bench_ann --synthetic 2000000  # random corpus at full RecipeNLG scale
+"""
+import argparse
+import json
+import time
+import numpy as np
+
+from backend.rag.ann import ann_from_matrix
+from backend.rag.index import VectorIndex, normalize_rows
+from backend.rag.quantize import load_resident_index
+
+
+def _latencies(search, queries, k):
+    times, hits = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        ids, _ = search(q, k)
+        times.append((time.perf_counter() - t0) * 1000)
+        hits.append(ids)
+    return np.array(times), hits
+
+
+def _recall(truth, found, k):
+    return float(np.mean([
+        len(set(t[:k].tolist()) & set(f[:k].tolist())) / max(1, min(k, len(t)))
+        for t, f in zip(truth, found)
+    ]))
+
+
+def run(exact: VectorIndex, n_queries: int = 200, k: int = 10,
+        kinds=("flat", "ivf", "hnsw"), seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    # Queries: perturbed corpus vectors, so neighbourhoods are realistic
+    picks = rng.choice(len(exact), size=min(n_queries, len(exact)), replace=False)
+    queries = exact.matrix[picks] + rng.normal(scale=0.05, size=(len(picks), exact.dim)).astype(np.float32)
+
+    exact_ms, truth = _latencies(exact.search, queries, k)
+    report = [{
+        "kind": "exact", "n": len(exact), "dim": exact.dim, "k": k,
+        "build_s": 0.0, "recall_at_k": 1.0,
+        "p50_ms": float(np.percentile(exact_ms, 50)),
+        "p99_ms": float(np.percentile(exact_ms, 99)),
+    }]
+
+    for kind in kinds:
+        t0 = time.perf_counter()
+        ann = ann_from_matrix(exact.matrix, exact.ids, kind)
+        build_s = time.perf_counter() - t0
+        ms, found = _latencies(ann.search, queries, k)
+        report.append({
+            "kind": ann.kind, "n": len(exact), "dim": exact.dim, "k": k,
+            "build_s": round(build_s, 3),
+            "recall_at_k": round(_recall(truth, found, k), 4),
+            "p50_ms": float(np.percentile(ms, 50)),
+            "p99_ms": float(np.percentile(ms, 99)),
+        })
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--synthetic", type=int, default=0, help="use N random vectors instead of the DB")
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("-k", type=int, default=10)
+    ap.add_argument("--kinds", default="flat,ivf,hnsw")
+    args = ap.parse_args()
+
+    if args.synthetic:
+        rng = np.random.default_rng(42)
+        matrix = normalize_rows(rng.normal(size=(args.synthetic, args.dim)).astype(np.float32))
+        exact = VectorIndex(np.arange(1, args.synthetic + 1), matrix)
+    else:
+        from backend.utils.db import DB_PATH
+        exact = load_resident_index(DB_PATH, "recipe_embeddings", "recipe_id", encoding="float32")
+
+    for row in run(exact, args.queries, args.k, tuple(args.kinds.split(","))):
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
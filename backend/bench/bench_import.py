@@ -0,0 +1,56 @@
+# backend/bench/bench_import.py
+"""
+Cold import time of the API module (what a worker pays before it can
+answer liveness probes), measured in fresh interpreters, plus the slowest
+imports by cumulative time from -X importtime.
+
+    python -m backend.bench.bench_import --runs 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import numpy as np
+
+MODULE = "backend.api.main"
+
+
+def _run(module: str) -> tuple[float, list]:
+    env = {k: v for k, v in os.environ.items() if k != "GOOGLE_API_KEY"}  # must import without a key
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative) / 1000.0, name[1:].rstrip()))  # keep nesting indentation
+    total = next(ms for ms, name in reversed(rows) if name == module)
+    return total, rows
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--module", default=MODULE)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=10)
+    args = ap.parse_args()
+
+    totals, last = [], []
+    for _ in range(args.runs):
+        total, last = _run(args.module)
+        totals.append(total)
+    # Direct imports of the module (one level of nesting): where its start-up time goes
+    top = sorted(((ms, name.strip()) for ms, name in last
+                  if name.startswith("  ") and not name.startswith("    ")), reverse=True)
+    print(json.dumps({
+        "module": args.module, "runs": args.runs,
+        "import_ms_p50": round(float(np.median(totals)), 1),
+        "import_ms_min": round(min(totals), 1),
+        "direct_imports_ms": {name: round(ms, 1) for ms, name in top[:args.top]},
+    }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+# backend/bench/bench_pipeline.py
+"""
+Offline end-to-end benchmark suite. Per corpus scale it generates a
+synthetic database, then reports ingest rows/sec, index build time,
+search_recipes and build_context_for_recipes p50/p99 and /generate_recipe
+throughput under concurrent load. Model APIs are replaced by the fakes in
+backend.bench.fakes (no GOOGLE_API_KEY or network needed). One JSON object
+per line; --out also writes the whole run to a file for comparison.
+
+    python -m backend.bench.bench_pipeline --scales 10000,100000,1000000
+    python -m backend.bench.bench_pipeline --scales 10000 --gen-first-token-ms 300 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+os.environ.setdefault("EMBED_CACHE_PATH", "")  # keep the embedding cache in memory, off the real DB dir
+
+from backend.api.main import app
+from backend.bench.corpus import BASES, DISHES, generate
+from backend.bench.fakes import FakeEmbeddingBackend, FakeGenClient
+from backend.rag import embeddings, pipeline
+from backend.rag.backends import set_embedding_backend
+from backend.rag.context import build_context_for_recipes, clear_snippets
+from backend.rag.filters import Constraints
+from backend.rag.index import reset_index
+from backend.utils import db
+
+DIETS = [None, None, "vegetarian", "vegan", "gluten-free"]
+
+
+def _summary(ms) -> dict:
+    ms = np.asarray(ms, dtype=np.float64)
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p99_ms": round(float(np.percentile(ms, 99)), 3),
+            "mean_ms": round(float(ms.mean()), 3)}
+
+
+def _timed(fn, args_list) -> list:
+    out = []
+    for args in args_list:
+        t0 = time.perf_counter()
+        fn(*args)
+        out.append((time.perf_counter() - t0) * 1000)
+    return out
+
+
+def synthetic_queries(n: int, seed: int = 1) -> list[str]:
+    rng = np.random.default_rng(seed)
+    return [f"{rng.choice(BASES)} {rng.choice(BASES)} {rng.choice(DISHES)}" for _ in range(n)]
+
+
+# -------------------------------------------------------------------
+# Stages
+# -------------------------------------------------------------------
+def use_database(path: Path):
+    """Point the retrieval stack at `path`; indexes, snippets and FAISS files start cold."""
+    db.set_db_path(path)
+    embeddings.INDEX_DIR = path.parent
+    embeddings.POSTINGS_PATH = path.parent / "recipe_ingredients.postings.npz"
+    reset_index()
+    clear_snippets()
+
+
+def bench_index_build() -> dict:
+    t0 = time.perf_counter()
+    ing = embeddings.build_ingredient_index(force=True)
+    ing_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    rec = embeddings.build_recipe_index(force=True)
+    rec_s = time.perf_counter() - t0
+    return {"ingredient_build_s": round(ing_s, 3), "recipe_build_s": round(rec_s, 3),
+            "recipes_embedded_per_s": round(rec.embedded / rec_s, 1) if rec_s else 0.0,
+            "ingredients_embedded": ing.embedded}
+
+
+def bench_search(queries: list[str], k: int) -> dict:
+    q_embs = embeddings.embed_texts(queries)
+    embeddings.get_recipe_index(), embeddings.get_recipe_filters()  # load outside the timings
+    plain = _timed(embeddings.search_recipes, [(q, k, None, e) for q, e in zip(queries, q_embs)])
+    constrained = _timed(embeddings.search_recipes,
+                         [(q, k, Constraints(diet=DIETS[i % len(DIETS)], max_kcal=800), e)
+                          for i, (q, e) in enumerate(zip(queries, q_embs))])
+    return {"search": _summary(plain), "search_constrained": _summary(constrained)}
+
+
+def bench_context(queries: list[str], k: int) -> dict:
+    id_lists = [[r[0] for r in embeddings.search_recipes(q, k)] for q in queries]
+    clear_snippets()
+    cold = _timed(build_context_for_recipes, list(zip(id_lists, queries)))
+    warm = _timed(build_context_for_recipes, list(zip(id_lists, queries)))
+    return {"context_cold": _summary(cold), "context_warm": _summary(warm)}
+
+
+async def _load(queries: list[str], concurrency: int, bypass_cache: bool) -> dict:
+    import httpx
+
+    sem = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(client, i, q):
+        nonlocal errors
+        body = {"query": q, "diet": DIETS[i % len(DIETS)], "bypass_cache": bypass_cache}
+        async with sem:
+            t0 = time.perf_counter()
+            r = await client.post("/generate_recipe", json=body)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            errors += r.status_code != 200
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(client, i, q) for i, q in enumerate(queries)))
+        wall = time.perf_counter() - t0
+    return {"requests": len(queries), "concurrency": concurrency, "errors": errors,
+            "wall_s": round(wall, 3), "requests_per_s": round(len(queries) / wall, 2),
+            **_summary(latencies)}
+
+
+def bench_generate(queries: list[str], concurrency: int, bypass_cache: bool = True) -> dict:
+    return {"generate": asyncio.run(_load(queries, concurrency, bypass_cache))}
+
+
+# -------------------------------------------------------------------
+# Suite
+# -------------------------------------------------------------------
+def run_scale(workdir: Path, n_recipes: int, args) -> dict:
+    path = workdir / f"bench-{n_recipes}.sqlite"
+    row = {"scale": n_recipes, "corpus": generate(path, n_recipes, args.ingredients, seed=args.seed)}
+    use_database(path)
+    row["index"] = bench_index_build()
+    queries = synthetic_queries(args.queries, args.seed + 1)
+    row.update(bench_search(queries, args.k))
+    row.update(bench_context(queries, args.k))
+    if args.requests:
+        row.update(bench_generate(synthetic_queries(args.requests, args.seed + 2), args.concurrency,
+                                  bypass_cache=not args.response_cache))
+    return row
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scales", default="10000,100000,1000000", help="comma-separated recipe counts")
+    ap.add_argument("--ingredients", type=int, default=2000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("-k", type=int, default=8)
+    ap.add_argument("--requests", type=int, default=200, help="/generate_recipe calls per scale; 0 skips")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--response-cache", action="store_true", help="let the load test hit the response cache")
+    ap.add_argument("--embed-dim", type=int, default=768)
+    ap.add_argument("--embed-latency-ms", type=float, default=0.0)
+    ap.add_argument("--gen-first-token-ms", type=float, default=300.0)
+    ap.add_argument("--gen-words-per-s", type=float, default=200.0)
+    ap.add_argument("--workdir", type=Path, default=None, help="keep generated databases here")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", type=Path, default=None, help="also write the run as one JSON document")
+    args = ap.parse_args()
+
+    set_embedding_backend(FakeEmbeddingBackend(args.embed_dim, latency_ms=args.embed_latency_ms))
+    pipeline.set_client(FakeGenClient(args.gen_first_token_ms, args.gen_words_per_s))
+
+    run = {"started_at": time.time(), "python": platform.python_version(), "cpus": os.cpu_count(),
+           "args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+           "results": []}
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as tmp:
+        workdir = args.workdir or Path(tmp)
+        workdir.mkdir(parents=True, exist_ok=True)
+        for n in (int(s) for s in args.scales.split(",") if s):
+            row = run_scale(workdir, n, args)
+            print(json.dumps(row))
+            run["results"].append(row)
+
+    if args.out:
+        args.out.write_text(json.dumps(run, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# backend/bench/bench_quant.py
+"""
+Embedding encodings: resident bytes, latency and recall@k of float16,
+int8 and IVF-PQ against exact float32 search, each with and without
+exact rescoring of the top k * factor candidates.
+
+    python -m backend.bench.bench_quant                      # recipe_embeddings from recipes.sqlite
+    python -m backend.bench.bench_quant --synthetic 500000 --rescore 4
+"""
+import argparse
+import json
+import time
+import numpy as np
+
+from backend.bench.bench_ann import _latencies, _recall
+from backend.rag.ann import ann_from_matrix
+from backend.rag.index import VectorIndex, normalize_rows
+from backend.rag.quantize import QuantizedIndex, RescoringIndex, load_resident_index
+
+
+def _resident_bytes(index) -> int:
+    if isinstance(index, VectorIndex):
+        return index.matrix.nbytes
+    if isinstance(index, QuantizedIndex):
+        return index.nbytes
+    return int(index.index.ntotal * index.index.sa_code_size())  # FAISS codes (excl. lists/centroids)
+
+
+def run(exact: VectorIndex, n_queries: int = 200, k: int = 10,
+        encodings=("float16", "int8", "ivfpq"), rescore: int = 4, seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(exact), size=min(n_queries, len(exact)), replace=False)
+    queries = exact.matrix[picks] + rng.normal(scale=0.05, size=(len(picks), exact.dim)).astype(np.float32)
+
+    def row(name, index, ms, found, build_s=0.0):
+        return {
+            "encoding": name, "n": len(exact), "dim": exact.dim, "k": k,
+            "bytes": _resident_bytes(index),
+            "bytes_per_vector": round(_resident_bytes(index) / max(1, len(exact)), 1),
+            "build_s": round(build_s, 3),
+            "recall_at_k": round(_recall(truth, found, k), 4),
+            "p50_ms": float(np.percentile(ms, 50)),
+            "p99_ms": float(np.percentile(ms, 99)),
+        }
+
+    exact_ms, truth = _latencies(exact.search, queries, k)
+    report = [row("float32", exact, exact_ms, truth)]
+
+    # Rescoring reads float32 vectors from memory here; in service they come from SQLite
+    position = {int(i): r for r, i in enumerate(exact.ids)}
+
+    def vectors(ids):
+        return ids, exact.matrix[[position[int(i)] for i in ids]]
+
+    for enc in encodings:
+        t0 = time.perf_counter()
+        if enc == "ivfpq":
+            index = ann_from_matrix(exact.matrix, exact.ids, "ivfpq")
+        else:
+            index = QuantizedIndex.from_matrix(exact.ids, exact.matrix, enc)
+        build_s = time.perf_counter() - t0
+        ms, found = _latencies(index.search, queries, k)
+        report.append(row(enc, index, ms, found, build_s))
+        if rescore > 0:
+            ms, found = _latencies(RescoringIndex(index, vectors, rescore).search, queries, k)
+            report.append(row(f"{enc}+rescore{rescore}", index, ms, found, build_s))
+    return report
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--synthetic", type=int, default=0, help="use N random vectors instead of the DB")
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("-k", type=int, default=10)
+    ap.add_argument("--encodings", default="float16,int8,ivfpq")
+    ap.add_argument("--rescore", type=int, default=4, help="rescoring over-fetch factor; 0 skips it")
+    args = ap.parse_args()
+
+    if args.synthetic:
+        rng = np.random.default_rng(42)
+        matrix = normalize_rows(rng.normal(size=(args.synthetic, args.dim)).astype(np.float32))
+        exact = VectorIndex(np.arange(1, args.synthetic + 1), matrix)
+    else:
+        from backend.utils.db import DB_PATH
+        exact = load_resident_index(DB_PATH, "recipe_embeddings", "recipe_id", encoding="float32")
+
+    for row in run(exact, args.queries, args.k, tuple(args.encodings.split(",")), args.rescore):
+        print(json.dumps(row))
+
+
+if __name__ == "__main__":
+    main()
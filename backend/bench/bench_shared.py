@@ -0,0 +1,94 @@
+# backend/bench/bench_shared.py
+"""
+Memory per worker process: N processes each search the same embedding
+matrix, either mapped from one shared .vectors file or loaded as a
+private in-process copy (what every uvicorn worker did before). Reports
+RSS, PSS (shared pages split between the processes mapping them) and
+private bytes per worker, from /proc/self/smaps_rollup (Linux).
+
+    python -m backend.bench.bench_shared --synthetic 500000 --workers 1,2,4,8
+    python -m backend.bench.bench_shared --encoding int8
+"""
+import argparse
+import json
+import multiprocessing as mp
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from backend.rag.index import VectorIndex, normalize_rows
+from backend.rag.shared_index import map_shared_index, write_shared_index
+
+TABLE = "bench_embeddings"
+
+
+def _memory_mb() -> dict:
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {"rss_mb": round(fields.get("Rss", 0.0), 1), "pss_mb": round(fields.get("Pss", 0.0), 1),
+            "private_mb": round(fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0), 1)}
+
+
+def _worker(index_dir: str, mode: str, n_queries: int, ready, go, out):
+    _, index = map_shared_index(Path(index_dir), TABLE)
+    if mode == "private":
+        index = VectorIndex(index.ids.copy(), np.array(index.matrix, dtype=np.float32))
+    rng = np.random.default_rng(0)
+    t0 = time.perf_counter()
+    index.search_batch(rng.normal(size=(n_queries, index.dim)).astype(np.float32), 10)
+    search_s = time.perf_counter() - t0
+    ready.release()
+    go.wait()  # measure while every worker still holds its index
+    out.put({**_memory_mb(), "search_s": round(search_s, 3)})
+
+
+def run(index_dir: Path, workers: int, mode: str, n_queries: int) -> dict:
+    ctx = mp.get_context("spawn")
+    ready, go, out = ctx.Semaphore(0), ctx.Event(), ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(str(index_dir), mode, n_queries, ready, go, out))
+             for _ in range(workers)]
+    for p in procs:
+        p.start()
+    for _ in procs:
+        ready.acquire()
+    go.set()
+    rows = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return {"mode": mode, "workers": workers,
+            "rss_mb_per_worker": round(np.mean([r["rss_mb"] for r in rows]), 1),
+            "pss_mb_total": round(sum(r["pss_mb"] for r in rows), 1),
+            "private_mb_total": round(sum(r["private_mb"] for r in rows), 1),
+            "search_s_max": max(r["search_s"] for r in rows)}
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--synthetic", type=int, default=200_000, help="random vectors in the matrix")
+    ap.add_argument("--dim", type=int, default=768)
+    ap.add_argument("--encoding", default="float32", help="float32, float16 or int8 (shared file)")
+    ap.add_argument("--workers", default="1,2,4")
+    ap.add_argument("--queries", type=int, default=32)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(42)
+    matrix = normalize_rows(rng.normal(size=(args.synthetic, args.dim)).astype(np.float32))
+    with tempfile.TemporaryDirectory(prefix="rag-shared-") as tmp:
+        header = write_shared_index(Path(tmp), TABLE, np.arange(1, args.synthetic + 1), matrix,
+                                    version=1, encoding=args.encoding)
+        del matrix
+        print(json.dumps({"file": header._asdict()}))
+        for n in (int(w) for w in args.workers.split(",") if w):
+            modes = ("shared", "private") if args.encoding == "float32" else ("shared",)
+            for mode in modes:
+                print(json.dumps(run(Path(tmp), n, mode, args.queries)))
+
+
+if __name__ == "__main__":
+    main()
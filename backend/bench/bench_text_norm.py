@@ -0,0 +1,66 @@
+# backend/bench/bench_text_norm.py
+"""
+Canonicalization microbenchmark: seconds per million raw ingredient lines
+for canonicalize_name in a loop vs canonicalize_many per method.
+
+    python -m backend.bench.bench_text_norm --lines 1000000 --distinct 50000
+"""
+import argparse
+import json
+import time
+import numpy as np
+
+from backend.utils.text_norm import _canonicalize_cached, canonicalize_many, canonicalize_name
+
+QUANTITIES = ["1", "2", "1/2", "3/4", "100", "1 1/2", ""]
+UNITS = ["cup", "cups", "tbsp", "tsp", "g", "oz", "lb", "c.", "pkg.", ""]
+WORDS = ["fresh", "chopped", "large", "boneless", "sugar", "salt", "flour", "butter", "garlic",
+         "onion", "chicken", "breast", "tomato", "olive", "oil", "lemon", "juice", "rice",
+         "egg", "milk", "cheddar", "cheese", "black", "pepper", "basil", "cream"]
+
+
+def synthetic_lines(n: int, distinct: int, seed: int = 0) -> list[str]:
+    """n ingredient lines drawn (Zipf-skewed, like real recipes) from `distinct` variants."""
+    rng = np.random.default_rng(seed)
+    pool = []
+    for _ in range(distinct):
+        words = rng.choice(WORDS, size=rng.integers(1, 4))
+        pool.append(" ".join([rng.choice(QUANTITIES), rng.choice(UNITS), *words]).strip())
+    ranks = np.minimum(rng.zipf(1.3, size=n), distinct) - 1
+    return [pool[i] for i in ranks]
+
+
+def _time(fn, lines) -> float:
+    t0 = time.perf_counter()
+    fn(lines)
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--lines", type=int, default=1_000_000)
+    ap.add_argument("--distinct", type=int, default=50_000)
+    args = ap.parse_args()
+
+    lines = synthetic_lines(args.lines, args.distinct)
+    expected = [canonicalize_name(x) for x in lines]
+    per_m = 1_000_000 / len(lines)
+
+    runs = {"loop": lambda xs: [canonicalize_name(x) for x in xs]}
+    for method in ("cached", "pandas", "process"):
+        runs[method] = lambda xs, m=method: canonicalize_many(xs, method=m)
+
+    for name, fn in runs.items():
+        _canonicalize_cached.cache_clear()
+        secs = _time(fn, lines)
+        ok = name == "loop" or fn(lines) == expected
+        print(json.dumps({
+            "method": name, "lines": len(lines), "distinct": len(set(lines)),
+            "s_per_million": round(secs * per_m, 3),
+            "lines_per_s": round(len(lines) / secs),
+            "matches_canonicalize_name": ok,
+        }))
+
+
+if __name__ == "__main__":
+    main()
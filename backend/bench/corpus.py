@@ -0,0 +1,171 @@
+# backend/bench/corpus.py
+"""
+Synthetic corpus at configurable scale: fills the schema.sql tables
+(ingredients, nutrients, recipes, recipe_ingredients) with deterministic,
+RecipeNLG-shaped rows, then materializes nutrition and the FTS index the
+way build_db does.
+
+    python -m backend.bench.corpus /tmp/bench.sqlite --recipes 100000
+"""
+import argparse
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from backend.rag.lexical import build_fts
+from backend.utils.nutrition import CAL_ID, CARB_ID, FAT_ID, PROT_ID, build_recipe_nutrition
+
+SCHEMA = Path(__file__).resolve().parents[1] / "db" / "schema.sql"
+CHUNK = 20_000
+
+# Mix of allergen-family terms (so diet filters have something to do) and neutral produce
+BASES = ["chicken", "beef", "pork", "salmon", "shrimp", "tofu", "egg", "cheese", "butter", "milk",
+         "cream", "flour", "pasta", "rice", "potato", "onion", "garlic", "carrot", "celery",
+         "tomato", "spinach", "mushroom", "pepper", "lemon", "lime", "apple", "banana", "honey",
+         "sugar", "salt", "peanut", "almond", "walnut", "sesame", "soy", "basil", "oregano",
+         "cumin", "ginger", "oats", "beans", "lentils", "corn", "zucchini", "broccoli", "yogurt"]
+QUALIFIERS = ["", "fresh", "red", "green", "dried", "ground", "smoked", "sweet", "wild", "baby",
+              "organic", "frozen", "roasted", "whole", "light", "aged"]
+DISHES = ["stew", "soup", "salad", "casserole", "pie", "bake", "stir fry", "curry", "tacos",
+          "pasta", "muffins", "skillet", "bowl", "sandwich", "roast", "cookies"]
+STYLES = ["Easy", "Quick", "Grandma's", "Spicy", "Creamy", "Hearty", "Simple", "Classic",
+          "Weeknight", "Healthy", "Crispy", "Slow Cooker"]
+UNITS = ["c.", "cup", "tbsp", "tsp", "oz", "lb", "g", "can", "pkg.", "clove", ""]
+QTYS = ["1", "2", "1/2", "3/4", "1 1/2", "3", ""]
+STEPS = ["Preheat oven to {t} degrees.", "Chop the {a} and {b}.", "Melt {a} in a large skillet.",
+         "Add {a} and cook for {m} minutes.", "Stir in the {b} until combined.",
+         "Simmer over low heat for {m} minutes.", "Season with {a} to taste.",
+         "Bake for {m} minutes or until golden.", "Whisk {a} with {b} in a bowl.",
+         "Serve warm with {b}."]
+
+
+def create_db(path: Path) -> sqlite3.Connection:
+    """Fresh database with schema.sql applied (an existing file is replaced)."""
+    path = Path(path)
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA.read_text(encoding="utf-8"))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def ingredient_names(n: int) -> list[str]:
+    names = []
+    for q in QUALIFIERS:
+        for b in BASES:
+            names.append(f"{q} {b}".strip())
+    i = 0
+    while len(names) < n:  # past the vocabulary: numbered varieties
+        names.append(f"{BASES[i % len(BASES)]} variety {i // len(BASES) + 1}")
+        i += 1
+    return names[:n]
+
+
+def _insert_ingredients(conn, names: list[str], rng) -> int:
+    nutrients = [(CAL_ID, "Energy", "KCAL"), (PROT_ID, "Protein", "G"),
+                 (FAT_ID, "Total lipid (fat)", "G"), (CARB_ID, "Carbohydrate, by difference", "G")]
+    macros = np.column_stack([rng.uniform(10, 600, len(names)), rng.uniform(0, 30, len(names)),
+                              rng.uniform(0, 40, len(names)), rng.uniform(0, 80, len(names))])
+    with conn:
+        conn.executemany("INSERT INTO nutrients (id, nutrient_id, name, unit_name) VALUES (?, ?, ?, ?)",
+                         [(i, *n) for i, n in enumerate(nutrients, 1)])
+        conn.executemany("INSERT INTO ingredients (id, fdc_id, name, canonical_name, category, data_source) "
+                         "VALUES (?, ?, ?, ?, 'synthetic', 'synthetic')",
+                         [(i, 100000 + i, n.title(), n) for i, n in enumerate(names, 1)])
+        conn.executemany("INSERT INTO ingredient_nutrients (ingredient_id, nutrient_id, amount_per_100g) "
+                         "VALUES (?, ?, ?)",
+                         [(i, j, float(macros[i - 1, j - 1]))
+                          for i in range(1, len(names) + 1) for j in range(1, len(nutrients) + 1)])
+    return len(names) * (1 + len(nutrients))
+
+
+def _recipe_chunk(start_id: int, n: int, names: list[str], rng, lines_mean: float):
+    """(recipes rows, recipe_ingredients rows) for ids start_id .. start_id + n - 1."""
+    # Zipf-skewed ingredient popularity, like real recipes
+    n_lines = np.clip(rng.poisson(lines_mean, n), 2, 25)
+    picks = np.minimum(rng.zipf(1.4, n_lines.sum()), len(names)) - 1
+    qtys = rng.integers(0, len(QTYS), len(picks))
+    units = rng.integers(0, len(UNITS), len(picks))
+    style, dish = rng.integers(0, len(STYLES), n), rng.integers(0, len(DISHES), n)
+    n_steps = rng.integers(3, 9, n)
+    step_ix = rng.integers(0, len(STEPS), n_steps.sum())
+    minutes = rng.integers(5, 90, n_steps.sum())
+
+    recipes, lines = [], []
+    pos = spos = 0
+    for r in range(n):
+        rid = start_id + r
+        ings = [names[i] for i in picks[pos:pos + n_lines[r]]]
+        for j, name in enumerate(ings):
+            raw = " ".join(x for x in (QTYS[qtys[pos + j]], UNITS[units[pos + j]], name) if x)
+            lines.append((rid, raw, name, int(picks[pos + j]) + 1, 100.0))
+        pos += n_lines[r]
+        steps = [STEPS[step_ix[spos + s]].format(t=350, a=ings[s % len(ings)], b=ings[-1 - s % len(ings)],
+                                                m=int(minutes[spos + s]))
+                 for s in range(n_steps[r])]
+        spos += n_steps[r]
+        ner = json.dumps(list(dict.fromkeys(ings)))
+        title = f"{STYLES[style[r]]} {ings[0].title()} {DISHES[dish[r]].title()}"
+        recipes.append((rid, f"synthetic-{rid}", title, json.dumps(steps), ner, ner, "synthetic"))
+    return recipes, lines
+
+
+def generate(path: Path, n_recipes: int, n_ingredients: int = 2000, lines_mean: float = 9.0,
+             seed: int = 0, derived: bool = True) -> dict:
+    """
+    Build a synthetic recipes.sqlite at `path`. Returns timings: ingest
+    rows/sec for the raw tables and, with `derived`, the nutrition and FTS
+    build times.
+    """
+    rng = np.random.default_rng(seed)
+    conn = create_db(path)
+    names = ingredient_names(n_ingredients)
+
+    t0 = time.perf_counter()
+    rows = _insert_ingredients(conn, names, rng)
+    n_lines = 0
+    for start in range(0, n_recipes, CHUNK):
+        recipes, lines = _recipe_chunk(start + 1, min(CHUNK, n_recipes - start), names, rng, lines_mean)
+        with conn:
+            conn.executemany("INSERT INTO recipes (id, source_id, title, text, tags, ner, source) "
+                             "VALUES (?, ?, ?, ?, ?, ?, ?)", recipes)
+            conn.executemany("INSERT INTO recipe_ingredients "
+                             "(recipe_id, raw_ingredient, canonical_ingredient, ingredient_id, match_score) "
+                             "VALUES (?, ?, ?, ?, ?)", lines)
+        n_lines += len(lines)
+    rows += n_recipes + n_lines
+    ingest_s = time.perf_counter() - t0
+    out = {
+        "recipes": n_recipes, "ingredients": n_ingredients, "recipe_ingredients": n_lines,
+        "ingest_s": round(ingest_s, 3), "ingest_rows_per_s": round(rows / ingest_s, 1),
+    }
+
+    if derived:
+        t0 = time.perf_counter()
+        build_recipe_nutrition(conn)
+        out["nutrition_s"] = round(time.perf_counter() - t0, 3)
+        t0 = time.perf_counter()
+        build_fts(conn)
+        out["fts_s"] = round(time.perf_counter() - t0, 3)
+    conn.close()
+    return out
+
+
+def main(argv: Optional[list] = None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("path", type=Path)
+    ap.add_argument("--recipes", type=int, default=10_000)
+    ap.add_argument("--ingredients", type=int, default=2000)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+    print(json.dumps(generate(args.path, args.recipes, args.ingredients, seed=args.seed)))
+
+
+if __name__ == "__main__":
+    main()
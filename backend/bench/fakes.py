@@ -0,0 +1,119 @@
+# backend/bench/fakes.py
+"""
+Deterministic stand-ins for the model APIs, with injectable latency, so
+benchmarks measure our code (and its overlap with network waits) offline.
+"""
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+import numpy as np
+
+from backend.rag.backends import HashingEmbeddingBackend
+
+
+class FakeEmbeddingBackend(HashingEmbeddingBackend):
+    """Hashing embeddings plus a fixed per-call and per-text delay, like a remote API."""
+
+    def __init__(self, dim: int = 768, latency_ms: float = 0.0, per_text_ms: float = 0.0):
+        super().__init__(dim)
+        self.latency_ms = latency_ms
+        self.per_text_ms = per_text_ms
+        self.name = f"fake/hashing-{dim}"
+        self.calls = 0
+
+    def _delay(self, n: int) -> float:
+        return (self.latency_ms + self.per_text_ms * n) / 1000.0
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        self.calls += 1
+        time.sleep(self._delay(len(texts)))
+        return super().embed(texts)
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        self.calls += 1
+        await asyncio.sleep(self._delay(len(texts)))
+        return super().embed(texts)
+
+
+# -------------------------------------------------------------------
+# Generation (mimics the google.genai Client surface the pipeline uses)
+# -------------------------------------------------------------------
+@dataclass
+class FakeUsage:
+    prompt_token_count: int
+    candidates_token_count: int
+    total_token_count: int
+
+
+@dataclass
+class FakeResponse:
+    text: str
+    usage_metadata: Optional[FakeUsage] = None
+
+
+class _FakeModels:
+    def __init__(self, gen: "FakeGenClient"):
+        self._gen = gen
+
+    def generate_content(self, model: str, contents: list) -> FakeResponse:
+        time.sleep(self._gen.total_seconds())
+        return FakeResponse(self._gen.reply(contents), self._gen.usage(contents))
+
+
+class _FakeAsyncModels:
+    def __init__(self, gen: "FakeGenClient"):
+        self._gen = gen
+
+    async def generate_content(self, model: str, contents: list) -> FakeResponse:
+        await asyncio.sleep(self._gen.total_seconds())
+        return FakeResponse(self._gen.reply(contents), self._gen.usage(contents))
+
+    async def generate_content_stream(self, model: str, contents: list):
+        gen = self._gen
+        await asyncio.sleep(gen.first_token_ms / 1000.0)
+
+        async def chunks():
+            words = gen.reply(contents).split(" ")
+            for i in range(0, len(words), gen.words_per_chunk):
+                await asyncio.sleep(gen.words_per_chunk / gen.words_per_s)
+                last = i + gen.words_per_chunk >= len(words)
+                yield FakeResponse(" ".join(words[i:i + gen.words_per_chunk]) + " ",
+                                   gen.usage(contents) if last else None)
+        return chunks()
+
+
+class _FakeAio:
+    def __init__(self, gen: "FakeGenClient"):
+        self.models = _FakeAsyncModels(gen)
+
+
+class FakeGenClient:
+    """
+    Replies with a fixed-length text derived from the prompt hash, after
+    `first_token_ms` plus `reply_words / words_per_s`. Install with
+    pipeline.set_client(FakeGenClient(...)).
+    """
+
+    def __init__(self, first_token_ms: float = 300.0, words_per_s: float = 200.0,
+                 reply_words: int = 250, words_per_chunk: int = 10):
+        self.first_token_ms = first_token_ms
+        self.words_per_s = words_per_s
+        self.reply_words = reply_words
+        self.words_per_chunk = words_per_chunk
+        self.models = _FakeModels(self)
+        self.aio = _FakeAio(self)
+
+    def total_seconds(self) -> float:
+        return self.first_token_ms / 1000.0 + self.reply_words / self.words_per_s
+
+    def usage(self, contents: list) -> FakeUsage:
+        prompt = len(str(contents)) // 4
+        output = int(self.reply_words * 1.3)
+        return FakeUsage(prompt, output, prompt + output)
+
+    def reply(self, contents: list) -> str:
+        seed = hashlib.sha1(str(contents).encode("utf-8")).hexdigest()
+        return " ".join(f"{seed[i % 40]}{i}" for i in range(self.reply_words))
@@ -3,10 +3,12 @@ import sqlite3
 from pathlib import Path
 from normalize_usda import main as build_usda
 from normalize_recipenlg import main as build_nlg
+from link_ingredients import main as link_ingredients
+from backend.utils.nutrition import build_recipe_nutrition
+from backend.utils.db import DB_PATH, connect
+from backend.rag.lexical import build_fts
 
-ROOT_DIR = Path(__file__).resolve().parents[1]
-DB_PATH = "recipes.sqlite"
-SCHEMA  = "schema.sql"
+SCHEMA  = Path(__file__).resolve().parent / "schema.sql"
 
 def main():
     if not Path(DB_PATH).exists():
@@ -20,6 +22,13 @@ def main():
 
     build_usda()
     build_nlg()
+    link_ingredients()
+
+    conn = connect(DB_PATH)
+    n = build_recipe_nutrition(conn)
+    print(f"Materialized nutrition for {n} recipes.")
+    build_fts(conn)
+    conn.close()
     print("DB build complete.")
 
 if __name__ == "__main__":
@@ -0,0 +1,162 @@
+# backend/db/link_ingredients.py
+import argparse
+import time
+from collections import defaultdict
+
+import numpy as np
+import sqlite3
+from rapidfuzz import fuzz, process
+from backend.utils.text_norm import TOKEN_RE
+from backend.db.normalize_recipenlg import INGEST_PRAGMAS
+from backend.utils.db import DB_PATH
+
+SCORE_CUTOFF = 88          # same default as text_norm.fuzzy_match
+QUERY_BLOCK = 1024         # queries per cdist call
+MAX_TOKEN_DF = 0.05        # tokens in >5% of USDA names are too common to block on
+
+
+# -------------------------------------------------------------------
+# Schema
+# -------------------------------------------------------------------
+def ensure_link_columns(conn: sqlite3.Connection):
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(recipe_ingredients)")}
+    if "ingredient_id" not in cols:
+        conn.execute("ALTER TABLE recipe_ingredients ADD COLUMN ingredient_id INTEGER REFERENCES ingredients(id)")
+    if "match_score" not in cols:
+        conn.execute("ALTER TABLE recipe_ingredients ADD COLUMN match_score REAL")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_canonical
+        ON recipe_ingredients(canonical_ingredient)
+    """)
+    # Decision cache: one row per distinct canonical string ever linked
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ingredient_links (
+            canonical_ingredient TEXT PRIMARY KEY,
+            ingredient_id INTEGER,
+            score REAL
+        )
+    """)
+    conn.commit()
+
+
+# -------------------------------------------------------------------
+# Blocking index over USDA canonical names
+# -------------------------------------------------------------------
+def block_tokens(text: str) -> set[str]:
+    """Tokens used for blocking; crude plural folding so "sugar" meets "sugars"."""
+    return {t[:-1] if len(t) > 3 and t.endswith("s") and not t.endswith("ss") else t
+            for t in TOKEN_RE.findall(text)}
+
+
+class TokenBlocker:
+    """Inverted token index: token -> sorted int32 positions into `names`."""
+
+    def __init__(self, ids: list[int], names: list[str]):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.names = names
+        postings = defaultdict(list)
+        for pos, name in enumerate(names):
+            for tok in block_tokens(name):
+                postings[tok].append(pos)
+        self.postings = {t: np.asarray(p, dtype=np.int32) for t, p in postings.items()}
+        self.max_df = max(1, int(MAX_TOKEN_DF * len(names)))
+
+    def block_key(self, query: str):
+        """Rarest indexed token of `query` (preferring tokens under the df cap)."""
+        toks = [t for t in block_tokens(query) if t in self.postings]
+        if not toks:
+            return None
+        rare = [t for t in toks if len(self.postings[t]) <= self.max_df] or toks
+        return min(rare, key=lambda t: (len(self.postings[t]), t))
+
+
+def link_strings(queries: list[str], blocker: TokenBlocker, score_cutoff: int = SCORE_CUTOFF,
+                 workers: int = -1) -> dict[str, tuple[int, float]]:
+    """
+    Best USDA ingredient id per query string. Queries are grouped by block
+    token and each group is scored against that token's candidates with
+    one rapidfuzz cdist call across `workers` threads.
+    """
+    exact = {n: i for i, n in zip(blocker.ids.tolist()[::-1], blocker.names[::-1])}
+    out = {}
+    blocks = defaultdict(list)
+    for q in queries:
+        if q in exact:
+            out[q] = (exact[q], 100.0)
+            continue
+        key = blocker.block_key(q)
+        if key is not None:
+            blocks[key].append(q)
+
+    for key, qs in blocks.items():
+        cand = blocker.postings[key]
+        choices = [blocker.names[p] for p in cand]
+        for i in range(0, len(qs), QUERY_BLOCK):
+            chunk = qs[i:i + QUERY_BLOCK]
+            scores = process.cdist(chunk, choices, scorer=fuzz.WRatio, dtype=np.uint8,
+                                   score_cutoff=score_cutoff, workers=workers)
+            best = scores.argmax(axis=1)
+            best_score = scores[np.arange(len(chunk)), best]
+            for q, b, s in zip(chunk, best.tolist(), best_score.tolist()):
+                if s >= score_cutoff:
+                    out[q] = (int(blocker.ids[cand[b]]), float(s))
+    return out
+
+
+# -------------------------------------------------------------------
+# Job
+# -------------------------------------------------------------------
+def main(relink: bool = False, score_cutoff: int = SCORE_CUTOFF, workers: int = -1):
+    """Link recipe_ingredients.canonical_ingredient -> ingredients.id in one pass."""
+    t0 = time.perf_counter()
+    conn = sqlite3.connect(DB_PATH)
+    for pragma in INGEST_PRAGMAS:
+        conn.execute(pragma)
+    ensure_link_columns(conn)
+
+    rows = conn.execute("""
+        SELECT MIN(id), canonical_name FROM ingredients
+        WHERE canonical_name != '' GROUP BY canonical_name
+    """).fetchall()
+    blocker = TokenBlocker([r[0] for r in rows], [r[1] for r in rows])
+
+    if relink:
+        conn.execute("DELETE FROM ingredient_links")
+    queries = [r[0] for r in conn.execute("""
+        SELECT DISTINCT ri.canonical_ingredient
+        FROM recipe_ingredients ri
+        LEFT JOIN ingredient_links l ON l.canonical_ingredient = ri.canonical_ingredient
+        WHERE ri.canonical_ingredient IS NOT NULL AND ri.canonical_ingredient != ''
+          AND l.canonical_ingredient IS NULL
+    """)]
+    print(f"Linking {len(queries)} distinct ingredient strings against {len(rows)} USDA names...")
+
+    links = link_strings(queries, blocker, score_cutoff, workers)
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO ingredient_links (canonical_ingredient, ingredient_id, score) VALUES (?, ?, ?)",
+            [(q, *links.get(q, (None, None))) for q in queries],
+        )
+        conn.execute("""
+            UPDATE recipe_ingredients
+            SET (ingredient_id, match_score) = (
+                SELECT l.ingredient_id, l.score FROM ingredient_links l
+                WHERE l.canonical_ingredient = recipe_ingredients.canonical_ingredient
+            )
+            WHERE canonical_ingredient IN (SELECT canonical_ingredient FROM ingredient_links)
+        """ + ("" if relink else " AND ingredient_id IS NULL"))
+
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.close()
+    elapsed = time.perf_counter() - t0
+    print(f"Linked {len(links)} / {len(queries)} strings in {elapsed:.1f}s "
+          f"({len(queries) / max(elapsed, 1e-9):,.0f} strings/s).")
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Link recipe ingredients to USDA ingredients")
+    ap.add_argument("--relink", action="store_true", help="discard cached decisions and relink everything")
+    ap.add_argument("--cutoff", type=int, default=SCORE_CUTOFF)
+    ap.add_argument("--workers", type=int, default=-1)
+    args = ap.parse_args()
+    main(relink=args.relink, score_cutoff=args.cutoff, workers=args.workers)
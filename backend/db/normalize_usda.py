@@ -1,73 +1,131 @@
 # backend/db/normalize_usda.py
 import os
+import time
 from pathlib import Path
+from typing import Iterable, Iterator, Union
+
 import pandas as pd
 import sqlite3
-from backend.utils.text_norm import canonicalize_name
+from backend.utils.text_norm import canonicalize_many
+from backend.db.normalize_recipenlg import INGEST_PRAGMAS
+from backend.utils.db import DB_PATH
 
 ROOT_DIR = Path(__file__).resolve().parents[1]
 USDA_DIR = ROOT_DIR / "data" / "usda"
-DB_PATH  = ROOT_DIR / "db" / "recipes.sqlite"
 
 CORE_NUTRIENTS = {1008, 1003, 1004, 1005}  # kcal, protein, fat, carbs
+CHUNK_SIZE = 2_000_000  # food_nutrient rows per chunk (~32 MB with the dtypes below)
+
+FOOD_DTYPES = {"fdc_id": "int64", "data_type": "string", "description": "string"}
+NUTRIENT_DTYPES = {"id": "int64", "name": "string", "unit_name": "string"}
+FOOD_NUTRIENT_DTYPES = {"fdc_id": "int32", "nutrient_id": "int32", "amount": "float64"}
+
+
+# -------------------------------------------------------------------
+# Readers
+# -------------------------------------------------------------------
+def load_food(usda_dir: Path = USDA_DIR) -> pd.DataFrame:
+    return pd.read_csv(os.path.join(usda_dir, "food.csv"),
+                       usecols=list(FOOD_DTYPES), dtype=FOOD_DTYPES)
+
+
+def load_nutrients(usda_dir: Path = USDA_DIR) -> pd.DataFrame:
+    return pd.read_csv(os.path.join(usda_dir, "nutrient.csv"),
+                       usecols=list(NUTRIENT_DTYPES), dtype=NUTRIENT_DTYPES)
+
+
+def iter_food_nutrients(usda_dir: Path = USDA_DIR, chunksize: int = CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Stream food_nutrient.csv, keeping only CORE_NUTRIENTS rows of each chunk."""
+    reader = pd.read_csv(os.path.join(usda_dir, "food_nutrient.csv"),
+                         usecols=list(FOOD_NUTRIENT_DTYPES), dtype=FOOD_NUTRIENT_DTYPES,
+                         chunksize=chunksize)
+    for chunk in reader:
+        chunk = chunk[chunk["nutrient_id"].isin(CORE_NUTRIENTS) & chunk["amount"].notna()]
+        if len(chunk):
+            yield chunk
+
 
 def load_usda_frames():
-    food = pd.read_csv(os.path.join(USDA_DIR, "food.csv"))
-    food_nutrient = pd.read_csv(os.path.join(USDA_DIR, "food_nutrient.csv"))
-    nutrient = pd.read_csv(os.path.join(USDA_DIR, "nutrient.csv"))
-    return food, food_nutrient, nutrient
+    """food, filtered food_nutrient stream, nutrient."""
+    return load_food(), iter_food_nutrients(), load_nutrients()
 
 
+# -------------------------------------------------------------------
+# Writers
+# -------------------------------------------------------------------
 def upsert_ingredients(conn, food_df: pd.DataFrame):
     # Drop rows where description is NaN or empty
     food_df = food_df.dropna(subset=["description"])
 
-    food_df["canonical_name"] = food_df["description"].apply(canonicalize_name)
-    cur = conn.cursor()
-    for _, r in food_df.iterrows():
-        cur.execute("""
+    rows = pd.DataFrame({
+        "fdc_id": food_df["fdc_id"].astype("int64"),
+        "name": food_df["description"].astype(object),
+        "canonical_name": canonicalize_many(food_df["description"].astype(object).tolist()),
+        "category": food_df["data_type"].astype(object).where(food_df["data_type"].notna(), None),
+    })
+    with conn:
+        conn.executemany("""
           INSERT OR IGNORE INTO ingredients (fdc_id, name, canonical_name, category, data_source)
           VALUES (?, ?, ?, ?, 'USDA')
-        """, (int(r.fdc_id), r.description, r.canonical_name, r.data_type))
-    conn.commit()
+        """, rows.itertuples(index=False, name=None))
 
 
 def upsert_nutrients(conn, nutrient_df: pd.DataFrame):
-    cur = conn.cursor()
-    for _, r in nutrient_df.iterrows():
-        cur.execute("""
+    rows = nutrient_df[["id", "name", "unit_name"]].astype({"id": "int64", "name": object, "unit_name": object})
+    with conn:
+        conn.executemany("""
           INSERT OR IGNORE INTO nutrients (nutrient_id, name, unit_name)
           VALUES (?, ?, ?)
-        """, (int(r.id), r.name, r.unit_name))
-    conn.commit()
-
-def upsert_ingredient_nutrients(conn, food_nutrient_df: pd.DataFrame):
-    cur = conn.cursor()
-    fn = food_nutrient_df[food_nutrient_df["nutrient_id"].isin(CORE_NUTRIENTS)]
-    cur.execute("SELECT id, fdc_id FROM ingredients")
-    mapping = {fdc_id: _id for _id, fdc_id in cur.fetchall()}
-    cur.execute("SELECT id, nutrient_id FROM nutrients")
-    nutmap = {nutrient_id: _id for _id, nutrient_id in cur.fetchall()}
-    rows = []
-    for _, r in fn.iterrows():
-        ing_id = mapping.get(int(r.fdc_id))
-        nut_id = nutmap.get(int(r.nutrient_id))
-        if ing_id and nut_id and pd.notnull(r.amount):
-            rows.append((ing_id, nut_id, float(r.amount)))
-    cur.executemany("""
-      INSERT INTO ingredient_nutrients (ingredient_id, nutrient_id, amount_per_100g)
-      VALUES (?, ?, ?)
-    """, rows)
-    conn.commit()
+        """, rows.itertuples(index=False, name=None))
+
+
+def upsert_ingredient_nutrients(conn, food_nutrient: Union[pd.DataFrame, Iterable[pd.DataFrame]]) -> int:
+    """
+    Map (fdc_id, nutrient_id) -> (ingredients.id, nutrients.id) with
+    vectorized joins and bulk-insert, one transaction per chunk.
+    """
+    if isinstance(food_nutrient, pd.DataFrame):
+        food_nutrient = [food_nutrient[food_nutrient["nutrient_id"].isin(CORE_NUTRIENTS)]]
+
+    ing_map = pd.read_sql_query("SELECT id AS ingredient_id, fdc_id FROM ingredients", conn)
+    ing_map = ing_map.set_index("fdc_id")["ingredient_id"]
+    nut_map = pd.read_sql_query("SELECT id AS nut_id, nutrient_id FROM nutrients", conn)
+    nut_map = nut_map.set_index("nutrient_id")["nut_id"]
+
+    total = 0
+    for chunk in food_nutrient:
+        ing_pos = ing_map.index.get_indexer(chunk["fdc_id"])
+        nut_pos = nut_map.index.get_indexer(chunk["nutrient_id"])
+        keep = (ing_pos >= 0) & (nut_pos >= 0) & chunk["amount"].notna().to_numpy()
+        rows = pd.DataFrame({
+            "ingredient_id": ing_map.to_numpy()[ing_pos[keep]],
+            "nutrient_id": nut_map.to_numpy()[nut_pos[keep]],
+            "amount": chunk["amount"].to_numpy()[keep],
+        })
+        with conn:
+            conn.executemany("""
+              INSERT INTO ingredient_nutrients (ingredient_id, nutrient_id, amount_per_100g)
+              VALUES (?, ?, ?)
+            """, rows.itertuples(index=False, name=None))
+        total += len(rows)
+    return total
+
 
 def main():
-    food, food_nutrient, nutrient = load_usda_frames()
+    t0 = time.perf_counter()
     conn = sqlite3.connect(DB_PATH)
+    for pragma in INGEST_PRAGMAS:
+        conn.execute(pragma)
+
+    food = load_food()
     upsert_ingredients(conn, food)
-    upsert_nutrients(conn, nutrient)
-    upsert_ingredient_nutrients(conn, food_nutrient)
+    del food
+    upsert_nutrients(conn, load_nutrients())
+    n = upsert_ingredient_nutrients(conn, iter_food_nutrients())
+
+    conn.execute("PRAGMA synchronous=NORMAL")
     conn.close()
-    print("USDA normalization complete.")
+    print(f"USDA normalization complete ({n} nutrient rows in {time.perf_counter() - t0:.1f}s).")
 
 if __name__ == "__main__":
     main()
@@ -37,6 +37,15 @@ CREATE TABLE recipes (
     ner TEXT
 );
 
+-- Lexical index over recipes (external content; tags holds the NER list).
+-- build_db rebuilds it after the bulk ingest and adds the sync triggers
+-- (backend.rag.lexical.ensure_fts) that keep it current afterwards.
+CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(
+    title, text, tags,
+    content='recipes', content_rowid='id',
+    tokenize='porter unicode61 remove_diacritics 2'
+);
+
 
 CREATE TABLE IF NOT EXISTS recipe_ingredients (
   id INTEGER PRIMARY KEY,
@@ -45,5 +54,20 @@ CREATE TABLE IF NOT EXISTS recipe_ingredients (
   canonical_ingredient TEXT,
   quantity FLOAT,
   unit TEXT,
+  ingredient_id INTEGER,  -- USDA link, filled by link_ingredients.py
+  match_score REAL,
+  FOREIGN KEY (recipe_id) REFERENCES recipes(id),
+  FOREIGN KEY (ingredient_id) REFERENCES ingredients(id)
+);
+
+-- Per-recipe macro estimates, materialized by nutrition.build_recipe_nutrition
+CREATE TABLE IF NOT EXISTS recipe_nutrition (
+  recipe_id INTEGER PRIMARY KEY,
+  kcal REAL,
+  protein_g REAL,
+  fat_g REAL,
+  carb_g REAL,
+  matched_lines INTEGER,
+  total_lines INTEGER,
   FOREIGN KEY (recipe_id) REFERENCES recipes(id)
 );
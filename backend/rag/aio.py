@@ -0,0 +1,64 @@
+# backend/rag/aio.py
+import asyncio
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from .metrics import STAGE_TIMEOUTS, observe_stage
+
+T = TypeVar("T")
+
+# SQLite scans and NumPy scoring run here; network waits stay on the event loop,
+# so in-flight requests are bounded by cores rather than by threads.
+BLOCKING_WORKERS = int(os.getenv("BLOCKING_WORKERS", str(os.cpu_count() or 4)))
+
+# Per-stage timeouts in seconds
+EMBED_TIMEOUT = float(os.getenv("STAGE_TIMEOUT_EMBED", "10"))
+SEARCH_TIMEOUT = float(os.getenv("STAGE_TIMEOUT_SEARCH", "5"))
+CONTEXT_TIMEOUT = float(os.getenv("STAGE_TIMEOUT_CONTEXT", "5"))
+GENERATE_TIMEOUT = float(os.getenv("STAGE_TIMEOUT_GENERATE", "60"))
+
+
+class StageTimeout(Exception):
+    """A pipeline stage exceeded its time budget."""
+
+    def __init__(self, stage: str, seconds: float):
+        super().__init__(f"{stage} timed out after {seconds:g}s")
+        self.stage = stage
+        self.seconds = seconds
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_blocking_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix="rag-blocking")
+    return _executor
+
+
+async def run_blocking(fn: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run CPU/SQLite-bound `fn` on the bounded pool without blocking the
+    event loop, in a copy of the caller's context: the request trace
+    (metrics) sees the stages timed inside `fn`.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(get_blocking_executor(), partial(ctx.run, fn, *args, **kwargs))
+
+
+async def stage(name: str, aw: Awaitable[T], timeout: float) -> T:
+    """Await `aw` with a per-stage timeout, raising StageTimeout(name); the wait is recorded as stage `name`."""
+    t0 = time.perf_counter()
+    try:
+        return await asyncio.wait_for(aw, timeout)
+    except asyncio.TimeoutError:
+        STAGE_TIMEOUTS.inc(name)
+        raise StageTimeout(name, timeout) from None
+    finally:
+        observe_stage(name, time.perf_counter() - t0)
@@ -0,0 +1,215 @@
+# backend/rag/ann.py
+import os
+import numpy as np
+import faiss
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .index import normalize_query, normalize_rows
+
+# -------------------------------------------------------------------
+# Config
+# -------------------------------------------------------------------
+# flat = exact inner product, ivf = inverted lists, ivfpq = inverted lists over
+# product-quantized codes, hnsw = graph; none disables ANN
+ANN_KIND = os.getenv("ANN_INDEX_KIND", "flat").lower()
+IVF_NLIST = int(os.getenv("ANN_IVF_NLIST", "0"))      # 0 -> ~4*sqrt(n)
+IVF_NPROBE = int(os.getenv("ANN_IVF_NPROBE", "16"))
+PQ_M = int(os.getenv("ANN_PQ_M", "0"))                # sub-quantizers (bytes/vector); 0 -> dim/8
+HNSW_M = int(os.getenv("ANN_HNSW_M", "32"))
+HNSW_EF_SEARCH = int(os.getenv("ANN_HNSW_EF_SEARCH", "128"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("ANN_HNSW_EF_CONSTRUCTION", "200"))
+
+TRAIN_PER_CENTROID = 39      # FAISS wants ~39 training points per k-means centroid
+PQ_CENTROIDS = 256           # 8-bit PQ codes: every sub-quantizer trains 256 centroids
+
+
+def index_paths(index_dir: Path, table: str) -> Tuple[Path, Path]:
+    """On-disk FAISS index and its row -> id sidecar for `table`."""
+    index_dir = Path(index_dir)
+    return index_dir / f"{table}.faiss", index_dir / f"{table}.ids.npy"
+
+
+# -------------------------------------------------------------------
+# Build / persist
+# -------------------------------------------------------------------
+def _pq_m(dim: int) -> int:
+    """Largest sub-quantizer count <= the configured one that divides `dim`."""
+    m = min(PQ_M or max(1, dim // 8), dim)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def build_faiss(matrix: np.ndarray, kind: str = ANN_KIND) -> faiss.Index:
+    """
+    Build an inner-product FAISS index over L2-normalized rows. Tables too
+    small to train PQ codebooks (PQ_CENTROIDS * TRAIN_PER_CENTROID rows)
+    get IVF-Flat instead of IVF-PQ.
+    """
+    n, dim = matrix.shape
+    x = np.ascontiguousarray(matrix, dtype=np.float32)
+
+    if kind == "ivfpq" and n < PQ_CENTROIDS * TRAIN_PER_CENTROID:
+        kind = "ivf"
+    if kind in ("ivf", "ivfpq"):
+        nlist = IVF_NLIST or max(1, int(4 * np.sqrt(n)))
+        if n < nlist * TRAIN_PER_CENTROID:
+            nlist = max(1, n // TRAIN_PER_CENTROID)
+        codes = "Flat" if kind == "ivf" else f"PQ{_pq_m(dim)}"
+        index = faiss.index_factory(dim, f"IVF{nlist},{codes}", faiss.METRIC_INNER_PRODUCT)
+        index.train(x)
+    elif kind == "hnsw":
+        index = faiss.index_factory(dim, f"HNSW{HNSW_M},Flat", faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    elif kind == "flat":
+        index = faiss.index_factory(dim, "Flat", faiss.METRIC_INNER_PRODUCT)
+    else:
+        raise ValueError(f"Unknown ANN index kind: {kind}")
+
+    index.add(x)
+    return index
+
+
+def save_ann_index(index_dir: Path, table: str, ids: np.ndarray, matrix: np.ndarray,
+                   kind: str = ANN_KIND) -> Optional[Path]:
+    """Build and atomically write the FAISS index + id sidecar for `table`."""
+    if kind == "none" or len(ids) == 0:
+        return None
+
+    index = build_faiss(matrix, kind)
+    index_path, ids_path = index_paths(index_dir, table)
+    tmp_index = index_path.with_suffix(".faiss.tmp")
+    tmp_ids = ids_path.with_name(ids_path.name + ".tmp")
+
+    faiss.write_index(index, str(tmp_index))
+    with open(tmp_ids, "wb") as f:
+        np.save(f, np.asarray(ids, dtype=np.int64))
+    os.replace(tmp_ids, ids_path)
+    os.replace(tmp_index, index_path)
+    return index_path
+
+
+# -------------------------------------------------------------------
+# Load / search
+# -------------------------------------------------------------------
+class AnnIndex:
+    """FAISS-backed index with the same search() contract as VectorIndex."""
+
+    def __init__(self, index: faiss.Index, ids: np.ndarray, kind: str):
+        self.index = index
+        self.ids = ids
+        self.kind = kind
+        self.set_search_params()
+
+    def __len__(self) -> int:
+        return int(self.index.ntotal)
+
+    @property
+    def dim(self) -> int:
+        return int(self.index.d)
+
+    def set_search_params(self, nprobe: int = IVF_NPROBE, ef_search: int = HNSW_EF_SEARCH):
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            ivf.nprobe = nprobe
+        if hasattr(self.index, "hnsw"):
+            self.index.hnsw.efSearch = ef_search
+
+    def search(self, query_vec: np.ndarray, k: int = 10,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (ids, scores); `mask` (bool per row) is applied inside FAISS via an ID selector."""
+        if len(self) == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        q = normalize_query(query_vec)[None, :]
+        params = None
+        if mask is not None:
+            n_ok = int(mask.sum())
+            if n_ok == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            params = self._filtered_params(mask, n_ok, k)
+        scores, rows = self.index.search(q, min(k, len(self)), params=params)
+        keep = rows[0] >= 0
+        return np.asarray(self.ids[rows[0][keep]]), scores[0][keep]
+
+    def search_batch(self, query_mat: np.ndarray, k: int = 10,
+                     mask: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """search() for many queries sharing one `mask`, in one FAISS call."""
+        q = normalize_rows(np.array(query_mat, dtype=np.float32, copy=True).reshape(len(query_mat), -1))
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        if len(self) == 0 or k <= 0:
+            return [empty] * len(q)
+        params = None
+        if mask is not None:
+            n_ok = int(mask.sum())
+            if n_ok == 0:
+                return [empty] * len(q)
+            params = self._filtered_params(mask, n_ok, k)
+        scores, rows = self.index.search(q, min(k, len(self)), params=params)
+        out = []
+        for s_row, r_row in zip(scores, rows):
+            keep = r_row >= 0
+            out.append((np.asarray(self.ids[r_row[keep]]), s_row[keep]))
+        return out
+
+    def _filtered_params(self, mask: np.ndarray, n_ok: int, k: int):
+        bitmap = np.packbits(mask.astype(bool), bitorder="little")
+        sel = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+        sel.bitmap_ref = bitmap  # keep the buffer alive for the duration of the search
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            # Selective filters empty most lists; probe proportionally more of them
+            boost = max(1.0, min(ivf.nlist / max(ivf.nprobe, 1), len(mask) / n_ok))
+            return faiss.SearchParametersIVF(sel=sel, nprobe=int(min(ivf.nlist, ivf.nprobe * boost)))
+        if hasattr(self.index, "hnsw"):
+            ef = int(min(max(self.index.hnsw.efSearch, k) * len(mask) / n_ok, 4096))
+            return faiss.SearchParametersHNSW(sel=sel, efSearch=max(ef, k))
+        return faiss.SearchParameters(sel=sel)
+
+
+def has_ann_index(index_dir: Path, table: str) -> bool:
+    """A FAISS index and its sidecar are on disk (without reading them)."""
+    return ANN_KIND != "none" and all(p.exists() for p in index_paths(index_dir, table))
+
+
+def _kind_of(index: faiss.Index) -> str:
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return "ivfpq" if isinstance(faiss.downcast_index(ivf), faiss.IndexIVFPQ) else "ivf"
+    return "hnsw" if hasattr(index, "hnsw") else "flat"
+
+
+def load_ann_index(index_dir: Path, table: str, mmap: bool = True) -> Optional[AnnIndex]:
+    """
+    Load a persisted FAISS index, or None. With `mmap`, IO_FLAG_MMAP maps
+    the inverted lists of IVF indexes instead of reading them; Flat and
+    HNSW indexes are still read into memory in full.
+    """
+    if ANN_KIND == "none":
+        return None
+    index_path, ids_path = index_paths(index_dir, table)
+    if not index_path.exists() or not ids_path.exists():
+        return None
+
+    index = None
+    if mmap:
+        try:
+            index = faiss.read_index(str(index_path), faiss.IO_FLAG_MMAP)
+        except RuntimeError:
+            index = None  # index type without mmap support; read it normally
+    if index is None:
+        index = faiss.read_index(str(index_path))
+
+    ids = np.load(ids_path, mmap_mode="r" if mmap else None)
+    if len(ids) != index.ntotal:
+        print(f"ANN sidecar for {table} does not match index ({len(ids)} vs {index.ntotal}); ignoring")
+        return None
+
+    return AnnIndex(index, ids, _kind_of(index))
+
+
+def ann_from_matrix(matrix: np.ndarray, ids: np.ndarray, kind: str) -> AnnIndex:
+    """In-memory AnnIndex (no persistence); used by the recall benchmark."""
+    x = normalize_rows(np.array(matrix, dtype=np.float32, copy=True))
+    index = build_faiss(x, kind)
+    return AnnIndex(index, np.asarray(ids, dtype=np.int64), _kind_of(index))
@@ -0,0 +1,130 @@
+# backend/rag/backends.py
+import hashlib
+import os
+import threading
+import numpy as np
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+from backend.utils.text_norm import TOKEN_RE
+from .aio import run_blocking
+
+
+class EmbeddingBackend(ABC):
+    """Anything that turns a batch of texts into an (n, dim) float32 matrix."""
+
+    # Stored next to each embedding as its model version and used in cache keys
+    name: str = ""
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> np.ndarray:
+        ...
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        """Async variant; backends without native async run embed() on the blocking pool."""
+        return await run_blocking(self.embed, texts)
+
+
+# -------------------------------------------------------------------
+# Gemini
+# -------------------------------------------------------------------
+class GeminiEmbeddingBackend(EmbeddingBackend):
+    def __init__(self, model: str = "models/embedding-001", api_key: Optional[str] = None):
+        import google.generativeai as genai
+
+        api_key = api_key or os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            raise RuntimeError("GOOGLE_API_KEY not found in .env file")
+        genai.configure(api_key=api_key)
+        self._genai = genai
+        self.name = model
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return self._to_matrix(self._genai.embed_content(model=self.name, content=texts))
+
+    async def aembed(self, texts: List[str]) -> np.ndarray:
+        return self._to_matrix(await self._genai.embed_content_async(model=self.name, content=texts))
+
+    @staticmethod
+    def _to_matrix(response) -> np.ndarray:
+        # Single string -> dict with 'embedding'
+        if isinstance(response, dict) and "embedding" in response:
+            return np.atleast_2d(np.array(response["embedding"], dtype=np.float32))
+
+        # Batch -> list of embeddings
+        if isinstance(response, list):
+            embs = []
+            for item in response:
+                if isinstance(item, dict) and "embedding" in item:
+                    embs.append(item["embedding"])
+                elif isinstance(item, list):
+                    embs.append(item)
+                else:
+                    raise RuntimeError(f"Unexpected embedding format: {item}")
+            return np.array(embs, dtype=np.float32)
+
+        raise RuntimeError(f"Unexpected response from Gemini: {response}")
+
+
+# -------------------------------------------------------------------
+# Local, deterministic
+# -------------------------------------------------------------------
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Offline backend: signed feature hashing of word unigrams and character
+    n-grams into a fixed-width vector. Deterministic across processes, so
+    builds, caches and benchmarks behave the same without network access.
+    """
+
+    def __init__(self, dim: int = 768, ngram: int = 3):
+        self.dim = dim
+        self.ngram = ngram
+        self.name = f"local/hashing-{dim}-{ngram}"
+
+    def _features(self, text: str) -> List[str]:
+        words = TOKEN_RE.findall(text.lower())
+        feats = list(words)
+        for w in words:
+            padded = f"#{w}#"
+            feats.extend(padded[i:i + self.ngram] for i in range(max(1, len(padded) - self.ngram + 1)))
+        return feats
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feat in self._features(text):
+                h = int.from_bytes(hashlib.blake2b(feat.encode("utf-8"), digest_size=8).digest(), "little")
+                out[row, h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+# -------------------------------------------------------------------
+# Selection
+# -------------------------------------------------------------------
+_backend: Optional[EmbeddingBackend] = None
+_lock = threading.Lock()
+
+
+def get_embedding_backend() -> EmbeddingBackend:
+    """Process-wide backend chosen by EMBED_BACKEND (gemini | local)."""
+    global _backend
+    if _backend is None:
+        with _lock:
+            if _backend is None:
+                kind = os.getenv("EMBED_BACKEND", "gemini").lower()
+                if kind == "local":
+                    _backend = HashingEmbeddingBackend(int(os.getenv("EMBED_LOCAL_DIM", "768")))
+                elif kind == "gemini":
+                    _backend = GeminiEmbeddingBackend(os.getenv("EMBED_MODEL", "models/embedding-001"))
+                else:
+                    raise ValueError(f"Unknown EMBED_BACKEND: {kind}")
+    return _backend
+
+
+def set_embedding_backend(backend: Optional[EmbeddingBackend]):
+    """Swap the process-wide backend (None -> re-read EMBED_BACKEND on next use)."""
+    global _backend
+    with _lock:
+        _backend = backend
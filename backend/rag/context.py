@@ -1,33 +1,175 @@
 # backend/rag/context.py
-import sqlite3
-from typing import List
-from .embeddings import DB_PATH
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
 
+from backend.utils.db import fetch_recipes
+from backend.utils.text_norm import TOKEN_RE
+
+CONTEXT_TOKENS = int(os.getenv("CONTEXT_TOKENS", "1500"))   # prompt budget for retrieved recipes
+SNIPPET_CACHE_ITEMS = int(os.getenv("SNIPPET_CACHE_ITEMS", "20000"))
+CHARS_PER_TOKEN = 4        # rough English average; no tokenizer round trip
+MAX_TAGS = 12
+NEAR_DUP_JACCARD = 0.8     # steps this similar to one already included are dropped
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+|\n+")
+_STOPWORDS = {"a", "an", "and", "the", "of", "to", "in", "with", "for", "on", "or", "into",
+              "until", "it", "is", "at", "by", "from", "add", "then", "minutes", "minute"}
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _terms(text: str) -> frozenset:
+    return frozenset(t for t in TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS)
+
+
+def _as_list(raw: str) -> List[str]:
+    """RecipeNLG stores directions and NER tags as JSON lists; fall back to sentences."""
+    raw = (raw or "").strip()
+    if raw.startswith("["):
+        try:
+            return [str(x).strip() for x in json.loads(raw) if str(x).strip()]
+        except ValueError:
+            pass
+    return [s.strip() for s in _SENTENCE_RE.split(raw) if s.strip()]
+
+
+# -------------------------------------------------------------------
+# Per-recipe snippets (query independent, cached)
+# -------------------------------------------------------------------
+@dataclass(frozen=True)
+class RecipeSnippet:
+    recipe_id: int
+    title: str
+    header: str                 # rendered "Title:" + "Tags:" lines
+    steps: Tuple[str, ...]
+    step_terms: Tuple[frozenset, ...]
+    step_tokens: Tuple[int, ...]
+
+    @classmethod
+    def from_row(cls, row: Tuple) -> "RecipeSnippet":
+        rid, title, text, tags = row
+        title = (title or "").strip()  # recipes.title is nullable
+        tag_list = list(dict.fromkeys(t.lower() for t in _as_list(tags)))[:MAX_TAGS]
+        header = f"Title: {title}\nTags: {', '.join(tag_list)}\n"
+        steps = tuple(_as_list(text))
+        return cls(rid, title, header, steps,
+                   tuple(_terms(s) for s in steps),
+                   tuple(estimate_tokens(s) + 1 for s in steps))
+
+
+_snippets: "OrderedDict[int, RecipeSnippet]" = OrderedDict()
+_snippets_lock = threading.Lock()
 
-def build_context_for_recipes(recipe_ids: List[int]) -> str:
-    if not recipe_ids:
-        return ""
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def get_snippets(recipe_ids: List[int]) -> Dict[int, RecipeSnippet]:
+    """Parsed snippets for `recipe_ids`; only cache misses touch SQLite."""
+    out, missing = {}, []
+    with _snippets_lock:
+        for rid in recipe_ids:
+            snip = _snippets.get(rid)
+            if snip is None:
+                missing.append(rid)
+            else:
+                _snippets.move_to_end(rid)
+                out[rid] = snip
+    if missing:
+        rows = fetch_recipes(missing, columns=("COALESCE(title, '')", "COALESCE(text, '')", "COALESCE(tags, '')"))
+        fresh = [RecipeSnippet.from_row(row) for row in rows]
+        with _snippets_lock:
+            for snip in fresh:
+                _snippets[snip.recipe_id] = snip
+                out[snip.recipe_id] = snip
+            while len(_snippets) > SNIPPET_CACHE_ITEMS:
+                _snippets.popitem(last=False)
+    return out
 
-    # Use 'tags' instead of 'meal_tags'
-    query = f"""
-        SELECT title, COALESCE(text, ''), COALESCE(tags, '')
-        FROM recipes
-        WHERE id IN ({','.join('?' * len(recipe_ids))})
+
+def clear_snippets():
+    """Drop cached snippets (after the recipes table changes)."""
+    with _snippets_lock:
+        _snippets.clear()
+
+
+# -------------------------------------------------------------------
+# Budgeted assembly
+# -------------------------------------------------------------------
+def _allocate(n: int, budget: int) -> List[int]:
+    """Split `budget` across ranks with weights 1/(rank+1)."""
+    weights = [1.0 / (r + 1) for r in range(n)]
+    total = sum(weights)
+    return [int(budget * w / total) for w in weights]
+
+
+def _select_steps(snip: RecipeSnippet, query_terms: frozenset, budget: int,
+                  seen: List[frozenset]) -> List[str]:
+    """Most query-relevant, not-yet-seen steps that fit `budget`, in recipe order."""
+    order = sorted(range(len(snip.steps)),
+                   key=lambda i: (-len(snip.step_terms[i] & query_terms), i))
+    chosen, used = [], 0
+    for i in order:
+        terms = snip.step_terms[i]
+        if terms and any(len(terms & s) >= NEAR_DUP_JACCARD * len(terms | s) for s in seen):
+            continue
+        if used + snip.step_tokens[i] > budget:
+            continue
+        chosen.append(i)
+        used += snip.step_tokens[i]
+        seen.append(terms)
+    return [snip.steps[i] for i in sorted(chosen)]
+
+
+def assemble_context(snippets: List[RecipeSnippet], query: str = "", budget: int = CONTEXT_TOKENS) -> str:
+    """
+    Render ranked snippets within `budget` estimated tokens. Higher ranks
+    get a larger share, unused share rolls over to the next recipe, steps
+    are chosen by overlap with the query, and duplicate recipes or
+    near-duplicate steps are skipped.
     """
-    cursor.execute(query, recipe_ids)
-    rows = cursor.fetchall()
-    conn.close()
-
-    parts = []
-    for title, text, tags in rows:
-        part = (
-            f"Title: {title}\n"
-            f"Tags: {tags}\n"
-            f"Method: {text}\n"
-        )
+    query_terms = _terms(query)
+    shares = _allocate(len(snippets), budget)
+    parts, seen_steps, seen_titles = [], [], set()
+    carry = 0
+    for snip, share in zip(snippets, shares):
+        share += carry
+        title_key = " ".join(snip.title.lower().split())
+        if title_key and title_key in seen_titles:  # untitled recipes are never duplicates
+            carry = share
+            continue
+        header_tokens = estimate_tokens(snip.header)
+        if header_tokens > share:
+            carry = share
+            continue
+        steps = _select_steps(snip, query_terms, share - header_tokens, seen_steps)
+        method = " ".join(steps)
+        part = snip.header + f"Method: {method}\n"
+        carry = max(0, share - estimate_tokens(part))
+        seen_titles.add(title_key)
         parts.append(part)
 
     return "\n---\n".join(parts)
+
+
+def build_context_for_recipes(recipe_ids: List[int], query: str = "",
+                              budget: int = CONTEXT_TOKENS) -> str:
+    if not recipe_ids:
+        return ""
+
+    # Snippets come back keyed by id; keep retrieval rank order
+    snippets = get_snippets(recipe_ids)
+    return assemble_context([snippets[rid] for rid in recipe_ids if rid in snippets], query, budget)
+
+
+def build_contexts_for_recipes(id_lists: List[List[int]], queries: Optional[List[str]] = None,
+                               budget: int = CONTEXT_TOKENS) -> List[str]:
+    """build_context_for_recipes() for a batch: each recipe is fetched and parsed once."""
+    snippets = get_snippets(list(dict.fromkeys(rid for ids in id_lists for rid in ids)))
+    queries = queries or [""] * len(id_lists)
+    return [assemble_context([snippets[rid] for rid in ids if rid in snippets], q, budget)
+            for ids, q in zip(id_lists, queries)]
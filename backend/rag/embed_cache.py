@@ -0,0 +1,194 @@
+# backend/rag/embed_cache.py
+import hashlib
+import sqlite3
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+# Disk recency updates are buffered and written this many keys at a time
+TOUCH_BATCH = 256
+
+
+def normalize_text(text: str) -> str:
+    """Cache-key normalization: casefold and collapse whitespace."""
+    return " ".join(text.split()).casefold()
+
+
+def cache_key(model: str, text: str) -> bytes:
+    return hashlib.sha1(f"{model}\0{normalize_text(text)}".encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by sha1(model + normalized text):
+    a bounded in-process LRU in front of an optional SQLite store that
+    survives restarts and is trimmed by total payload size. Disk hits
+    refresh their recency in batches of TOUCH_BATCH, not one write each.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_items: int = 4096,
+                 max_disk_bytes: int = 512 * 1024 * 1024):
+        self.max_items = max_items
+        self.max_disk_bytes = max_disk_bytes
+        self._lru: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._conn = None
+        self._disk_bytes = 0
+        self._touched: Dict[bytes, float] = {}   # disk hits whose last_used is not written yet
+        if path:
+            self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS embedding_cache (
+                    key BLOB PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    vec BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embedding_cache_lru ON embedding_cache(last_used)")
+            self._disk_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embedding_cache"
+            ).fetchone()[0]
+
+    # ---------------------------------------------------------------
+    # Lookup / store
+    # ---------------------------------------------------------------
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        keys = [cache_key(model, t) for t in texts]
+        out: List[Optional[np.ndarray]] = [None] * len(texts)
+        missing: Dict[bytes, List[int]] = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                vec = self._lru.get(key)
+                if vec is not None:
+                    self._lru.move_to_end(key)
+                    self.hits += 1
+                    out[i] = vec
+                else:
+                    missing.setdefault(key, []).append(i)
+
+            if missing and self._conn is not None:
+                found = self._disk_get(list(missing))
+                for key, vec in found.items():
+                    self._lru_put(key, vec)
+                    for i in missing.pop(key):
+                        out[i] = vec
+                        self.disk_hits += 1
+
+            self.misses += sum(len(v) for v in missing.values())
+        return out
+
+    def put_many(self, model: str, texts: List[str], vecs: np.ndarray):
+        rows = []
+        with self._lock:
+            for text, vec in zip(texts, vecs):
+                key = cache_key(model, text)
+                vec = np.array(vec, dtype=np.float32)
+                vec.setflags(write=False)
+                self._lru_put(key, vec)
+                rows.append((key, model, vec.tobytes()))
+            if self._conn is not None and rows:
+                self._disk_put(rows)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "memory_items": len(self._lru),
+            "disk_bytes": self._disk_bytes,
+        }
+
+    def clear_memory(self):
+        with self._lock:
+            self._lru.clear()
+
+    # ---------------------------------------------------------------
+    # Internals (caller holds self._lock)
+    # ---------------------------------------------------------------
+    def _lru_put(self, key: bytes, vec: np.ndarray):
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_items:
+            self._lru.popitem(last=False)
+
+    def _disk_get(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        found = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self._conn.execute(
+                f"SELECT key, vec FROM embedding_cache WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32)
+        now = time.time()
+        self._touched.update((k, now) for k in found)
+        if len(self._touched) >= TOUCH_BATCH:
+            self._flush_touched()
+        return found
+
+    def _flush_touched(self):
+        if not self._touched:
+            return
+        self._conn.execute("BEGIN")
+        self._conn.executemany(
+            "UPDATE embedding_cache SET last_used = ? WHERE key = ?",
+            [(t, k) for k, t in self._touched.items()],
+        )
+        self._conn.execute("COMMIT")
+        self._touched.clear()
+
+    def _disk_put(self, rows):
+        now = time.time()
+        keys = [r[0] for r in rows]
+        old = 0
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            old += self._conn.execute(
+                f"SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embedding_cache WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            ).fetchone()[0]
+        self._conn.execute("BEGIN")
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO embedding_cache (key, model, vec, last_used) VALUES (?, ?, ?, ?)",
+            [(k, m, v, now) for k, m, v in rows],
+        )
+        self._conn.execute("COMMIT")
+        self._disk_bytes += sum(len(r[2]) for r in rows) - old
+        if self._disk_bytes > self.max_disk_bytes:
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used rows until the store is at 90% of its budget."""
+        target = int(self.max_disk_bytes * 0.9)
+        self._flush_touched()  # evict by up-to-date recency
+        self._conn.execute("BEGIN")
+        while self._disk_bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, LENGTH(vec) FROM embedding_cache ORDER BY last_used LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                self._disk_bytes = 0
+                break
+            doomed = []
+            for key, size in rows:
+                if self._disk_bytes <= target:
+                    break
+                doomed.append((key,))
+                self._disk_bytes -= size
+            self._conn.executemany("DELETE FROM embedding_cache WHERE key = ?", doomed)
+        self._conn.execute("COMMIT")
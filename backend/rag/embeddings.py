@@ -1,214 +1,518 @@
 # backend/rag/embeddings.py
 
 import os
-import sqlite3
 import numpy as np
-import google.generativeai as genai
-from typing import List
-from pathlib import Path
+from typing import List, Optional
 from dotenv import load_dotenv
 
+from .index import get_index, reset_index, swap_index
+from .ann import ANN_KIND, has_ann_index, load_ann_index, save_ann_index
+from .postings import IngredientPostings
+from .embed_cache import EmbeddingCache
+from .incremental import IndexSpec, build_embedding_table
+from .backends import get_embedding_backend
+from .aio import run_blocking
+from .filters import Constraints, RecipeFilters
+from .response_cache import get_response_cache
+from .context import clear_snippets
+from .metrics import Collected
+from .lexical import build_fts, ensure_fts, has_fts, rrf_fuse, search_bm25
+from .quantize import compact, load_resident_index, published_version, with_rescoring, write_published_version
+from .shared_index import SHARED_INDEX, VersionWatch, map_shared_index, shared_path, write_shared_index
+from backend.utils import db
+from backend.utils.nutrition import reset_nutrient_matrix
+
 # -------------------------------------------------------------------
 # Setup
 # -------------------------------------------------------------------
-load_dotenv()
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise RuntimeError("GOOGLE_API_KEY not found in .env file")
-
-genai.configure(api_key=GOOGLE_API_KEY)
+load_dotenv()  # GOOGLE_API_KEY / EMBED_BACKEND are read by backend.rag.backends
 
-ROOT_DIR = Path(__file__).resolve().parent.parent  # project root
-DB_PATH = ROOT_DIR / "db" / "recipes.sqlite"
+INDEX_DIR = db.DB_PATH.parent  # FAISS files live next to recipes.sqlite
+POSTINGS_PATH = INDEX_DIR / "recipe_ingredients.postings.npz"
 BATCH_SIZE = 250
+HYBRID_DEPTH = 2  # hybrid search fuses the top k * HYBRID_DEPTH of each ranking
+
+# Query/text embedding cache: in-process LRU + SQLite store ("" disables disk)
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", str(INDEX_DIR / "embedding_cache.sqlite"))
+EMBED_CACHE_ITEMS = int(os.getenv("EMBED_CACHE_ITEMS", "4096"))
+EMBED_CACHE_MAX_MB = int(os.getenv("EMBED_CACHE_MAX_MB", "512"))
+
+
+def _recipe_text(title, text) -> str:
+    return "\n".join(p for p in (title, text) if p).strip()
+
+
+RECIPE_SPEC = IndexSpec("recipe_embeddings", "recipe_id", "recipes", "title, text", _recipe_text)
+INGREDIENT_SPEC = IndexSpec("ingredient_embeddings", "ingredient_id", "ingredients", "canonical_name",
+                            lambda cname: cname or "")
 
 # -------------------------------------------------------------------
 # DB connection
 # -------------------------------------------------------------------
 def _get_conn():
-    return sqlite3.connect(DB_PATH)
+    """Read-write connection for index builds; readers use db.read_conn()."""
+    return db.connect()
 
 # -------------------------------------------------------------------
 # Embedding helper
 # -------------------------------------------------------------------
-def embed_texts(texts: List[str]) -> np.ndarray:
+_cache = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _cache
+    if _cache is None:
+        _cache = EmbeddingCache(
+            EMBED_CACHE_PATH or None,
+            max_items=EMBED_CACHE_ITEMS,
+            max_disk_bytes=EMBED_CACHE_MAX_MB * 1024 * 1024,
+        )
+    return _cache
+
+
+def _embedding_cache_stats() -> dict:
+    return _cache.stats() if _cache is not None else {}
+
+
+def _response_cache_stats() -> dict:
+    cache = get_response_cache()
+    return cache.stats() if cache is not None else {}
+
+
+Collected("rag_embedding_cache_lookups_total", "Query embedding cache lookups by tier.", "counter",
+          ("result",), lambda: {(k,): v for k, v in _embedding_cache_stats().items()
+                                if k in ("memory_hits", "disk_hits", "misses")})
+Collected("rag_embedding_cache_disk_bytes", "Payload bytes in the embedding cache's SQLite store.", "gauge",
+          (), lambda: {(): v for k, v in _embedding_cache_stats().items() if k == "disk_bytes"})
+Collected("rag_response_cache_lookups_total", "Response cache lookups by outcome.", "counter",
+          ("result",), lambda: {(k,): v for k, v in _response_cache_stats().items()
+                                if k in ("exact_hits", "semantic_hits", "misses")})
+Collected("rag_response_cache_removals_total", "Response cache entries dropped, by reason.", "counter",
+          ("reason",), lambda: {(k,): v for k, v in _response_cache_stats().items()
+                                if k in ("expired", "evictions")})
+Collected("rag_response_cache_items", "Entries held by the response cache.", "gauge",
+          (), lambda: {(): v for k, v in _response_cache_stats().items() if k == "items"})
+
+
+def embed_texts(texts: List[str], use_cache: bool = True) -> np.ndarray:
     """
-    Embed one or more texts using Gemini embeddings.
-    Returns a NumPy array of shape (n, dim).
+    Embed one or more texts with the configured EmbeddingBackend.
+    Returns a NumPy array of shape (n, dim). Cached texts (same model and
+    normalized text) skip the backend; only the distinct misses are sent.
     """
-    model = "models/embedding-001"
+    backend = get_embedding_backend()
     if isinstance(texts, str):
         texts = [texts]
+    if not use_cache:
+        return backend.embed(texts)
 
-    response = genai.embed_content(model=model, content=texts)
+    cache = get_embedding_cache()
+    cached = cache.get_many(backend.name, texts)
+    todo = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+    if todo:
+        fresh = dict(zip(todo, backend.embed(todo)))
+        cache.put_many(backend.name, todo, [fresh[t] for t in todo])
+        cached = [v if v is not None else fresh[t] for t, v in zip(texts, cached)]
+    return np.stack(cached).astype(np.float32, copy=False)
 
-    # Single string -> dict with 'embedding'
-    if isinstance(response, dict) and "embedding" in response:
-        return np.array(response["embedding"], dtype=np.float32)
 
-    # Batch -> list of embeddings
-    if isinstance(response, list):
-        embs = []
-        for item in response:
-            if isinstance(item, dict) and "embedding" in item:
-                embs.append(item["embedding"])
-            elif isinstance(item, list):
-                embs.append(item)
-            else:
-                raise RuntimeError(f"Unexpected embedding format: {item}")
-        return np.array(embs, dtype=np.float32)
+def embed_documents(texts: List[str]) -> np.ndarray:
+    """
+    Embedder for index builds: straight to the backend. Corpus texts are
+    embedded once per content change, and caching them would evict the
+    query embeddings the cache is there to keep.
+    """
+    return embed_texts(texts, use_cache=False)
+
 
-    raise RuntimeError(f"Unexpected response from Gemini: {response}")
+async def aembed_texts(texts: List[str], use_cache: bool = True) -> np.ndarray:
+    """embed_texts() for the async request path: cache I/O on the blocking pool, backend awaited."""
+    backend = get_embedding_backend()
+    if isinstance(texts, str):
+        texts = [texts]
+    if not use_cache:
+        return await backend.aembed(texts)
+
+    cache = get_embedding_cache()
+    cached = await run_blocking(cache.get_many, backend.name, texts)
+    todo = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+    if todo:
+        fresh = dict(zip(todo, await backend.aembed(todo)))
+        await run_blocking(cache.put_many, backend.name, todo, [fresh[t] for t in todo])
+        cached = [v if v is not None else fresh[t] for t, v in zip(texts, cached)]
+    return np.stack(cached).astype(np.float32, copy=False)
 
 # -------------------------------------------------------------------
-# Ingredient index
+# Index loading / persistence
 # -------------------------------------------------------------------
-def build_ingredient_index():
-    conn = _get_conn()
-    cur = conn.cursor()
-
-    # Create embeddings table
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS ingredient_embeddings (
-            ingredient_id INTEGER PRIMARY KEY,
-            embedding BLOB,
-            FOREIGN KEY(ingredient_id) REFERENCES ingredients(id)
-        )
-    """)
-    conn.commit()
-
-    # Fetch all ingredients
-    cur.execute("SELECT id, canonical_name FROM ingredients")
-    rows = cur.fetchall()
-    total = len(rows)
-    if total == 0:
-        print("No ingredients found in DB")
-        return
+def _serve_shared() -> bool:
+    """Exact search (ANN kind flat / none) is served from the shared memory-mapped matrix."""
+    return SHARED_INDEX and ANN_KIND in ("flat", "none")
+
+
+_published = VersionWatch()
 
-    print(f"Rebuilding ingredient index for {total} ingredients...")
 
-    for i in range(0, total, BATCH_SIZE):
-        batch = rows[i:i+BATCH_SIZE]
-        texts = []
-        ids = []
-        for ing_id, cname in batch:
-            if cname:
-                texts.append(cname)
-                ids.append(ing_id)
+def _published_version(table: str) -> int:
+    return published_version(db.read_conn(), table)
 
-        if not texts:
-            continue
 
-        try:
-            embs = embed_texts(texts)
-        except Exception as e:
-            print(f"Embedding failed on batch {i}-{i+len(batch)}: {e}")
-            continue
+def _map_shared(table: str):
+    mapped = map_shared_index(INDEX_DIR, table)
+    return None if mapped is None else mapped[1]
 
-        for ing_id, emb in zip(ids, embs):
-            cur.execute("""
-                INSERT OR REPLACE INTO ingredient_embeddings (ingredient_id, embedding)
-                VALUES (?, ?)
-            """, (ing_id, emb.tobytes()))
 
-        conn.commit()
-        print(f"Processed {i + len(batch)} / {total} ingredients")
+def _load_index(table: str, id_col: str):
+    """
+    Shared matrix file for exact search, else a persisted FAISS index,
+    else the SQLite-backed resident matrix.
+    """
+    # Version read before loading: a publish racing this load is picked up by the next check
+    _published.loaded(table, _published_version(table))
+    index = _map_shared(table) if _serve_shared() else None
+    if index is None:
+        index = load_ann_index(INDEX_DIR, table) or load_resident_index(db.DB_PATH, table, id_col)
+    return with_rescoring(index, table, id_col)
+
 
+def _refresh_if_republished():
+    """
+    Another process published a rebuilt index: drop the stale embedding
+    indexes and everything derived from the same tables (filters,
+    postings), so they reload together, and the snippet / response caches
+    grounded in the old data.
+    """
+    stale = [spec.table for spec in (INGREDIENT_SPEC, RECIPE_SPEC)
+             if _published.changed(spec.table, lambda t=spec.table: _published_version(t))]
+    if not stale:
+        return
+    for table in stale + ["recipe_filters", "recipe_ingredients"]:
+        reset_index(table)
+    clear_snippets()
+    if get_response_cache() is not None:
+        get_response_cache().clear()
+    print(f"Reloading indexes published by another process: {', '.join(stale)}")
+
+
+def _is_published(table: str) -> bool:
+    if _serve_shared():
+        return shared_path(INDEX_DIR, table).exists()
+    return has_ann_index(INDEX_DIR, table)
+
+
+def _publish_ann_index(table: str, id_col: str) -> int:
+    """
+    Snapshot a freshly built embedding table, write the shared matrix file
+    (exact search) or the FAISS index + id sidecar (atomic rename), then
+    swap the resident index in one step so searches never load or see a
+    half-built one. Returns the new version; other worker processes reload
+    once _mark_published records it.
+    """
+    version = _published_version(table) + 1
+    dense = load_resident_index(db.DB_PATH, table, id_col, encoding="float32")
+    if _serve_shared():
+        header = write_shared_index(INDEX_DIR, table, dense.ids, dense.matrix, version)
+        print(f"Wrote shared index {shared_path(INDEX_DIR, table)} v{header.version} "
+              f"({header.count} vectors, {header.dtype})")
+        index = _map_shared(table)
+    else:
+        path = save_ann_index(INDEX_DIR, table, dense.ids, dense.matrix)
+        if path:
+            print(f"Wrote ANN index {path} ({len(dense)} vectors)")
+        index = load_ann_index(INDEX_DIR, table) or compact(dense)
+    swap_index(table, with_rescoring(index, table, id_col))
+    return version
+
+
+def _mark_published(table: str, version: int):
+    """Record `version` in embedding_meta once the index and its derived state are on disk."""
+    conn = _get_conn()
+    write_published_version(conn, table, version)
+    conn.close()
+    _published.loaded(table, version)
+
+def _load_postings() -> IngredientPostings:
+    postings = IngredientPostings.load(POSTINGS_PATH)
+    if postings is not None:
+        return postings
+    return IngredientPostings.from_db(db.read_conn())
+
+# -------------------------------------------------------------------
+# Ingredient index
+# -------------------------------------------------------------------
+def build_ingredient_postings():
+    """Precompute the canonical ingredient -> recipe ids inverted index."""
+    postings = IngredientPostings.from_db(db.read_conn())
+    postings.save(POSTINGS_PATH)
+    swap_index("recipe_ingredients", postings)
+    swap_index("recipe_filters", _load_filters())
+    print(f"Wrote ingredient postings for {len(postings)} terms "
+          f"({len(postings.postings)} recipe links)")
+
+
+def build_ingredient_index(force: bool = False, progress=None):
+    """Embed new/changed ingredient names; `force` re-embeds everything."""
+    conn = _get_conn()
+    stats = build_embedding_table(conn, INGREDIENT_SPEC, embed_documents, get_embedding_backend().name,
+                                  batch_size=BATCH_SIZE, force=force, label="ingredients",
+                                  progress=progress)
     conn.close()
+    version = None
+    if stats.changed or not _is_published(INGREDIENT_SPEC.table):
+        version = _publish_ann_index(INGREDIENT_SPEC.table, INGREDIENT_SPEC.id_col)
+    build_ingredient_postings()
+    if version:
+        _mark_published(INGREDIENT_SPEC.table, version)
     print("Ingredient index rebuild complete!")
+    return stats
 
 # -------------------------------------------------------------------
 # Recipe index
 # -------------------------------------------------------------------
-def build_recipe_index():
+def build_recipe_index(force: bool = False, progress=None):
+    """Embed new/changed recipes; `force` re-embeds everything."""
+    conn = _get_conn()
+    stats = build_embedding_table(conn, RECIPE_SPEC, embed_documents, get_embedding_backend().name,
+                                  batch_size=BATCH_SIZE, force=force, label="recipes",
+                                  progress=progress)
+    conn.close()
+    version = None
+    if stats.changed or not _is_published(RECIPE_SPEC.table):
+        version = _publish_ann_index(RECIPE_SPEC.table, RECIPE_SPEC.id_col)
+    swap_index("recipe_filters", _load_filters())
+    if version:
+        _mark_published(RECIPE_SPEC.table, version)
+    print("Recipe index rebuild complete!")
+    return stats
+
+
+def rebuild_all(force: bool = False, job=None) -> dict:
+    """Ingredient then recipe rebuild; `job` (backend.rag.jobs.Job) receives progress."""
+    def tracker(stage):
+        if job is None:
+            return None
+        return lambda stats, total: job.report(
+            stage, total=total, scanned=stats.scanned, embedded=stats.embedded,
+            unchanged=stats.unchanged, failed=len(stats.failed))
+
+    out = {}
+    for name, build in (("ingredients", build_ingredient_index), ("recipes", build_recipe_index)):
+        stats = build(force=force, progress=tracker(name))
+        out[name] = {"embedded": stats.embedded, "unchanged": stats.unchanged,
+                     "deleted": stats.deleted, "failed": len(stats.failed)}
+    out["status"] = "incomplete" if any(v["failed"] for v in out.values()) else "ok"
     conn = _get_conn()
-    cur = conn.cursor()
+    if ensure_fts(conn):  # new or pre-trigger FTS table: catch up once, triggers keep it current
+        out["fts"] = build_fts(conn)
+    conn.close()
+    reset_nutrient_matrix()
+    clear_snippets()
+    if get_response_cache() is not None:
+        get_response_cache().clear()  # answers were grounded in the old indexes
+    return out
 
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS recipe_embeddings (
-            recipe_id INTEGER PRIMARY KEY,
-            embedding BLOB,
-            FOREIGN KEY(recipe_id) REFERENCES recipes(id)
-        )
-    """)
-    conn.commit()
-
-    # Only include useful columns
-    cur.execute("SELECT id, title, text FROM recipes")
-    rows = cur.fetchall()
-    total = len(rows)
-    if total == 0:
-        print("No recipes found in DB")
-        return
 
-    print(f"Rebuilding recipe index for {total} recipes...")
-
-    for i in range(0, total, BATCH_SIZE):
-        batch = rows[i:i+BATCH_SIZE]
-        texts = []
-        ids = []
-        for recipe_id, title, text in batch:
-            parts = []
-            if title:
-                parts.append(title)
-            if text:
-                parts.append(text)
-            full_text = "\n".join(parts).strip()
-            if full_text:
-                texts.append(full_text)
-                ids.append(recipe_id)
-
-        if not texts:
-            continue
-
-        try:
-            embs = embed_texts(texts)
-        except Exception as e:
-            print(f"Embedding failed on batch {i}-{i+len(batch)}: {e}")
-            continue
-
-        for recipe_id, emb in zip(ids, embs):
-            cur.execute("""
-                INSERT OR REPLACE INTO recipe_embeddings (recipe_id, embedding)
-                VALUES (?, ?)
-            """, (recipe_id, emb.tobytes()))
-
-        conn.commit()
-        print(f"Processed {i + len(batch)} / {total} recipes")
+def missing_index_tables() -> List[str]:
+    """Embedding tables not created yet (fresh database, rebuild never run)."""
+    conn = db.read_conn()
+    return [spec.table for spec in (INGREDIENT_SPEC, RECIPE_SPEC)
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?",
+                            (spec.table,)).fetchone() is None]
 
-    conn.close()
-    print("Recipe index rebuild complete!")
 
+def get_recipe_index():
+    """Resident recipe embedding matrix: loaded once per process, reloaded after a rebuild."""
+    _refresh_if_republished()
+    return get_index(RECIPE_SPEC.table, lambda: _load_index(RECIPE_SPEC.table, RECIPE_SPEC.id_col))
 
-def search_recipes(query: str, k: int = 10):
-    """Return top-k recipes by embedding similarity (with names instead of IDs)."""
-    conn = _get_conn()
-    cur = conn.cursor()
-    cur.execute("""
-        SELECT r.id, r.title, r.text, e.embedding
-        FROM recipe_embeddings e
-        JOIN recipes r ON r.id = e.recipe_id
-    """)
-    rows = cur.fetchall()
-    conn.close()
 
-    # Convert query to embedding
-    q_emb = embed_texts(query).astype(np.float32)
+def _load_filters() -> RecipeFilters:
+    filters = RecipeFilters.from_db(db.read_conn())
+    # Allergens outside the families match ingredient names; postings resolve lazily
+    # (not inside this loader: the registry lock is held here)
+    filters.term_recipes = lambda text: get_ingredient_postings().recipes_mentioning(text)
+    return filters
+
+
+def get_recipe_filters() -> RecipeFilters:
+    """Resident diet/allergen bitsets and per-serving kcal for every recipe."""
+    _refresh_if_republished()
+    return get_index("recipe_filters", _load_filters)
+
+
+def search_recipes(query: str, k: int = 10, constraints: Optional[Constraints] = None,
+                   q_emb: Optional[np.ndarray] = None):
+    """
+    Return top-k recipes by embedding similarity as
+    (recipe_id, title, text, score) tuples, best first. With `constraints`,
+    inadmissible recipes are excluded inside the search, so k results
+    come back whenever k admissible recipes exist. Pass `q_emb` to reuse
+    an already computed query embedding.
+    """
+    index = get_recipe_index()
+    if len(index) == 0:
+        return []
+
+    mask = None
+    if constraints is not None and constraints.active:
+        mask = get_recipe_filters().mask_for(index.ids, constraints)
+
+    if q_emb is None:
+        q_emb = embed_texts(query)
+    ids, scores = index.search(q_emb, k, mask=mask)
+    if len(ids) == 0:
+        return []
+
+    # Fetch text only for the winners, keeping rank order
+    rows = db.fetch_recipes(ids.tolist(), columns=("title", "text"))
+    score_of = dict(zip(ids.tolist(), scores.tolist()))
+    return [(rid, title, text, score_of[rid]) for rid, title, text in rows]
+
 
-    # Compute cosine similarity
-    results = []
-    for recipe_id, title, text, emb_blob in rows:
-        emb = np.frombuffer(emb_blob, dtype=np.float32)
-        sim = np.dot(q_emb, emb) / (np.linalg.norm(q_emb) * np.linalg.norm(emb))
-        results.append((title, text, sim))
+def _recipe_rows(ranked):
+    """[(recipe_id, score)] -> [(recipe_id, title, text, score)] in the same order."""
+    rows = db.fetch_recipes([rid for rid, _ in ranked], columns=("title", "text"))
+    score_of = dict(ranked)
+    return [(rid, title, text, score_of[rid]) for rid, title, text in rows]
 
-    # Sort & return top-k (title + maybe snippet)
-    return sorted(results, key=lambda x: x[2], reverse=True)[:k]
 
+def search_recipes_lexical(query: str, k: int = 10, constraints: Optional[Constraints] = None,
+                           budget_ms: Optional[float] = None):
+    """
+    BM25 search over the recipes FTS index, same result shape as
+    search_recipes(). Needs no embedding call, so it keeps serving when the
+    embedding API is degraded. Returns [] if the FTS table is missing or
+    the query exceeds its latency budget.
+    """
+    conn = db.read_conn()
+    if not has_fts(conn):
+        return []
+    kwargs = {} if budget_ms is None else {"budget_ms": budget_ms}
+    active = constraints is not None and constraints.active
+    hits = search_bm25(conn, query, k * 4 if active else k, **kwargs)
+    if active and hits:
+        ok = get_recipe_filters().admissible(np.array([rid for rid, _ in hits]), constraints)
+        hits = [h for h, keep in zip(hits, ok) if keep]
+    return _recipe_rows(hits[:k])
+
+
+def search_recipes_hybrid(query: str, k: int = 10, constraints: Optional[Constraints] = None,
+                          q_emb: Optional[np.ndarray] = None, vector: Optional[list] = None):
+    """
+    Reciprocal rank fusion of the vector and BM25 rankings (top
+    k * HYBRID_DEPTH of each); exact-term queries the embedding misses
+    still surface. Scores are RRF scores. `vector` is a precomputed
+    search_recipes() ranking at that depth (batch planning).
+    """
+    depth = HYBRID_DEPTH * k
+    if vector is None:
+        vector = search_recipes(query, depth, constraints, q_emb)
+    lexical = search_recipes_lexical(query, depth, constraints)
+    fused = rrf_fuse([[r[0] for r in vector], [r[0] for r in lexical]])[:k]
+    rows = {r[0]: r for r in lexical + vector}
+    return [(rid, rows[rid][1], rows[rid][2], score) for rid, score in fused]
+
+
+def get_ingredient_index():
+    _refresh_if_republished()
+    return get_index(INGREDIENT_SPEC.table, lambda: _load_index(INGREDIENT_SPEC.table, INGREDIENT_SPEC.id_col))
+
+
+def get_ingredient_postings() -> IngredientPostings:
+    _refresh_if_republished()
+    return get_index("recipe_ingredients", _load_postings)
+
+
+def match_ingredients(query: str, k: int = 10, q_emb: Optional[np.ndarray] = None):
+    """Top-k canonical ingredients for `query` as (ingredient_id, canonical_name, score)."""
+    index = get_ingredient_index()
+    if len(index) == 0:
+        return []
+
+    if q_emb is None:
+        q_emb = embed_texts(query)
+    ids, scores = index.search(q_emb, k)
+    if len(ids) == 0:
+        return []
+
+    rows = db.fetch_ingredients(ids.tolist(), columns=("canonical_name",))
+    score_of = dict(zip(ids.tolist(), scores.tolist()))
+    return [(iid, name, score_of[iid]) for iid, name in rows]
 
-def search_ingredients(query: str, k: int = 10):
-    # similar approach if you create an ingredient embedding table
-    ...
+
+def search_ingredients(query: str, k: int = 10, constraints: Optional[Constraints] = None,
+                       q_emb: Optional[np.ndarray] = None):
+    """
+    Recipes reached through the top-k matched ingredients, as
+    (recipe_id, score) pairs in rank order.
+    """
+    return recipes_for_ingredients(match_ingredients(query, k, q_emb), k, constraints)
+
+
+def recipes_for_ingredients(matches, k: int = 10, constraints: Optional[Constraints] = None):
+    """Map match_ingredients() output to ranked (recipe_id, score) pairs."""
+    if not matches:
+        return []
+    keep = None
+    if constraints is not None and constraints.active:
+        filters = get_recipe_filters()
+        keep = lambda rids: filters.admissible(rids, constraints)
+    postings = get_ingredient_postings()
+    return postings.score([(name, score) for _, name, score in matches], k, keep=keep)
+
+
+# -------------------------------------------------------------------
+# Batch search (one scoring pass for many queries)
+# -------------------------------------------------------------------
+def _search_batch(index, q_embs: np.ndarray, k: int, constraints: List[Optional[Constraints]]):
+    """Top-k (ids, scores) per query; queries with equal constraints share one mask and one pass."""
+    groups = {}
+    for i, c in enumerate(constraints):
+        key = (c.excluded_bits, c.max_kcal, c.food_allergens) if c is not None and c.active else None
+        groups.setdefault(key, []).append(i)
+    hits = [None] * len(q_embs)
+    for key, members in groups.items():
+        mask = None if key is None else get_recipe_filters().mask_for(index.ids, constraints[members[0]])
+        for i, hit in zip(members, index.search_batch(q_embs[members], k, mask=mask)):
+            hits[i] = hit
+    return hits
+
+
+def search_recipes_batch(q_embs: np.ndarray, k: int = 10,
+                         constraints: Optional[List[Optional[Constraints]]] = None):
+    """
+    search_recipes() for many query embeddings: one matrix-matrix pass per
+    distinct constraint set and one rank-preserving fetch for the union of
+    winners. Returns a (recipe_id, title, text, score) list per query.
+    """
+    index = get_recipe_index()
+    if len(index) == 0 or len(q_embs) == 0:
+        return [[] for _ in range(len(q_embs))]
+
+    hits = _search_batch(index, q_embs, k, constraints or [None] * len(q_embs))
+    wanted = list(dict.fromkeys(rid for ids, _ in hits for rid in ids.tolist()))
+    rows = {r[0]: r[1:] for r in db.fetch_recipes(wanted, columns=("title", "text"))}
+    return [[(rid, *rows[rid], score) for rid, score in zip(ids.tolist(), scores.tolist()) if rid in rows]
+            for ids, scores in hits]
+
+
+def search_ingredients_batch(q_embs: np.ndarray, k: int = 10,
+                             constraints: Optional[List[Optional[Constraints]]] = None):
+    """search_ingredients() for many query embeddings; one (recipe_id, score) list per query."""
+    index = get_ingredient_index()
+    if len(index) == 0 or len(q_embs) == 0:
+        return [[] for _ in range(len(q_embs))]
+
+    constraints = constraints or [None] * len(q_embs)
+    hits = index.search_batch(q_embs, k)
+    wanted = list(dict.fromkeys(iid for ids, _ in hits for iid in ids.tolist()))
+    names = dict(db.fetch_ingredients(wanted, columns=("canonical_name",)))
+    return [
+        recipes_for_ingredients(
+            [(iid, names[iid], score) for iid, score in zip(ids.tolist(), scores.tolist()) if iid in names],
+            k, c)
+        for (ids, scores), c in zip(hits, constraints)
+    ]
 
 
 # -------------------------------------------------------------------
@@ -0,0 +1,136 @@
+# backend/rag/executor.py
+import os
+import threading
+import time
+import numpy as np
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "4"))
+EMBED_RPS = float(os.getenv("EMBED_RPS", "10"))        # batches per second, 0 = unlimited
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens/second, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+                self._stamp = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait_s = (tokens - self._tokens) / self.rate
+            time.sleep(wait_s)
+
+
+def is_retryable(exc: Exception) -> bool:
+    """Quota / rate-limit / transient transport errors are worth backing off on."""
+    name = type(exc).__name__
+    msg = str(exc).lower()
+    return (
+        name in {"ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+                 "InternalServerError", "TimeoutError", "ConnectionError"}
+        or "429" in msg or "quota" in msg or "rate limit" in msg or "unavailable" in msg
+    )
+
+
+class EmbeddingExecutor:
+    """
+    Keeps several embedding batches in flight on a thread pool, gated by a
+    token-bucket rate limiter, with exponential backoff on quota errors and
+    periodic progress/throughput reporting.
+    """
+
+    def __init__(self, embed: Callable[[List[str]], np.ndarray], max_workers: int = EMBED_WORKERS,
+                 rate_per_sec: float = EMBED_RPS, max_retries: int = EMBED_MAX_RETRIES,
+                 base_delay: float = 1.0, label: str = "texts", report_every: float = 10.0):
+        self.embed = embed
+        self.max_workers = max(1, max_workers)
+        self.bucket = TokenBucket(rate_per_sec)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.label = label
+        self.report_every = report_every
+        self.batches = 0
+        self.texts = 0
+        self.retries = 0
+        self._started = None
+        self._last_report = 0.0
+        self._reported = 0
+
+    def _call(self, texts: List[str]) -> np.ndarray:
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            try:
+                return self.embed(texts)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = self.base_delay * (2 ** attempt) * (1 + 0.25 * np.random.rand())
+                attempt += 1
+                self.retries += 1
+                print(f"Embedding quota/transient error ({e}); retry {attempt} in {delay:.1f}s")
+                time.sleep(delay)
+
+    def map(self, items: Iterable[Tuple[Any, List[str]]]
+            ) -> Iterator[Tuple[Any, Optional[np.ndarray], Optional[Exception]]]:
+        """
+        Embed (tag, texts) items concurrently, yielding (tag, embeddings, error)
+        in completion order. `items` is consumed lazily from the calling thread,
+        with at most 2 * max_workers batches in flight.
+        """
+        self._started = self._started or time.perf_counter()
+        items = iter(items)
+        max_in_flight = 2 * self.max_workers
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="embed") as pool:
+            in_flight = {}
+            exhausted = False
+            while in_flight or not exhausted:
+                while not exhausted and len(in_flight) < max_in_flight:
+                    try:
+                        tag, texts = next(items)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    in_flight[pool.submit(self._call, texts)] = (tag, len(texts))
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    tag, n = in_flight.pop(fut)
+                    err = fut.exception()
+                    if err is None:
+                        self.batches += 1
+                        self.texts += n
+                    yield tag, (fut.result() if err is None else None), err
+                self._report()
+        self._report(force=True)
+
+    def throughput(self) -> float:
+        if not self._started:
+            return 0.0
+        return self.texts / max(1e-9, time.perf_counter() - self._started)
+
+    def _report(self, force: bool = False):
+        now = time.perf_counter()
+        if force or now - self._last_report >= self.report_every:
+            self._last_report = now
+            if self.texts != self._reported:
+                self._reported = self.texts
+                print(f"Embedded {self.texts} {self.label} in {self.batches} batches "
+                      f"({self.throughput():.1f}/s, {self.retries} retries)")
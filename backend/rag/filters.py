@@ -0,0 +1,257 @@
+# backend/rag/filters.py
+import os
+import re
+import sqlite3
+import weakref
+import numpy as np
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from backend.utils.text_norm import TOKEN_RE
+from .metrics import log
+
+# Calorie ceilings are per serving; RecipeNLG has no yields, so assume this many
+RECIPE_SERVINGS = int(os.getenv("RECIPE_SERVINGS", "4"))
+
+# -------------------------------------------------------------------
+# Ingredient families (one bit each)
+# -------------------------------------------------------------------
+FAMILIES: Dict[str, set] = {
+    "meat": {"beef", "pork", "chicken", "turkey", "lamb", "veal", "bacon", "ham", "sausage",
+             "steak", "duck", "venison", "prosciutto", "pepperoni", "salami", "chorizo", "meat",
+             "hamburger", "gelatin", "lard"},
+    "fish": {"fish", "salmon", "tuna", "cod", "tilapia", "halibut", "trout", "anchovy",
+             "anchovies", "sardines", "sardine", "haddock", "catfish", "mackerel", "worcestershire"},
+    "shellfish": {"shrimp", "prawn", "prawns", "crab", "lobster", "clam", "clams", "mussels",
+                  "oyster", "oysters", "scallops", "scallop", "crawfish"},
+    "dairy": {"milk", "cheese", "butter", "cream", "yogurt", "yoghurt", "buttermilk", "whey",
+              "ghee", "mozzarella", "parmesan", "cheddar", "ricotta", "mascarpone", "casein"},
+    "egg": {"egg", "eggs", "mayonnaise", "meringue"},
+    "peanut": {"peanut", "peanuts"},
+    "tree_nut": {"almond", "almonds", "walnut", "walnuts", "pecan", "pecans", "cashew",
+                 "cashews", "pistachio", "pistachios", "hazelnut", "hazelnuts", "macadamia",
+                 "nuts", "nut"},
+    "gluten": {"flour", "wheat", "bread", "breadcrumbs", "pasta", "spaghetti", "noodles",
+               "barley", "rye", "couscous", "crackers", "macaroni", "tortillas", "biscuits"},
+    "soy": {"soy", "tofu", "tempeh", "edamame", "miso"},
+    "sesame": {"sesame", "tahini"},
+    "honey": {"honey"},
+}
+FAMILY_BITS = {name: 1 << i for i, name in enumerate(FAMILIES)}
+_TOKEN_BITS = {tok: 0 for toks in FAMILIES.values() for tok in toks}
+for _name, _toks in FAMILIES.items():
+    for _tok in _toks:
+        _TOKEN_BITS[_tok] |= FAMILY_BITS[_name]
+
+# Multi-word ingredients, matched before single tokens: their own families
+# replace those of their words (plant milks, nut butters, gluten-free flours)
+PHRASES: Dict[str, Tuple[str, ...]] = {
+    "coconut milk": (), "coconut cream": (), "cream of coconut": (), "oat milk": (),
+    "rice milk": (), "hemp milk": (), "almond milk": ("tree_nut",), "cashew milk": ("tree_nut",),
+    "soy milk": ("soy",), "peanut butter": ("peanut",), "almond butter": ("tree_nut",),
+    "cashew butter": ("tree_nut",), "nut butter": ("tree_nut",), "sunflower butter": (),
+    "apple butter": (), "cocoa butter": (), "cream of tartar": (),
+    "rice flour": (), "almond flour": ("tree_nut",), "coconut flour": (), "corn flour": (),
+    "chickpea flour": (), "potato flour": (), "tapioca flour": (), "buckwheat flour": (),
+    "rice noodles": (), "rice pasta": (), "rice crackers": (), "corn tortillas": (),
+}
+_PHRASE_BITS = {tuple(p.split()): sum(FAMILY_BITS[f] for f in fams) for p, fams in PHRASES.items()}
+_MAX_PHRASE = max(len(p) for p in _PHRASE_BITS)
+# Separators between the items of a tag list / ingredient line ('["a", "b"]')
+_ITEM_SPLIT = re.compile(r'[,;"\[\]\n]+')
+
+ALLERGEN_ALIASES = {
+    "nuts": "tree_nut", "tree nuts": "tree_nut", "tree nut": "tree_nut", "peanuts": "peanut",
+    "milk": "dairy", "lactose": "dairy", "eggs": "egg", "wheat": "gluten", "soya": "soy",
+    "seafood": ("fish", "shellfish"), "crustaceans": "shellfish",
+}
+
+DIETS = {
+    "vegan": ("meat", "fish", "shellfish", "dairy", "egg", "honey"),
+    "vegetarian": ("meat", "fish", "shellfish"),
+    "pescatarian": ("meat",),
+    "pescetarian": ("meat",),
+    "gluten-free": ("gluten",),
+    "gluten free": ("gluten",),
+    "dairy-free": ("dairy",),
+    "dairy free": ("dairy",),
+    "nut-free": ("peanut", "tree_nut"),
+    "nut free": ("peanut", "tree_nut"),
+    "none": (), "any": (), "omnivore": (),
+}
+
+
+def family_bits(name: str) -> int:
+    """Bits of a family name or alias ("dairy", "tree nuts", "seafood"); 0 for anything else."""
+    fams = ALLERGEN_ALIASES.get(name, name)
+    bits = 0
+    for fam in (fams if isinstance(fams, tuple) else (fams,)):
+        bits |= FAMILY_BITS.get(fam, 0)
+    return bits
+
+
+def _item_bits(toks: List[str]) -> int:
+    """Family bits of one item's tokens; "X free" drops X's families from the item."""
+    bits, free, i = 0, 0, 0
+    while i < len(toks):
+        if i + 1 < len(toks) and toks[i + 1] == "free":
+            free |= family_bits(toks[i]) | _TOKEN_BITS.get(toks[i], 0)
+            i += 2
+            continue
+        for n in range(min(_MAX_PHRASE, len(toks) - i), 1, -1):
+            phrase = _PHRASE_BITS.get(tuple(toks[i:i + n]))
+            if phrase is not None:
+                bits |= phrase
+                i += n
+                break
+        else:
+            bits |= _TOKEN_BITS.get(toks[i], 0)
+            i += 1
+    return bits & ~free
+
+
+def bits_for_text(text: str) -> int:
+    bits = 0
+    for item in _ITEM_SPLIT.split(text.lower()):
+        bits |= _item_bits(TOKEN_RE.findall(item))
+    return bits
+
+
+def known_diet(diet: Optional[str]) -> bool:
+    return not (diet or "").strip() or diet.strip().lower() in DIETS
+
+
+_warned_diets = set()
+
+
+@dataclass
+class Constraints:
+    """User constraints resolved to excluded family bits + a per-serving kcal ceiling."""
+    diet: Optional[str] = None
+    allergens: List[str] = field(default_factory=list)
+    max_kcal: Optional[float] = None
+
+    @property
+    def excluded_bits(self) -> int:
+        diet = (self.diet or "").strip().lower()
+        if not known_diet(diet) and diet not in _warned_diets:
+            _warned_diets.add(diet)
+            log.warning(f"Unknown diet {diet!r} ignored; known: {', '.join(sorted(DIETS))}")
+        bits = 0
+        for fam in DIETS.get(diet, ()):
+            bits |= FAMILY_BITS[fam]
+        for allergen in self.allergens:
+            bits |= family_bits(allergen.strip().lower())
+        return bits
+
+    @property
+    def food_allergens(self) -> Tuple[str, ...]:
+        """
+        Allergens naming a single food ("chicken", "mustard") rather than a
+        family: matched against ingredient names, not the whole family.
+        """
+        return tuple(sorted({a.strip().lower() for a in self.allergens
+                             if a.strip() and not family_bits(a.strip().lower())}))
+
+    @property
+    def active(self) -> bool:
+        return bool(self.excluded_bits or self.max_kcal or self.food_allergens)
+
+
+# -------------------------------------------------------------------
+# Per-recipe masks
+# -------------------------------------------------------------------
+def positions(sorted_ids: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    """Index of each of `ids` in `sorted_ids`, -1 where absent."""
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(sorted_ids) == 0:
+        return np.full(len(ids), -1, dtype=np.int64)
+    pos = np.clip(np.searchsorted(sorted_ids, ids), 0, len(sorted_ids) - 1)
+    return np.where(sorted_ids[pos] == ids, pos, -1)
+
+
+class RecipeFilters:
+    """
+    Precomputed per-recipe family bitsets (from canonical ingredients and
+    tags) and per-serving calorie estimates, aligned to a sorted id array.
+    """
+
+    def __init__(self, recipe_ids: np.ndarray, bits: np.ndarray, kcal: np.ndarray,
+                 term_recipes: Optional[Callable[[str], np.ndarray]] = None):
+        self.recipe_ids = np.asarray(recipe_ids, dtype=np.int64)
+        self.bits = np.asarray(bits, dtype=np.uint32)
+        self.kcal = np.asarray(kcal, dtype=np.float32)   # NaN = unknown
+        # allergen text -> ids of recipes with a matching ingredient (IngredientPostings)
+        self.term_recipes = term_recipes
+        self._aligned = {}
+        self._warned = set()
+
+    @classmethod
+    def from_db(cls, conn: sqlite3.Connection) -> "RecipeFilters":
+        import pandas as pd
+        recipes = pd.read_sql_query("SELECT id, COALESCE(tags, '') AS tags FROM recipes ORDER BY id", conn)
+        ids = recipes["id"].to_numpy(dtype=np.int64)
+        bits = np.array([bits_for_text(t) for t in recipes["tags"]], dtype=np.uint32)
+
+        lines = pd.read_sql_query("""
+            SELECT recipe_id, canonical_ingredient FROM recipe_ingredients
+            WHERE canonical_ingredient IS NOT NULL AND canonical_ingredient != ''
+        """, conn)
+        if len(lines) and len(ids):
+            uniq, inv = np.unique(lines["canonical_ingredient"].to_numpy(dtype=object), return_inverse=True)
+            term_bits = np.array([bits_for_text(t) for t in uniq], dtype=np.uint32)
+            pos = positions(ids, lines["recipe_id"].to_numpy(dtype=np.int64))
+            ok = pos >= 0
+            np.bitwise_or.at(bits, pos[ok], term_bits[inv[ok]])
+
+        kcal = np.full(len(ids), np.nan, dtype=np.float32)
+        has_table = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='recipe_nutrition'"
+        ).fetchone()
+        if has_table:
+            nut = pd.read_sql_query(
+                "SELECT recipe_id, kcal FROM recipe_nutrition WHERE matched_lines > 0", conn)
+            pos = positions(ids, nut["recipe_id"].to_numpy(dtype=np.int64))
+            ok = pos >= 0
+            kcal[pos[ok]] = nut["kcal"].to_numpy(dtype=np.float32)[ok] / RECIPE_SERVINGS
+        return cls(ids, bits, kcal)
+
+    def _rows(self, ids: np.ndarray) -> np.ndarray:
+        return positions(self.recipe_ids, ids)
+
+    def admissible(self, ids: np.ndarray, constraints: Constraints) -> np.ndarray:
+        """Boolean mask over `ids`; recipes unknown to the filters are admitted."""
+        ids = np.asarray(ids, dtype=np.int64)
+        rows = self._rows(ids)
+        known = rows >= 0
+        ok = np.ones(len(ids), dtype=bool)
+        excluded = np.uint32(constraints.excluded_bits)
+        if excluded:
+            ok[known] &= (self.bits[rows[known]] & excluded) == 0
+        if constraints.max_kcal:
+            kc = self.kcal[rows[known]]
+            ok[known] &= np.isnan(kc) | (kc <= constraints.max_kcal)
+        for allergen in constraints.food_allergens:
+            matched = self.term_recipes(allergen) if self.term_recipes is not None else np.empty(0)
+            if not len(matched) and allergen not in self._warned:
+                self._warned.add(allergen)
+                log.warning(f"Allergen {allergen!r} matches no recipe ingredient; nothing excluded for it")
+            ok &= ~np.isin(ids, matched)
+        return ok
+
+    def mask_for(self, index_ids: np.ndarray, constraints: Constraints) -> Optional[np.ndarray]:
+        """Admissibility mask aligned to an index's id array (None = no filtering)."""
+        if not constraints.active:
+            return None
+        # id() alone can be reused by a new array once a swapped-out index is freed,
+        # so entries keep a weak reference and must still point at this very array
+        key = (id(index_ids), len(index_ids), constraints.excluded_bits, constraints.max_kcal,
+               constraints.food_allergens)
+        entry = self._aligned.get(key)
+        if entry is not None and entry[0]() is index_ids:
+            return entry[1]
+        mask = self.admissible(index_ids, constraints)
+        if len(self._aligned) > 64:
+            self._aligned.clear()
+        self._aligned[key] = (weakref.ref(index_ids), mask)
+        return mask
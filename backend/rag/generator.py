@@ -2,21 +2,32 @@
 # File: backend/gemini/generator.py
 # ==============================================
 import os
-import google.generativeai as genai
+import threading
 
 MODEL = "gemini-1.5-pro"  # you can use -flash for speed
 
+_model = None
+_lock = threading.Lock()
 
-def _cfg():
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise RuntimeError("GOOGLE_API_KEY is not set")
-    genai.configure(api_key=api_key)
+
+def _get_model():
+    """Configure the SDK once and reuse one GenerativeModel for every call."""
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                import google.generativeai as genai
+
+                api_key = os.getenv("GOOGLE_API_KEY")
+                if not api_key:
+                    raise RuntimeError("GOOGLE_API_KEY is not set")
+                genai.configure(api_key=api_key)
+                _model = genai.GenerativeModel(model_name=MODEL)
+    return _model
 
 
 def generate_recipe(context: dict, constraints: dict) -> dict:
     """Ask Gemini to return a structured JSON recipe."""
-    _cfg()
     system = (
         "You are a meticulous culinary assistant. Generate one recipe that strictly respects the constraints. "
         "Use only candidate ingredients if provided. Return pure JSON conforming to the schema."
@@ -55,7 +66,7 @@ def generate_recipe(context: dict, constraints: dict) -> dict:
     }
 
     # Newer SDKs allow response_mime_type. If not supported in your version, fall back to text and json.loads.
-    model = genai.GenerativeModel(model_name=MODEL)
+    model = _get_model()
 
     prompt = (
         f"CONSTRAINTS:\n{constraints}\n\n"
@@ -0,0 +1,290 @@
+# backend/rag/incremental.py
+import hashlib
+import sqlite3
+import time
+import numpy as np
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Tuple
+
+from .executor import EmbeddingExecutor
+from .quantize import EMBED_STORAGE, decode, encode, ensure_meta, read_meta, transcode_table, write_meta
+
+MAX_RETRIES = 3
+
+
+@dataclass
+class IndexSpec:
+    """How to build one embedding table from its source table."""
+    table: str                       # e.g. recipe_embeddings
+    id_col: str                      # e.g. recipe_id
+    source: str                      # e.g. recipes
+    columns: str                     # source columns after id, e.g. "title, text"
+    to_text: Callable[..., str]      # source columns -> text to embed
+
+
+@dataclass
+class BuildStats:
+    scanned: int = 0
+    embedded: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    failed: List[int] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        """The live table changed (a failed build leaves it as it was)."""
+        return not self.failed and bool(self.embedded or self.deleted)
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def staging_table(spec: IndexSpec) -> str:
+    """Rows embedded by the running build; merged into spec.table when it finishes."""
+    return f"{spec.table}_staging"
+
+
+# -------------------------------------------------------------------
+# Tables
+# -------------------------------------------------------------------
+def ensure_tables(conn: sqlite3.Connection, spec: IndexSpec):
+    """Create the embedding table and build-state table; add new columns to old tables."""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {spec.table} (
+            {spec.id_col} INTEGER PRIMARY KEY,
+            embedding BLOB,
+            content_hash TEXT,
+            model TEXT,
+            FOREIGN KEY({spec.id_col}) REFERENCES {spec.source}(id)
+        )
+    """)
+    cols = {r[1] for r in conn.execute(f"PRAGMA table_info({spec.table})")}
+    for col in ("content_hash", "model"):
+        if col not in cols:
+            conn.execute(f"ALTER TABLE {spec.table} ADD COLUMN {col} TEXT")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {staging_table(spec)} (
+            {spec.id_col} INTEGER PRIMARY KEY,
+            embedding BLOB,
+            content_hash TEXT,
+            model TEXT
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS index_build_state (
+            name TEXT PRIMARY KEY,
+            model TEXT,
+            last_id INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL,
+            updated_at REAL
+        )
+    """)
+    ensure_meta(conn)
+    conn.commit()
+
+
+def _read_checkpoint(conn, name: str, model: str) -> int:
+    row = conn.execute(
+        "SELECT model, last_id, status FROM index_build_state WHERE name = ?", (name,)
+    ).fetchone()
+    if row and row[0] == model and row[2] == "running":
+        return row[1]
+    return 0
+
+
+def _write_checkpoint(conn, name: str, model: str, last_id: int, status: str):
+    conn.execute("""
+        INSERT INTO index_build_state (name, model, last_id, status, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            model = excluded.model, last_id = excluded.last_id,
+            status = excluded.status, updated_at = excluded.updated_at
+    """, (name, model, last_id, status, time.time()))
+
+
+# -------------------------------------------------------------------
+# Build
+# -------------------------------------------------------------------
+def _pending(conn, spec: IndexSpec, rows, model: str, force: bool) -> Tuple[list, list, list]:
+    """Split a page of source rows into the (ids, texts, hashes) that need embedding."""
+    ids, texts, hashes = [], [], []
+    prepared = []
+    for row in rows:
+        text = spec.to_text(*row[1:])
+        if text:
+            prepared.append((row[0], text, content_hash(text)))
+    if not prepared:
+        return ids, texts, hashes
+
+    # Live rows (unless forced), overridden by rows this build already staged
+    keys = [p[0] for p in prepared]
+    existing = {}
+    for table in ((spec.table,) if not force else ()) + (staging_table(spec),):
+        existing.update(
+            (rid, (h, m)) for rid, h, m in conn.execute(
+                f"SELECT {spec.id_col}, content_hash, model FROM {table} "
+                f"WHERE {spec.id_col} IN ({','.join('?' * len(keys))})", keys)
+        )
+    for rid, text, h in prepared:
+        if existing.get(rid) != (h, model):
+            ids.append(rid)
+            texts.append(text)
+            hashes.append(h)
+    return ids, texts, hashes
+
+
+def _write_batch(conn, spec: IndexSpec, ids, hashes, embs: np.ndarray, model: str,
+                 encoding: str = EMBED_STORAGE):
+    conn.executemany(
+        f"INSERT OR REPLACE INTO {staging_table(spec)} ({spec.id_col}, embedding, content_hash, model) "
+        f"VALUES (?, ?, ?, ?)",
+        [(rid, encode(e, encoding), h, model) for rid, e, h in zip(ids, embs, hashes)],
+    )
+
+
+class _Watermark:
+    """Highest source id below which every page has been written, with out-of-order completion."""
+
+    def __init__(self, start: int):
+        self.value = start
+        self._pages = deque()  # [last_id, done]
+
+    def add(self, last_id: int, done: bool = False) -> list:
+        page = [last_id, done]
+        self._pages.append(page)
+        self._advance()
+        return page
+
+    def mark(self, page: list):
+        page[1] = True
+        self._advance()
+
+    def _advance(self):
+        while self._pages and self._pages[0][1]:
+            self.value = self._pages.popleft()[0]
+
+
+def build_embedding_table(conn: sqlite3.Connection, spec: IndexSpec,
+                          embed: Callable[[List[str]], np.ndarray], model: str,
+                          batch_size: int = 250, force: bool = False,
+                          label: Optional[str] = None,
+                          executor: Optional[EmbeddingExecutor] = None,
+                          progress: Optional[Callable[[BuildStats, int], None]] = None,
+                          encoding: str = EMBED_STORAGE) -> BuildStats:
+    """
+    Incrementally (re)build `spec.table`: only rows whose content hash or
+    model changed are embedded, each batch is written with executemany to
+    the staging table in one transaction together with the checkpoint, an
+    interrupted build resumes after the last fully written id, and the
+    staged rows replace the live ones (orphans deleted, meta updated) in a
+    single transaction at the end, so readers loading `spec.table` while a
+    build runs see the previous build, never a mix. Failed batches are
+    re-queued and retried instead of being dropped; if some still fail,
+    nothing is swapped in and the next build resumes from the checkpoint.
+    Embedding runs on `executor` (several batches in flight); SQLite reads
+    and writes stay on the calling thread. `progress(stats, total)` is
+    called after every page scanned or written. Vectors are stored in
+    `encoding`; rows kept from an earlier build in another encoding are
+    transcoded first.
+    """
+    label = label or spec.source
+    executor = executor or EmbeddingExecutor(embed, label=label)
+    ensure_tables(conn, spec)
+    stats = BuildStats()
+
+    meta = read_meta(conn, spec.table)
+    stored = meta["encoding"] if meta else "float32"  # tables from before embedding_meta
+    if stored != encoding:
+        transcode_table(conn, spec.table, spec.id_col, stored, encoding)
+
+    total = conn.execute(f"SELECT COUNT(*) FROM {spec.source}").fetchone()[0]
+    start = 0 if force or stored != encoding else _read_checkpoint(conn, spec.table, model)
+    if start:
+        print(f"Resuming {label} index build after id {start}")
+    else:
+        with conn:  # rows staged by an abandoned build
+            conn.execute(f"DELETE FROM {staging_table(spec)}")
+    print(f"Indexing {total} {label} (incremental, model={model})...")
+
+    watermark = _Watermark(start)
+    scan = {"last_id": start}
+    dim = {"value": meta["dim"] if meta else None}
+    if dim["value"] is None:
+        row = conn.execute(f"SELECT embedding FROM {spec.table} LIMIT 1").fetchone()
+        dim["value"] = len(decode(row[0], encoding)) if row else None
+    with conn:
+        _write_checkpoint(conn, spec.table, model, start, "running")
+
+    def pages():
+        while True:
+            rows = conn.execute(
+                f"SELECT id, {spec.columns} FROM {spec.source} WHERE id > ? ORDER BY id LIMIT ?",
+                (scan["last_id"], batch_size),
+            ).fetchall()
+            if not rows:
+                return
+            scan["last_id"] = rows[-1][0]
+            stats.scanned += len(rows)
+            ids, texts, hashes = _pending(conn, spec, rows, model, force)
+            stats.unchanged += len(rows) - len(ids)
+            if progress:
+                progress(stats, total)
+            if not ids:
+                watermark.add(scan["last_id"], done=True)
+                continue
+            yield (watermark.add(scan["last_id"]), ids, hashes, texts), texts
+
+    def run(items) -> list:
+        failed = []
+        for tag, embs, err in executor.map(items):
+            page, ids, hashes, texts = tag
+            if err is not None:
+                print(f"Embedding failed on {label} ids {ids[0]}-{ids[-1]}: {err}; re-queued")
+                failed.append((tag, texts))
+                continue
+            dim["value"] = embs.shape[1]
+            with conn:
+                _write_batch(conn, spec, ids, hashes, embs, model, encoding)
+                watermark.mark(page)
+                _write_checkpoint(conn, spec.table, model, watermark.value, "running")
+            stats.embedded += len(ids)
+            if progress:
+                progress(stats, total)
+        return failed
+
+    retry_queue = run(pages())
+    for attempt in range(1, MAX_RETRIES + 1):
+        if not retry_queue:
+            break
+        time.sleep(2 ** attempt)
+        print(f"Retrying {len(retry_queue)} failed {label} batches (attempt {attempt})")
+        retry_queue = run(retry_queue)
+
+    if retry_queue:
+        # Keep the staged rows for the resumed build: publishing them now could mix models
+        stats.failed = [rid for (_, ids, _, _), _ in retry_queue for rid in ids]
+        with conn:
+            _write_checkpoint(conn, spec.table, model, watermark.value, "running")
+        print(f"{label.capitalize()} index: {len(stats.failed)} failed; "
+              f"{stats.embedded} embedded rows stay staged until a rebuild completes")
+        return stats
+
+    cols = f"{spec.id_col}, embedding, content_hash, model"
+    with conn:  # swap: the new rows, orphan deletes and meta become visible together
+        conn.execute(f"INSERT OR REPLACE INTO {spec.table} ({cols}) "
+                     f"SELECT {cols} FROM {staging_table(spec)}")
+        conn.execute(f"DELETE FROM {staging_table(spec)}")
+        cur = conn.execute(
+            f"DELETE FROM {spec.table} WHERE {spec.id_col} NOT IN (SELECT id FROM {spec.source})"
+        )
+        stats.deleted = cur.rowcount
+        _write_checkpoint(conn, spec.table, model, scan["last_id"], "done")
+        write_meta(conn, spec.table, model, dim["value"], encoding)
+
+    print(f"{label.capitalize()} index: {stats.embedded} embedded, {stats.unchanged} unchanged, "
+          f"{stats.deleted} deleted, {len(stats.failed)} failed "
+          f"({executor.throughput():.1f} {label}/s)")
+    return stats
@@ -0,0 +1,183 @@
+# backend/rag/index.py
+import sqlite3
+import threading
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Below this admitted fraction, filtered search gathers and scores only admitted rows
+SELECTIVE_FRACTION = 0.25
+# Score-matrix budget per query block in search_batch()
+BATCH_SCORE_BYTES = 256 * 1024 * 1024
+
+
+# -------------------------------------------------------------------
+# Dense in-memory index
+# -------------------------------------------------------------------
+class VectorIndex:
+    """
+    Process-resident embedding index: a contiguous, L2-normalized float32
+    matrix of shape (n, dim) and a parallel int64 id array.
+    """
+
+    def __init__(self, ids: np.ndarray, matrix: np.ndarray):
+        self.ids = np.ascontiguousarray(ids, dtype=np.int64)
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    @classmethod
+    def from_db(cls, conn: sqlite3.Connection, table: str, id_col: str,
+                decode: Optional[Callable[[bytes], np.ndarray]] = None) -> "VectorIndex":
+        """Load every embedding BLOB of `table` once into a pre-normalized matrix."""
+        decode = decode or (lambda blob: np.frombuffer(blob, dtype=np.float32))
+        cur = conn.cursor()
+        cur.execute(f"SELECT COUNT(*) FROM {table}")
+        total = cur.fetchone()[0]
+        if total == 0:
+            return cls(np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32))
+
+        cur.execute(f"SELECT {id_col}, embedding FROM {table} ORDER BY {id_col}")
+        ids = np.empty(total, dtype=np.int64)
+        matrix = None
+        n = 0
+        for row_id, blob in cur:
+            vec = decode(blob)
+            if matrix is None:
+                matrix = np.empty((total, vec.shape[0]), dtype=np.float32)
+            if vec.shape[0] != matrix.shape[1]:
+                continue  # stale row from a different model; skip it
+            ids[n] = row_id
+            matrix[n] = vec
+            n += 1
+
+        ids, matrix = ids[:n], matrix[:n]
+        normalize_rows(matrix)
+        return cls(ids, matrix)
+
+    def search(self, query_vec: np.ndarray, k: int = 10,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score all rows with one matrix-vector product and return the top-k
+        (ids, cosine scores) in descending score order. `mask` (bool, one
+        per row) restricts results to admissible rows: selective masks
+        score only the admitted rows, broad ones mask the full scan.
+        """
+        if len(self) == 0 or k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        q = normalize_query(query_vec)
+        if mask is None:
+            scores = self.matrix @ q
+            top = top_k(scores, k)
+            return self.ids[top], scores[top]
+
+        rows = np.flatnonzero(mask)
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if len(rows) < SELECTIVE_FRACTION * len(self):
+            scores = self.matrix[rows] @ q
+            top = top_k(scores, k)
+            return self.ids[rows[top]], scores[top]
+
+        scores = self.matrix @ q
+        scores[~mask] = -np.inf
+        top = top_k(scores, min(k, len(rows)))
+        return self.ids[top], scores[top]
+
+    def search_batch(self, query_mat: np.ndarray, k: int = 10,
+                     mask: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        search() for many queries sharing one `mask`: each block of queries
+        is scored with a single matrix-matrix product, blocks sized so the
+        score matrix stays around BATCH_SCORE_BYTES.
+        """
+        queries = normalize_rows(np.array(query_mat, dtype=np.float32, copy=True).reshape(len(query_mat), -1))
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        if len(self) == 0 or k <= 0:
+            return [empty] * len(queries)
+
+        ids, matrix = self.ids, self.matrix
+        if mask is not None:
+            rows = np.flatnonzero(mask)
+            if len(rows) == 0:
+                return [empty] * len(queries)
+            k = min(k, len(rows))
+            if len(rows) < SELECTIVE_FRACTION * len(self):
+                ids, matrix, mask = ids[rows], matrix[rows], None
+
+        block = max(1, BATCH_SCORE_BYTES // (4 * len(matrix)))
+        out = []
+        for start in range(0, len(queries), block):
+            scores = queries[start:start + block] @ matrix.T
+            if mask is not None:
+                scores[:, ~mask] = -np.inf
+            for row in scores:
+                top = top_k(row, k)
+                out.append((ids[top], row[top]))
+        return out
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize rows in place; zero rows are left as zeros."""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+def normalize_query(query_vec: np.ndarray) -> np.ndarray:
+    q = np.asarray(query_vec, dtype=np.float32).ravel()
+    norm = np.linalg.norm(q)
+    return q / norm if norm > 0 else q
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, sorted descending (partial selection)."""
+    n = scores.shape[0]
+    if k >= n:
+        return np.argsort(-scores, kind="stable")
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+# -------------------------------------------------------------------
+# Process-wide registry
+# -------------------------------------------------------------------
+_INDEXES: Dict[str, object] = {}
+_LOCK = threading.Lock()
+
+
+def get_index(table: str, loader: Callable[[], object]):
+    """Return the resident index for `table`, calling `loader` on first use."""
+    index = _INDEXES.get(table)
+    if index is not None:
+        return index
+    with _LOCK:
+        index = _INDEXES.get(table)
+        if index is None:
+            index = loader()
+            _INDEXES[table] = index
+    return index
+
+
+def swap_index(table: str, index) -> None:
+    """
+    Atomically publish a fully built index for `table`. Searches holding
+    the previous object finish on it; new ones see the replacement.
+    """
+    with _LOCK:
+        _INDEXES[table] = index
+
+
+def reset_index(table: str = None):
+    """Drop resident indexes so the next search reloads them from SQLite."""
+    with _LOCK:
+        if table is None:
+            _INDEXES.clear()
+        else:
+            _INDEXES.pop(table, None)
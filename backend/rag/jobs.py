@@ -0,0 +1,99 @@
+# backend/rag/jobs.py
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Callable, Dict, List, Optional
+
+MAX_FINISHED_JOBS = 50  # finished jobs kept for status queries
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    params: dict
+    status: str = "queued"            # queued | running | done | failed
+    stage: str = ""
+    progress: Dict[str, dict] = field(default_factory=dict)
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def report(self, stage: str, **values):
+        """Progress callback handed to the job body."""
+        self.stage = stage
+        self.progress[stage] = {**self.progress.get(stage, {}), **values}
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class JobManager:
+    """
+    Runs long jobs (index rebuilds) on one background thread, so they are
+    serialized with each other and never run inside an HTTP request.
+    """
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-jobs")
+
+    def submit(self, kind: str, body: Callable[[Job], Optional[dict]], **params) -> Job:
+        """Queue `body(job)`; an already active job of the same kind is returned instead."""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.kind == kind and job.active:
+                    return job
+            job = Job(id=uuid.uuid4().hex[:12], kind=kind, params=params)
+            self._jobs[job.id] = job
+            self._prune()
+        self._pool.submit(self._run, job, body)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.created_at, reverse=True)
+
+    def _run(self, job: Job, body: Callable[[Job], Optional[dict]]):
+        job.status, job.started_at = "running", time.time()
+        try:
+            job.result = body(job)
+            job.status = "done"
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = "failed"
+            traceback.print_exc()
+        finally:
+            job.finished_at = time.time()
+
+    def _prune(self):
+        finished = [j for j in self._jobs.values() if not j.active]
+        finished.sort(key=lambda j: j.created_at)
+        for job in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self._jobs[job.id]
+
+
+_manager: Optional[JobManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager() -> JobManager:
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = JobManager()
+    return _manager
@@ -0,0 +1,133 @@
+# backend/rag/lexical.py
+import os
+import re
+import sqlite3
+import time
+from collections import defaultdict
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from .metrics import LEXICAL_OVER_BUDGET, note
+
+FTS_TABLE = "recipes_fts"
+# Indexed recipes columns; ingest stores the RecipeNLG NER list in `tags`
+FTS_COLUMNS = ("title", "text", "tags")
+# BM25 column weights, in FTS_COLUMNS order
+BM25_WEIGHTS = (10.0, 1.0, 4.0)
+LEXICAL_BUDGET_MS = float(os.getenv("LEXICAL_BUDGET_MS", "50"))
+RRF_K = 60                 # standard reciprocal-rank-fusion damping constant
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+# -------------------------------------------------------------------
+# Build
+# -------------------------------------------------------------------
+def ensure_fts(conn: sqlite3.Connection) -> bool:
+    """
+    External-content FTS5 index over recipes (no second copy of the text),
+    kept in sync with recipes by AFTER INSERT / UPDATE / DELETE triggers.
+    Returns True when the table or its triggers were just created (an
+    older layout is dropped and recreated): the index must be rebuilt.
+    """
+    cols = ", ".join(FTS_COLUMNS)
+    new_cols = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+    old_cols = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+    triggers = {
+        f"{FTS_TABLE}_ai": f"""AFTER INSERT ON recipes BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END""",
+        f"{FTS_TABLE}_ad": f"""AFTER DELETE ON recipes BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+        END""",
+        f"{FTS_TABLE}_au": f"""AFTER UPDATE ON recipes BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});
+            INSERT INTO {FTS_TABLE}(rowid, {cols}) VALUES (new.id, {new_cols});
+        END""",
+    }
+    current = tuple(r[1] for r in conn.execute(f"PRAGMA table_info({FTS_TABLE})"))
+    present = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='trigger'")}
+    if current == FTS_COLUMNS and present >= set(triggers):
+        return False
+    with conn:
+        if current and current != FTS_COLUMNS:
+            conn.execute(f"DROP TABLE {FTS_TABLE}")  # external content: nothing is lost
+        for name in triggers:
+            conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+                {cols},
+                content='recipes', content_rowid='id',
+                tokenize='porter unicode61 remove_diacritics 2'
+            )
+        """)
+        for name, body in triggers.items():
+            conn.execute(f"CREATE TRIGGER {name} {body}")
+    return True
+
+
+def build_fts(conn: sqlite3.Connection) -> int:
+    """(Re)build the FTS index from the recipes table in one pass."""
+    t0 = time.perf_counter()
+    ensure_fts(conn)
+    with conn:
+        conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    n = conn.execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+    print(f"Built {FTS_TABLE} over {n} recipes in {time.perf_counter() - t0:.1f}s")
+    return n
+
+
+def has_fts(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (FTS_TABLE,)
+    ).fetchone() is not None
+
+
+# -------------------------------------------------------------------
+# Search
+# -------------------------------------------------------------------
+def match_query(text: str) -> str:
+    """User text -> FTS5 MATCH expression: quoted terms OR-ed (BM25 rewards matching more)."""
+    terms = list(dict.fromkeys(t.lower() for t in _TERM_RE.findall(text)))
+    return " OR ".join(f'"{t}"' for t in terms)
+
+
+def search_bm25(conn: sqlite3.Connection, query: str, k: int = 10,
+                budget_ms: Optional[float] = LEXICAL_BUDGET_MS) -> List[Tuple[int, float]]:
+    """
+    Top-k (recipe_id, score) by BM25, best first (score = -bm25, higher is
+    better). If the query runs past `budget_ms` it is interrupted and an
+    empty list is returned.
+    """
+    expr = match_query(query)
+    if not expr or k <= 0:
+        return []
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    sql = (f"SELECT rowid, -bm25({FTS_TABLE}, {weights}) AS score FROM {FTS_TABLE} "
+           f"WHERE {FTS_TABLE} MATCH ? ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT ?")
+
+    if budget_ms:
+        deadline = time.perf_counter() + budget_ms / 1000.0
+        conn.set_progress_handler(lambda: time.perf_counter() > deadline, 1000)
+    try:
+        return [(int(rid), float(score)) for rid, score in conn.execute(sql, (expr, k))]
+    except sqlite3.OperationalError as e:
+        if "interrupted" in str(e):
+            LEXICAL_OVER_BUDGET.inc()
+            note(lexical_over_budget_ms=budget_ms)  # logged with the request's sampled trace
+            return []
+        raise
+    finally:
+        if budget_ms:
+            conn.set_progress_handler(None, 0)
+
+
+def rrf_fuse(rankings: Sequence[Iterable[int]], k: int = RRF_K,
+             weights: Optional[Sequence[float]] = None) -> List[Tuple[int, float]]:
+    """Reciprocal rank fusion of several ranked id lists -> [(id, fused score)] best first."""
+    weights = weights or [1.0] * len(rankings)
+    scores = defaultdict(float)
+    for ranking, w in zip(rankings, weights):
+        for rank, rid in enumerate(ranking):
+            scores[rid] += w / (k + rank + 1)
+    return sorted(scores.items(), key=lambda kv: -kv[1])
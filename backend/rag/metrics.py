@@ -0,0 +1,228 @@
+# backend/rag/metrics.py
+import contextvars
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+# Fraction of requests whose trace (stage timings + notes) is logged
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+log = logging.getLogger("backend.rag.trace")
+if not log.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+
+
+# -------------------------------------------------------------------
+# Metric types (Prometheus text exposition, no client library)
+# -------------------------------------------------------------------
+_REGISTRY = []
+
+
+def _fmt_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def inc(self, *labels, amount: float = 1.0):
+        key = tuple(str(v) for v in labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_fmt_labels(self.label_names, key)} {v:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def observe(self, value: float, *labels):
+        key = tuple(str(v) for v in labels)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, s in sorted(self._series.items()):
+                for b, n in zip(self.buckets, s):
+                    le = 'le="%g"' % b
+                    lines.append(f"{self.name}_bucket{_fmt_labels(self.label_names, key, le)} {n}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.label_names, key, le)} {s[-1]}")
+                lines.append(f"{self.name}_sum{_fmt_labels(self.label_names, key)} {s[-2]:g}")
+                lines.append(f"{self.name}_count{_fmt_labels(self.label_names, key)} {s[-1]}")
+        return lines
+
+
+class Collected:
+    """
+    Values read at scrape time from an object that keeps its own counts
+    (cache stats): `collect()` returns {label values: value}.
+    """
+
+    def __init__(self, name: str, help: str, kind: str, labels: Sequence[str],
+                 collect: Callable[[], Dict[Tuple[str, ...], float]]):
+        self.name, self.help, self.kind, self.label_names = name, help, kind, tuple(labels)
+        self.collect = collect
+        _REGISTRY.append(self)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, v in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_fmt_labels(self.label_names, key)} {v:g}")
+        return lines
+
+
+def render() -> str:
+    """All metrics in Prometheus text format (version 0.0.4)."""
+    return "\n".join(line for metric in _REGISTRY for line in metric.render()) + "\n"
+
+
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Pipeline stage latency.", ("stage",))
+STAGE_TIMEOUTS = Counter("rag_stage_timeouts_total", "Stages that exceeded their timeout.", ("stage",))
+REQUEST_SECONDS = Histogram("rag_request_seconds", "End-to-end recipe plan latency.", ("mode", "cache"))
+REQUESTS = Counter("rag_requests_total", "Recipe plans by entry point and response-cache outcome.",
+                   ("mode", "cache"))
+RETRIEVED = Histogram("rag_retrieved_recipes", "Recipes retrieved per plan.", (),
+                      buckets=(0, 1, 2, 4, 8, 16, 32, 64))
+CONTEXT_TOKENS = Histogram("rag_context_tokens", "Estimated tokens of retrieved context per prompt.", (),
+                           buckets=SIZE_BUCKETS)
+PROMPT_CHARS = Histogram("rag_prompt_chars", "Characters per generation prompt.", (),
+                         buckets=tuple(b * 4 for b in SIZE_BUCKETS))
+LEXICAL_OVER_BUDGET = Counter("rag_lexical_over_budget_total",
+                              "Lexical (BM25) searches interrupted by their latency budget.")
+GEN_TOKENS = Counter("rag_generation_tokens_total", "Token usage reported by the generation API.", ("kind",))
+
+
+# -------------------------------------------------------------------
+# Per-request traces
+# -------------------------------------------------------------------
+class Trace:
+    """Stage timings (ms, summed per stage) and notes for one request."""
+
+    def __init__(self, mode: str, sampled: bool):
+        self.id = uuid.uuid4().hex[:12]
+        self.mode = mode
+        self.sampled = sampled
+        self.timings: Dict[str, float] = {}
+        self.notes: Dict[str, object] = {}
+        self.started = time.perf_counter()
+
+    def add(self, stage: str, seconds: float):
+        self.timings[stage] = round(self.timings.get(stage, 0.0) + seconds * 1000, 3)
+
+    def note(self, **values):
+        self.notes.update(values)
+
+    def breakdown(self) -> Dict[str, float]:
+        return {**self.timings, "total": round((time.perf_counter() - self.started) * 1000, 3)}
+
+
+_current: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("rag_trace", default=None)
+
+
+def note(**values):
+    """Attach values to the current trace, if any."""
+    trace = _current.get()
+    if trace is not None:
+        trace.note(**values)
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage)
+    trace = _current.get()
+    if trace is not None:
+        trace.add(stage, seconds)
+
+
+@contextmanager
+def timed(stage: str):
+    """Time a block as pipeline stage `stage` (histogram + current trace)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - t0)
+
+
+@contextmanager
+def trace_request(mode: str):
+    """
+    Trace one recipe plan: stages timed inside (in this context and tasks
+    it spawns) are attached to it, request counters are updated on exit
+    and a sampled fraction is logged as one JSON line.
+    """
+    trace = Trace(mode, random.random() < TRACE_SAMPLE_RATE)
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        try:
+            _current.reset(token)
+        except ValueError:  # exited from another context (async generator resumed elsewhere)
+            _current.set(None)
+        cache = trace.notes.get("cache") or "miss"
+        elapsed = time.perf_counter() - trace.started
+        REQUESTS.inc(mode, cache)
+        REQUEST_SECONDS.observe(elapsed, mode, cache)
+        if trace.sampled:
+            log.info(json.dumps({"trace": trace.id, "mode": mode, "ms": trace.breakdown(), **trace.notes},
+                                default=str))
+
+
+def record_retrieval(recipe_ids, context_tokens: int):
+    RETRIEVED.observe(len(recipe_ids))
+    CONTEXT_TOKENS.observe(context_tokens)
+    note(recipe_ids=list(recipe_ids), context_tokens=context_tokens)
+
+
+def record_generation(prompt: str, usage=None):
+    """Prompt size and, when the response carries usage_metadata, token counts."""
+    PROMPT_CHARS.observe(len(prompt))
+    tokens = {}
+    for kind, attr in (("prompt", "prompt_token_count"), ("output", "candidates_token_count"),
+                       ("total", "total_token_count")):
+        n = getattr(usage, attr, None) if usage is not None else None
+        if n:
+            GEN_TOKENS.inc(kind, amount=n)
+            tokens[kind] = n
+    note(prompt_chars=len(prompt), **({"tokens": tokens} if tokens else {}))
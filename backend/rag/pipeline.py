@@ -1,58 +1,103 @@
 # backend/rag/pipeline.py
-from typing import List, Optional
-from backend.rag.embeddings import search_recipes, search_ingredients
-from backend.rag.context import build_context_for_recipes
-from google.genai import Client
+import asyncio
+import threading
+import numpy as np
+from typing import AsyncIterator, List, Optional, Tuple
+from backend.rag.embeddings import (BATCH_SIZE, HYBRID_DEPTH, aembed_texts, embed_texts, search_ingredients,
+                                    search_ingredients_batch, search_recipes, search_recipes_batch,
+                                    search_recipes_hybrid, search_recipes_lexical)
+from backend.rag.context import build_context_for_recipes, build_contexts_for_recipes, estimate_tokens
+from backend.rag.filters import Constraints
+from backend.rag.aio import (CONTEXT_TIMEOUT, EMBED_TIMEOUT, GENERATE_TIMEOUT, SEARCH_TIMEOUT,
+                             StageTimeout, run_blocking, stage)
+from backend.rag.response_cache import constraint_key, get_response_cache
+from backend.rag.embed_cache import normalize_text
+from backend.rag.metrics import (REQUESTS, log, note, record_generation, record_retrieval, timed,
+                                 trace_request)
 import os
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+GEN_MODEL = "gemini-2.5-flash"
+GEN_CONCURRENCY = int(os.getenv("GEN_CONCURRENCY", "8"))  # in-flight generations per batch
+# vector (default) | hybrid (vector + BM25, rank-fused) | lexical (BM25 only, no embedding call)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector").lower()
 
-# Initialize the GenAI client
-client = Client(api_key=GOOGLE_API_KEY)
+_client = None
+_client_lock = threading.Lock()
 
 
-def plan_recipe(
-    user_query: str,
-    calories: Optional[int] = None,
-    diet: Optional[str] = None,
-    allergens: Optional[List[str]] = None,
-    k_ing: int = 15,
-    k_rec: int = 8,
-):
-    allergens = allergens or []
+def get_client():
+    """GenAI client, created on first generation (importing this module needs no API key or SDK import)."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from google.genai import Client
+                _client = Client(api_key=GOOGLE_API_KEY)
+    return _client
 
-    # Step 1: Search for relevant recipes
-    rec_results = search_recipes(user_query, k=k_rec)
+
+def set_client(client):
+    """Swap the generation client (benchmarks inject a fake; None -> real client on next use)."""
+    global _client
+    _client = client
+
+NO_CONTEXT = "(No relevant recipes found in database. Use general knowledge to suggest a recipe.)"
+
+
+def _merge_ids(rec_results, ing_results) -> List[int]:
+    """Recipe-search ids first, then ingredient-matched recipes without duplicates."""
     recipe_ids = [r[0] for r in rec_results]
+    for rid, _ in ing_results:
+        if rid not in recipe_ids:
+            recipe_ids.append(rid)
+    return recipe_ids
 
-    # Step 2: If recipe search sparse, supplement with ingredient search
-    if len(recipe_ids) < k_rec:
-        ing_results = search_ingredients(user_query, k=k_ing)
-        # Add ingredient-matched recipes without duplicates
-        for rid, _ in ing_results:
-            if rid not in recipe_ids:
-                recipe_ids.append(rid)
-        print("Ingredient search supplemented missing recipes.")
-    else:
-        ing_results = []
 
-    # Debug prints
-    print("Recipe IDs from recipe search:", [r[0] for r in rec_results])
-    print("Recipe IDs from ingredient search:", [r[0] for r in ing_results])
-    print("Combined recipe IDs:", recipe_ids)
+def _vector_depth(k: int) -> int:
+    """How deep the vector ranking behind a k-recipe search goes in RETRIEVAL_MODE."""
+    return k * HYBRID_DEPTH if RETRIEVAL_MODE == "hybrid" else k
 
-    # Step 3: Build context
-    context_text = build_context_for_recipes(recipe_ids)
-    print("Context text being sent to Gemini:\n", context_text)
 
-    if not context_text:
-        context_text = "(No relevant recipes found in database. Use general knowledge to suggest a recipe.)"
+def _search_recipes(user_query: str, k: int, constraints: Constraints, q_emb, vector=None):
+    """
+    Recipe search in RETRIEVAL_MODE; without a query embedding, lexical
+    only. `vector` is a precomputed search_recipes() ranking
+    _vector_depth(k) deep (batch planning scores all queries in one pass).
+    """
+    if q_emb is None:
+        return search_recipes_lexical(user_query, k, constraints)
+    if RETRIEVAL_MODE == "hybrid":
+        return search_recipes_hybrid(user_query, k, constraints, q_emb, vector)
+    if vector is not None:
+        return vector[:k]
+    return search_recipes(user_query, k, constraints, q_emb)
 
-    # Step 4: Build prompt
-    prompt = f"""
+
+def _search_ingredients(user_query: str, k: int, constraints: Constraints, q_emb):
+    if q_emb is None:
+        return []
+    return search_ingredients(user_query, k, constraints, q_emb)
+
+
+def _embed_query(user_query: str):
+    """Query embedding, or None in lexical mode or when the embedding API fails."""
+    if RETRIEVAL_MODE == "lexical":
+        return None
+    try:
+        with timed("embed"):
+            return embed_texts(user_query)
+    except Exception as e:
+        log.warning(f"Embedding unavailable ({type(e).__name__}: {e}); using lexical retrieval")
+        note(embed_error=type(e).__name__)
+        return None
+
+
+def _build_prompt(user_query: str, context_text: str, calories, diet, allergens: List[str]) -> str:
+    return f"""
     You are a helpful AI chef assistant.
 
     User asked: {user_query}
@@ -74,16 +119,417 @@ def plan_recipe(
     Do not include any extra explanations or notes
     """
 
-    # Step 5: Generate content
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=[prompt]
-    )
 
+def plan_recipe(
+    user_query: str,
+    calories: Optional[int] = None,
+    diet: Optional[str] = None,
+    allergens: Optional[List[str]] = None,
+    k_ing: int = 15,
+    k_rec: int = 8,
+    use_cache: bool = True,
+    timings: bool = False,
+):
+    """Retrieve, build context and generate; `timings` adds a per-stage ms breakdown."""
+    with trace_request("sync") as trace:
+        out = _plan_recipe(user_query, calories, diet, allergens or [], k_ing, k_rec, use_cache)
+        trace.note(cache=out["cache"])
+    return {**out, "timings": trace.breakdown()} if timings else out
+
+
+def _plan_recipe(user_query: str, calories, diet, allergens: List[str], k_ing: int, k_rec: int,
+                 use_cache: bool) -> dict:
+    constraints = Constraints(diet=diet, allergens=allergens, max_kcal=calories)
+
+    # Step 0: Response cache (exact, then semantic on the query embedding)
+    cache = get_response_cache()
+    ckey = constraint_key(calories, diet, allergens, k_ing, k_rec)
+    if cache is not None and use_cache:
+        with timed("cache_lookup"):
+            hit = cache.get_exact(user_query, ckey)
+        if hit is not None:
+            return {**hit, "cache": "exact"}
+    q_emb = _embed_query(user_query)
+    if cache is not None and use_cache and q_emb is not None:
+        with timed("cache_lookup"):
+            hit = cache.get_similar(q_emb, ckey)
+        if hit is not None:
+            return {**hit, "cache": "semantic"}
+
+    # Step 1: Search for relevant recipes (diet/allergen/calorie filters applied in the index)
+    with timed("recipe_search"):
+        rec_results = _search_recipes(user_query, k_rec, constraints, q_emb)
+
+    # Step 2: If recipe search sparse, supplement with ingredient search
+    if len(rec_results) < k_rec:
+        with timed("ingredient_search"):
+            ing_results = _search_ingredients(user_query, k_ing, constraints, q_emb)
+    else:
+        ing_results = []
+    recipe_ids = _merge_ids(rec_results, ing_results)
+    note(recipe_hits=len(rec_results), ingredient_hits=len(ing_results))
+
+    # Step 3: Build context
+    with timed("context"):
+        context_text = build_context_for_recipes(recipe_ids, user_query)
+    record_retrieval(recipe_ids, estimate_tokens(context_text))
+
+    if not context_text:
+        context_text = NO_CONTEXT
+
+    # Step 4: Build prompt
+    prompt = _build_prompt(user_query, context_text, calories, diet, allergens)
+
+    # Step 5: Generate content
+    with timed("generate"):
+        response = get_client().models.generate_content(
+            model=GEN_MODEL,
+            contents=[prompt]
+        )
+    record_generation(prompt, getattr(response, "usage_metadata", None))
 
     # Step 6: Return results
-    return {
+    out = {
+        "retrieved_recipe_ids": recipe_ids,
+        "context": context_text,
+        "generated_text": response.text,
+    }
+    if cache is not None:
+        cache.put(user_query, ckey, out, q_emb)
+    return {**out, "cache": None}
+
+
+def _cached(user_query: str, ckey: str, q_emb, use_cache: bool) -> Optional[dict]:
+    """Exact hit (q_emb None) or semantic hit on the query embedding."""
+    cache = get_response_cache()
+    if cache is None or not use_cache:
+        return None
+    with timed("cache_lookup"):
+        if q_emb is None:
+            hit = cache.get_exact(user_query, ckey)
+            return None if hit is None else {**hit, "cache": "exact"}
+        hit = cache.get_similar(q_emb, ckey)
+        return None if hit is None else {**hit, "cache": "semantic"}
+
+
+async def _aembed_query(user_query: str):
+    """Async _embed_query(): None in lexical mode or on embedding failure/timeout."""
+    if RETRIEVAL_MODE == "lexical":
+        return None
+    try:
+        return await stage("embed", aembed_texts(user_query), EMBED_TIMEOUT)
+    except Exception as e:
+        log.warning(f"Embedding unavailable ({type(e).__name__}: {e}); using lexical retrieval")
+        note(embed_error=type(e).__name__)
+        return None
+
+
+def _store(user_query: str, ckey: str, out: dict, q_emb):
+    cache = get_response_cache()
+    if cache is not None:
+        cache.put(user_query, ckey, out, q_emb)
+
+
+async def _aprepare(user_query: str, calories, diet, allergens: List[str], k_ing: int, k_rec: int,
+                    q_emb=None):
+    """
+    Async retrieval half of the pipeline: (recipe_ids, context_text, prompt).
+    `q_emb` is the query embedding shared by both searches; None means
+    lexical-only retrieval.
+    """
+    constraints = Constraints(diet=diet, allergens=allergens, max_kcal=calories)
+
+    # Recipe + ingredient search together; the ingredient side is only
+    # used to fill a sparse recipe list, so its timeout degrades to no results
+    rec_task = stage("recipe_search",
+                     run_blocking(_search_recipes, user_query, k_rec, constraints, q_emb), SEARCH_TIMEOUT)
+    ing_task = stage("ingredient_search",
+                     run_blocking(_search_ingredients, user_query, k_ing, constraints, q_emb), SEARCH_TIMEOUT)
+    rec_results, ing_results = await asyncio.gather(rec_task, ing_task, return_exceptions=True)
+    if isinstance(rec_results, BaseException):
+        raise rec_results
+    if isinstance(ing_results, StageTimeout):
+        ing_results = []
+    elif isinstance(ing_results, BaseException):
+        raise ing_results
+    if len(rec_results) >= k_rec:
+        ing_results = []
+    recipe_ids = _merge_ids(rec_results, ing_results)
+    note(recipe_hits=len(rec_results), ingredient_hits=len(ing_results))
+
+    context_text = await stage("context", run_blocking(build_context_for_recipes, recipe_ids, user_query), CONTEXT_TIMEOUT)
+    record_retrieval(recipe_ids, estimate_tokens(context_text))
+    if not context_text:
+        context_text = NO_CONTEXT
+    return recipe_ids, context_text, _build_prompt(user_query, context_text, calories, diet, allergens)
+
+
+async def aplan_recipe(
+    user_query: str,
+    calories: Optional[int] = None,
+    diet: Optional[str] = None,
+    allergens: Optional[List[str]] = None,
+    k_ing: int = 15,
+    k_rec: int = 8,
+    use_cache: bool = True,
+    timings: bool = False,
+):
+    """
+    plan_recipe() for the async API: the query is embedded once, recipe and
+    ingredient search run concurrently on the blocking pool, and generation
+    awaits the async Gemini client. Each stage has its own timeout.
+    `timings` adds a per-stage ms breakdown.
+    """
+    with trace_request("async") as trace:
+        out = await _aplan_recipe(user_query, calories, diet, allergens or [], k_ing, k_rec, use_cache)
+        trace.note(cache=out["cache"])
+    return {**out, "timings": trace.breakdown()} if timings else out
+
+
+async def _aplan_recipe(user_query: str, calories, diet, allergens: List[str], k_ing: int, k_rec: int,
+                        use_cache: bool) -> dict:
+    ckey = constraint_key(calories, diet, allergens, k_ing, k_rec)
+    hit = _cached(user_query, ckey, None, use_cache)
+    if hit is None:
+        q_emb = await _aembed_query(user_query)
+        hit = _cached(user_query, ckey, q_emb, use_cache) if q_emb is not None else None
+    if hit is not None:
+        return hit
+
+    recipe_ids, context_text, prompt = await _aprepare(
+        user_query, calories, diet, allergens, k_ing, k_rec, q_emb)
+    response = await stage("generate",
+                           get_client().aio.models.generate_content(model=GEN_MODEL, contents=[prompt]),
+                           GENERATE_TIMEOUT)
+    record_generation(prompt, getattr(response, "usage_metadata", None))
+
+    out = {
         "retrieved_recipe_ids": recipe_ids,
         "context": context_text,
         "generated_text": response.text,
     }
+    _store(user_query, ckey, out, q_emb)
+    return {**out, "cache": None}
+
+
+async def astream_recipe(
+    user_query: str,
+    calories: Optional[int] = None,
+    diet: Optional[str] = None,
+    allergens: Optional[List[str]] = None,
+    k_ing: int = 15,
+    k_rec: int = 8,
+    use_cache: bool = True,
+    timings: bool = False,
+) -> AsyncIterator[Tuple[str, dict]]:
+    """
+    Streaming aplan_recipe(): yields ("meta", {...}) as soon as retrieval is
+    done, then ("chunk", {"text": ...}) per generated chunk and finally
+    ("done", {}). GENERATE_TIMEOUT bounds the whole generation. A cached
+    response is replayed as a single chunk. `timings` adds the per-stage ms
+    breakdown to the "done" event.
+    """
+    with trace_request("stream") as trace:
+        async for event, data in _astream_recipe(user_query, calories, diet, allergens or [],
+                                                 k_ing, k_rec, use_cache):
+            if event == "meta":
+                trace.note(cache=data["cache"])
+            elif event == "done" and timings:
+                data = {**data, "timings": trace.breakdown()}
+            yield event, data
+
+
+async def _astream_recipe(user_query: str, calories, diet, allergens: List[str], k_ing: int, k_rec: int,
+                          use_cache: bool) -> AsyncIterator[Tuple[str, dict]]:
+    ckey = constraint_key(calories, diet, allergens, k_ing, k_rec)
+    hit = _cached(user_query, ckey, None, use_cache)
+    if hit is None:
+        q_emb = await _aembed_query(user_query)
+        hit = _cached(user_query, ckey, q_emb, use_cache) if q_emb is not None else None
+    if hit is not None:
+        yield "meta", {"retrieved_recipe_ids": hit["retrieved_recipe_ids"], "context": hit["context"],
+                       "cache": hit["cache"]}
+        yield "chunk", {"text": hit["generated_text"]}
+        yield "done", {}
+        return
+
+    recipe_ids, context_text, prompt = await _aprepare(
+        user_query, calories, diet, allergens, k_ing, k_rec, q_emb)
+    yield "meta", {"retrieved_recipe_ids": recipe_ids, "context": context_text, "cache": None}
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + GENERATE_TIMEOUT
+    stream = await stage("generate",
+                         get_client().aio.models.generate_content_stream(model=GEN_MODEL, contents=[prompt]),
+                         GENERATE_TIMEOUT)
+    chunks = stream.__aiter__()
+    parts, usage = [], None
+    while True:
+        try:
+            chunk = await stage("generate_stream", chunks.__anext__(), max(deadline - loop.time(), 0))
+        except StopAsyncIteration:
+            break
+        usage = getattr(chunk, "usage_metadata", None) or usage  # totals arrive on the last chunk
+        if chunk.text:
+            parts.append(chunk.text)
+            yield "chunk", {"text": chunk.text}
+    record_generation(prompt, usage)
+    _store(user_query, ckey, {"retrieved_recipe_ids": recipe_ids, "context": context_text,
+                              "generated_text": "".join(parts)}, q_emb)
+    yield "done", {}
+
+
+# -------------------------------------------------------------------
+# Batch planning
+# -------------------------------------------------------------------
+def _retrieve_batch(reqs: List[dict], q_embs: List[Optional[np.ndarray]]):
+    """
+    Blocking retrieval for a batch through the same _search_recipes() as
+    plan_recipe(): queries with an embedding share one vector scoring pass
+    per (k_ing, k_rec) group, queries without one (lexical mode, embedding
+    failure) fall back to BM25. One context fetch for the union of
+    retrieved recipes. Returns (recipe_ids, context_text) per request.
+    """
+    constraints = [Constraints(diet=r["diet"], allergens=r["allergens"], max_kcal=r["calories"]) for r in reqs]
+    groups = {}
+    for i, r in enumerate(reqs):
+        groups.setdefault((r["k_ing"], r["k_rec"]), []).append(i)
+
+    id_lists = [None] * len(reqs)
+    for (k_ing, k_rec), members in groups.items():
+        embedded = [i for i in members if q_embs[i] is not None]
+        vector = {}
+        if embedded:
+            found = search_recipes_batch(np.stack([q_embs[i] for i in embedded]), _vector_depth(k_rec),
+                                         [constraints[i] for i in embedded])
+            vector = dict(zip(embedded, found))
+        rec_lists = {i: _search_recipes(reqs[i]["user_query"], k_rec, constraints[i], q_embs[i], vector.get(i))
+                     for i in members}
+        # Ingredient search needs the embedding too (_search_ingredients)
+        sparse = [i for i in embedded if len(rec_lists[i]) < k_rec]
+        ing_lists = {}
+        if sparse:
+            found = search_ingredients_batch(np.stack([q_embs[i] for i in sparse]), k_ing,
+                                             [constraints[i] for i in sparse])
+            ing_lists = dict(zip(sparse, found))
+        for i in members:
+            id_lists[i] = _merge_ids(rec_lists[i], ing_lists.get(i, []))
+
+    contexts = build_contexts_for_recipes(id_lists, [r["user_query"] for r in reqs])
+    for ids, ctx in zip(id_lists, contexts):
+        record_retrieval(ids, estimate_tokens(ctx))
+    return [(ids, ctx or NO_CONTEXT) for ids, ctx in zip(id_lists, contexts)]
+
+
+async def _aembed_batch(texts: List[str]) -> List[Optional[np.ndarray]]:
+    """
+    Batched _aembed_query(): None for every text in lexical mode. A failed
+    chunk is retried one query at a time, so only the queries that still
+    fail degrade to lexical retrieval.
+    """
+    if RETRIEVAL_MODE == "lexical":
+        return [None] * len(texts)
+    out = []
+    for j in range(0, len(texts), BATCH_SIZE):
+        chunk = texts[j:j + BATCH_SIZE]
+        try:
+            out.extend(await stage("embed", aembed_texts(chunk), EMBED_TIMEOUT))
+        except Exception as e:
+            log.warning(f"Batch embedding failed ({type(e).__name__}: {e}); "
+                        f"embedding {len(chunk)} queries one by one")
+            singles = await asyncio.gather(*(_aembed_query(t) for t in chunk))
+            out.extend(None if q is None else q.reshape(-1) for q in singles)
+    return out
+
+
+def _batch_item(item: dict, use_cache: bool) -> dict:
+    return {
+        "user_query": item["user_query"],
+        "calories": item.get("calories"),
+        "diet": item.get("diet"),
+        "allergens": item.get("allergens") or [],
+        "k_ing": item.get("k_ing", 15),
+        "k_rec": item.get("k_rec", 8),
+        "use_cache": item.get("use_cache", use_cache),
+    }
+
+
+async def plan_recipes(items: List[dict], concurrency: int = GEN_CONCURRENCY,
+                       use_cache: bool = True) -> AsyncIterator[Tuple[int, dict]]:
+    """
+    Batch aplan_recipe(): `items` are dicts of plan_recipe() keyword
+    arguments, each with an optional "use_cache" (default `use_cache`;
+    False skips cache reads for that item only). Queries are embedded in batched calls, scored together
+    against the index, contexts are fetched once for the whole batch, and
+    at most `concurrency` generations run at a time. Yields (position,
+    result) as each item finishes; a failed generation yields an "error".
+    """
+    reqs = [_batch_item(it, use_cache) for it in items]
+    ckeys = [constraint_key(r["calories"], r["diet"], r["allergens"], r["k_ing"], r["k_rec"]) for r in reqs]
+    cache = get_response_cache()
+
+    pending = []
+    for i, r in enumerate(reqs):
+        hit = cache.get_exact(r["user_query"], ckeys[i]) if cache is not None and r["use_cache"] else None
+        if hit is not None:
+            REQUESTS.inc("batch", "exact")
+            yield i, {**hit, "cache": "exact"}
+        else:
+            pending.append(i)
+    if not pending:
+        return
+
+    # Batched query embedding (the embedding cache dedupes repeats)
+    q_embs = await _aembed_batch([reqs[i]["user_query"] for i in pending])
+
+    todo, todo_embs = [], []
+    leaders, followers = {}, {}   # identical (query, constraints) in one batch generate once
+    for i, q_emb in zip(pending, q_embs):
+        hit = (cache.get_similar(q_emb, ckeys[i])
+               if cache is not None and reqs[i]["use_cache"] and q_emb is not None else None)
+        if hit is not None:
+            REQUESTS.inc("batch", "semantic")
+            yield i, {**hit, "cache": "semantic"}
+            continue
+        key = (normalize_text(reqs[i]["user_query"]), ckeys[i])
+        if key in leaders:
+            followers[leaders[key]].append(i)
+            continue
+        leaders[key], followers[i] = i, []
+        todo.append(i)
+        todo_embs.append(q_emb)
+    if not todo:
+        return
+
+    with timed("batch_retrieval"):
+        retrieved = await run_blocking(_retrieve_batch, [reqs[i] for i in todo], todo_embs)
+
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def generate(i: int, q_emb: Optional[np.ndarray], recipe_ids: List[int], context_text: str):
+        r = reqs[i]
+        prompt = _build_prompt(r["user_query"], context_text, r["calories"], r["diet"], r["allergens"])
+        async with sem:
+            try:
+                response = await stage("generate",
+                                       get_client().aio.models.generate_content(model=GEN_MODEL, contents=[prompt]),
+                                       GENERATE_TIMEOUT)
+            except Exception as e:
+                return i, {"retrieved_recipe_ids": recipe_ids, "context": context_text, "error": str(e)}
+        record_generation(prompt, getattr(response, "usage_metadata", None))
+        out = {"retrieved_recipe_ids": recipe_ids, "context": context_text, "generated_text": response.text}
+        _store(r["user_query"], ckeys[i], out, q_emb)
+        return i, {**out, "cache": None}
+
+    tasks = [asyncio.create_task(generate(i, q_emb, ids, ctx))
+             for i, q_emb, (ids, ctx) in zip(todo, todo_embs, retrieved)]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            i, result = await fut
+            REQUESTS.inc("batch", "error" if "error" in result else "miss", amount=1 + len(followers[i]))
+            yield i, result
+            for j in followers[i]:
+                yield j, result
+    finally:
+        for task in tasks:
+            task.cancel()
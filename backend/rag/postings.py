@@ -0,0 +1,204 @@
+# backend/rag/postings.py
+import os
+import sqlite3
+import numpy as np
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from backend.utils.text_norm import TOKEN_RE
+from .index import top_k
+
+# Recipes containing all of the top matched (token-disjoint) ingredients get a
+# bonus of COOCCUR_BOOST x the best similarity: "chicken + lemon + rice" first
+COOCCUR_TOP = int(os.getenv("POSTINGS_COOCCUR_TOP", "3"))
+COOCCUR_BOOST = float(os.getenv("POSTINGS_COOCCUR_BOOST", "0.5"))
+
+
+class IngredientPostings:
+    """
+    Inverted index canonical ingredient -> recipe ids, stored CSR-style:
+    `postings[offsets[t]:offsets[t+1]]` is the sorted, unique int32 recipe id
+    array of term `t`. A token -> term ids map lets verbose USDA names
+    ("chicken broiler breast meat only") resolve to the shorter recipe terms
+    they contain ("chicken breast", "chicken").
+    """
+
+    def __init__(self, terms: List[str], offsets: np.ndarray, postings: np.ndarray):
+        self.terms = list(terms)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.postings = np.asarray(postings, dtype=np.int32)
+        self.term_ids: Dict[str, int] = {t: i for i, t in enumerate(self.terms)}
+
+        self.term_tokens = [frozenset(TOKEN_RE.findall(t)) for t in self.terms]
+        by_token: Dict[str, List[int]] = {}
+        for tid, toks in enumerate(self.term_tokens):
+            for tok in toks:
+                by_token.setdefault(tok, []).append(tid)
+        self.token_terms = {tok: np.array(ids, dtype=np.int32) for tok, ids in by_token.items()}
+
+        self.terms_for_name = lru_cache(maxsize=65536)(self._terms_for_name)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    # ---------------------------------------------------------------
+    # Build / persist
+    # ---------------------------------------------------------------
+    @classmethod
+    def from_db(cls, conn: sqlite3.Connection) -> "IngredientPostings":
+        import pandas as pd  # lazy, as in text_norm: a saved .npz loads without it
+        df = pd.read_sql_query("""
+            SELECT canonical_ingredient AS term, recipe_id
+            FROM recipe_ingredients
+            WHERE canonical_ingredient IS NOT NULL AND canonical_ingredient != ''
+        """, conn)
+        return cls.from_pairs(df["term"].to_numpy(), df["recipe_id"].to_numpy())
+
+    @classmethod
+    def from_pairs(cls, terms: np.ndarray, recipe_ids: np.ndarray) -> "IngredientPostings":
+        import pandas as pd
+        if len(terms) == 0:
+            return cls([], np.zeros(1, dtype=np.int64), np.empty(0, dtype=np.int32))
+
+        codes, vocab = pd.factorize(terms, sort=True)
+        pairs = np.unique(np.stack([codes.astype(np.int64), recipe_ids.astype(np.int64)], axis=1), axis=0)
+        counts = np.bincount(pairs[:, 0], minlength=len(vocab))
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(vocab.tolist(), offsets, pairs[:, 1].astype(np.int32))
+
+    def save(self, path: Path):
+        tmp = Path(str(path) + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, terms=np.array(self.terms, dtype=object),
+                     offsets=self.offsets, postings=self.postings)
+        tmp.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["IngredientPostings"]:
+        if not Path(path).exists():
+            return None
+        with np.load(path, allow_pickle=True) as z:
+            return cls(z["terms"].tolist(), z["offsets"], z["postings"])
+
+    # ---------------------------------------------------------------
+    # Lookup
+    # ---------------------------------------------------------------
+    def postings_for(self, term_id: int) -> np.ndarray:
+        return self.postings[self.offsets[term_id]:self.offsets[term_id + 1]]
+
+    def _terms_for_name(self, name: str) -> Tuple[int, ...]:
+        """Exact term, else every term whose tokens are all contained in `name`."""
+        tid = self.term_ids.get(name)
+        if tid is not None:
+            return (tid,)
+        toks = frozenset(TOKEN_RE.findall(name))
+        cand = [self.token_terms[t] for t in toks if t in self.token_terms]
+        if not cand:
+            return ()
+        return tuple(int(t) for t in np.unique(np.concatenate(cand)) if self.term_tokens[t] <= toks)
+
+    def recipes_for(self, name: str) -> np.ndarray:
+        """Sorted recipe ids using any recipe ingredient that `name` resolves to."""
+        tids = self.terms_for_name(name)
+        if not tids:
+            return np.empty(0, dtype=np.int32)
+        if len(tids) == 1:
+            return self.postings_for(tids[0])
+        return np.unique(np.concatenate([self.postings_for(t) for t in tids]))
+
+    def _known_token(self, tok: str) -> Optional[str]:
+        """`tok` or its singular ("almonds" -> "almond", "peaches" -> "peach") if indexed."""
+        for cand in (tok, tok[:-1] if tok.endswith("s") else None, tok[:-2] if tok.endswith("es") else None):
+            if cand and cand in self.token_terms:
+                return cand
+        return None
+
+    def recipes_mentioning(self, text: str) -> np.ndarray:
+        """Sorted recipe ids using any ingredient whose name contains every token of `text`."""
+        toks = [self._known_token(t) for t in TOKEN_RE.findall(text.lower())]
+        if not toks or any(t is None for t in toks):
+            return np.empty(0, dtype=np.int32)
+        tids = self.token_terms[toks[0]]
+        for tok in toks[1:]:
+            tids = np.intersect1d(tids, self.token_terms[tok], assume_unique=True)
+        if len(tids) == 0:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate([self.postings_for(t) for t in tids]))
+
+    @staticmethod
+    def intersect(arrays: Sequence[np.ndarray]) -> np.ndarray:
+        """Intersection of sorted unique id arrays: pairwise merge, smallest first."""
+        arrays = sorted(arrays, key=len)
+        if not arrays:
+            return np.empty(0, dtype=np.int32)
+        out = arrays[0]
+        for arr in arrays[1:]:
+            if len(out) == 0:
+                break
+            out = np.intersect1d(out, arr, assume_unique=True)
+        return out
+
+    def recipes_with_all(self, names: Iterable[str]) -> np.ndarray:
+        """Recipes containing every ingredient in `names`."""
+        return self.intersect([self.recipes_for(n) for n in names])
+
+    def _groups(self, tids: List[int]) -> List[List[int]]:
+        """
+        Matched terms (best first) grouped by ingredient: a term sharing a
+        token with a better one ("chicken breast" after "chicken") joins
+        its group instead of starting its own.
+        """
+        groups: List[List[int]] = []
+        for tid in tids:
+            group = next((g for g in groups if self.term_tokens[tid] & self.term_tokens[g[0]]), None)
+            if group is None:
+                groups.append([tid])
+            else:
+                group.append(tid)
+        return groups
+
+    def _group_recipes(self, group: List[int], best: Dict[int, float]) -> Tuple[np.ndarray, np.ndarray]:
+        """(recipe ids, similarity of the best group term each contains)."""
+        if len(group) == 1:
+            rids = self.postings_for(group[0])
+            return rids, np.full(len(rids), best[group[0]], dtype=np.float32)
+        rids = np.concatenate([self.postings_for(t) for t in group])
+        sims = np.concatenate([np.full(len(self.postings_for(t)), best[t], dtype=np.float32) for t in group])
+        rids, first = np.unique(rids, return_index=True)  # terms are best first: keep each id's first
+        return rids, sims[first]
+
+    def score(self, matches: List[Tuple[str, float]], k: int = 10,
+              keep: Optional[Callable[[np.ndarray], np.ndarray]] = None) -> List[Tuple[int, float]]:
+        """
+        Rank recipes by the summed similarity of the matched ingredients they
+        contain, so a recipe with chicken + lemon + rice outranks one with
+        only chicken. Near-duplicate matches count once: per canonical term
+        the best similarity, per ingredient group (terms sharing a token)
+        the best term the recipe contains. Recipes containing all of the top
+        COOCCUR_TOP ingredients (a sorted-array merge) get a co-occurrence
+        bonus. `keep` maps candidate ids to a bool mask to drop inadmissible
+        recipes before ranking. Returns [(recipe_id, score)] best first.
+        """
+        best: Dict[int, float] = {}
+        for name, sim in matches:
+            for tid in self.terms_for_name(name):
+                best[tid] = max(sim, best.get(tid, sim))
+        tids = sorted((t for t in best if self.offsets[t + 1] > self.offsets[t]), key=lambda t: -best[t])
+        if not tids:
+            return []
+
+        per_group = [self._group_recipes(g, best) for g in self._groups(tids)]
+        rids, inverse = np.unique(np.concatenate([r for r, _ in per_group]), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate([w for _, w in per_group])).astype(np.float32)
+
+        top = [r for r, _ in per_group[:COOCCUR_TOP]]
+        if len(top) > 1 and COOCCUR_BOOST:
+            together = self.intersect(top)
+            scores[np.isin(rids, together, assume_unique=True)] += COOCCUR_BOOST * best[tids[0]]
+        if keep is not None:
+            ok = keep(rids)
+            rids, scores = rids[ok], scores[ok]
+        top = top_k(scores, k)
+        return [(int(r), float(s)) for r, s in zip(rids[top], scores[top])]
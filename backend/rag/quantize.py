@@ -0,0 +1,360 @@
+# backend/rag/quantize.py
+import os
+import sqlite3
+import time
+import numpy as np
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from .index import SELECTIVE_FRACTION, VectorIndex, normalize_query, normalize_rows, top_k
+from backend.utils.db import fetch_by_ids, read_conn
+
+# -------------------------------------------------------------------
+# Config
+# -------------------------------------------------------------------
+ENCODINGS = ("float32", "float16", "int8")
+# How embedding BLOBs are written to SQLite
+EMBED_STORAGE = os.getenv("EMBED_STORAGE", "float32").lower()
+# How the resident (non-FAISS) search matrix is held in memory
+EMBED_RESIDENT = os.getenv("EMBED_RESIDENT", "float32").lower()
+# Re-score the top k * factor candidates from the stored vectors; 0 disables
+EMBED_RESCORE = int(os.getenv("EMBED_RESCORE", "0"))
+SCORE_BLOCK_ROWS = 65536   # rows upcast to float32 at a time while scoring
+TRANSCODE_BATCH = 5000
+
+
+# -------------------------------------------------------------------
+# Codecs
+# -------------------------------------------------------------------
+def _check(encoding: str) -> str:
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown embedding encoding: {encoding}")
+    return encoding
+
+
+def encode(vec: np.ndarray, encoding: str = EMBED_STORAGE) -> bytes:
+    """One embedding -> BLOB. int8 is symmetric per vector: float32 scale followed by the codes."""
+    v = np.asarray(vec, dtype=np.float32).ravel()
+    if _check(encoding) == "float32":
+        return v.tobytes()
+    if encoding == "float16":
+        return v.astype(np.float16).tobytes()
+    scale = float(np.abs(v).max()) / 127.0 or 1.0
+    codes = np.clip(np.rint(v / scale), -127, 127).astype(np.int8)
+    return np.float32(scale).tobytes() + codes.tobytes()
+
+
+def decode(blob: bytes, encoding: str = "float32") -> np.ndarray:
+    """BLOB -> float32 vector."""
+    if _check(encoding) == "float32":
+        return np.frombuffer(blob, dtype=np.float32)
+    if encoding == "float16":
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+    scale = np.frombuffer(blob, dtype=np.float32, count=1)[0]
+    return np.frombuffer(blob, dtype=np.int8, offset=4).astype(np.float32) * scale
+
+
+# -------------------------------------------------------------------
+# Metadata
+# -------------------------------------------------------------------
+def ensure_meta(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_meta (
+            name TEXT PRIMARY KEY,
+            model TEXT,
+            dim INTEGER,
+            encoding TEXT NOT NULL,
+            updated_at REAL,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(embedding_meta)")}
+    if "version" not in cols:
+        conn.execute("ALTER TABLE embedding_meta ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+
+def read_meta(conn: sqlite3.Connection, table: str) -> Optional[dict]:
+    """Recorded model/dim/encoding for `table`, or None (tables from before the metadata)."""
+    try:
+        row = conn.execute(
+            "SELECT model, dim, encoding FROM embedding_meta WHERE name = ?", (table,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        return None  # no metadata table yet
+    return dict(zip(("model", "dim", "encoding"), row)) if row else None
+
+
+def stored_encoding(conn: sqlite3.Connection, table: str) -> str:
+    meta = read_meta(conn, table)
+    return meta["encoding"] if meta else "float32"
+
+
+def write_meta(conn: sqlite3.Connection, table: str, model: str, dim: int, encoding: str):
+    conn.execute("""
+        INSERT INTO embedding_meta (name, model, dim, encoding, updated_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            model = excluded.model, dim = excluded.dim,
+            encoding = excluded.encoding, updated_at = excluded.updated_at
+    """, (table, model, dim, _check(encoding), time.time()))
+
+
+def published_version(conn: sqlite3.Connection, table: str) -> int:
+    """How many times `table`'s search index has been published (0: never, or no metadata yet)."""
+    try:
+        row = conn.execute("SELECT version FROM embedding_meta WHERE name = ?", (table,)).fetchone()
+    except sqlite3.OperationalError:
+        return 0  # no metadata table / version column yet
+    return row[0] if row else 0
+
+
+def write_published_version(conn: sqlite3.Connection, table: str, version: int):
+    with conn:
+        conn.execute("""
+            INSERT INTO embedding_meta (name, encoding, updated_at, version) VALUES (?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET version = excluded.version, updated_at = excluded.updated_at
+        """, (table, stored_encoding(conn, table), time.time(), version))
+
+
+def _write_encoding(conn: sqlite3.Connection, table: str, encoding: str):
+    conn.execute("""
+        INSERT INTO embedding_meta (name, encoding, updated_at) VALUES (?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET encoding = excluded.encoding, updated_at = excluded.updated_at
+    """, (table, _check(encoding), time.time()))
+
+
+def transcode_table(conn: sqlite3.Connection, table: str, id_col: str, src: str, dst: str) -> int:
+    """
+    Re-encode every stored embedding from `src` to `dst` (no re-embedding).
+    One transaction covers every row and the embedding_meta update, so an
+    interrupted run leaves the table untouched and readers (WAL snapshots)
+    see either all-old or all-new BLOBs, each with the matching encoding.
+    """
+    _check(src), _check(dst)
+    last, n = -1, 0
+    with conn:
+        while True:
+            rows = conn.execute(
+                f"SELECT {id_col}, embedding FROM {table} WHERE {id_col} > ? ORDER BY {id_col} LIMIT ?",
+                (last, TRANSCODE_BATCH),
+            ).fetchall()
+            if not rows:
+                break
+            conn.executemany(f"UPDATE {table} SET embedding = ? WHERE {id_col} = ?",
+                             [(encode(decode(blob, src), dst), rid) for rid, blob in rows])
+            last, n = rows[-1][0], n + len(rows)
+        _write_encoding(conn, table, dst)
+    print(f"Transcoded {n} {table} rows from {src} to {dst}")
+    return n
+
+
+@contextmanager
+def read_snapshot(conn: sqlite3.Connection):
+    """One read transaction, so the recorded encoding and the BLOBs come from the same commit."""
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN")
+    try:
+        yield conn
+    finally:
+        conn.execute("COMMIT")
+
+
+# -------------------------------------------------------------------
+# Compact resident index
+# -------------------------------------------------------------------
+class QuantizedIndex:
+    """
+    VectorIndex contract over a compact matrix: float16 rows, or int8 rows
+    with one float32 scale per row. Scoring upcasts SCORE_BLOCK_ROWS rows
+    at a time, so the full float32 matrix is never materialized.
+    """
+
+    def __init__(self, ids: np.ndarray, codes: np.ndarray, scales: Optional[np.ndarray] = None):
+        self.ids = np.ascontiguousarray(ids, dtype=np.int64)
+        self.codes = np.ascontiguousarray(codes)
+        self.scales = None if scales is None else np.ascontiguousarray(scales, dtype=np.float32)
+        self.encoding = "int8" if self.codes.dtype == np.int8 else "float16"
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self.codes.shape[1] if self.codes.ndim == 2 else 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (0 if self.scales is None else self.scales.nbytes)
+
+    @classmethod
+    def from_matrix(cls, ids: np.ndarray, matrix: np.ndarray, encoding: str) -> "QuantizedIndex":
+        """Quantize L2-normalized float32 rows."""
+        if _check(encoding) == "float16":
+            return cls(ids, matrix.astype(np.float16))
+        if encoding != "int8":
+            raise ValueError("QuantizedIndex holds float16 or int8 rows")
+        scales = np.abs(matrix).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+        return cls(ids, codes, scales)
+
+    @classmethod
+    def from_db(cls, conn: sqlite3.Connection, table: str, id_col: str,
+                encoding: str) -> "QuantizedIndex":
+        """Decode `table` SCORE_BLOCK_ROWS rows at a time, quantizing each chunk as it fills."""
+        stored = stored_encoding(conn, table)
+        ids, parts, chunk, chunk_ids = [], [], [], []
+        dim = None
+
+        def flush():
+            if chunk:
+                parts.append(cls.from_matrix(np.array(chunk_ids), normalize_rows(np.stack(chunk)), encoding))
+                ids.append(parts[-1].ids)
+                chunk.clear(), chunk_ids.clear()
+
+        for row_id, blob in conn.execute(f"SELECT {id_col}, embedding FROM {table} ORDER BY {id_col}"):
+            vec = decode(blob, stored)
+            dim = dim or vec.shape[0]
+            if vec.shape[0] != dim:
+                continue  # stale row from a different model; skip it
+            chunk.append(vec)
+            chunk_ids.append(row_id)
+            if len(chunk) == SCORE_BLOCK_ROWS:
+                flush()
+        flush()
+
+        if not parts:
+            return cls.from_matrix(np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32), encoding)
+        scales = None if parts[0].scales is None else np.concatenate([p.scales for p in parts])
+        return cls(np.concatenate(ids), np.concatenate([p.codes for p in parts]), scales)
+
+    def _scores(self, q: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """(n, m) query block -> (m, n_rows) float32 scores over `rows` (all when None)."""
+        n = len(self) if rows is None else len(rows)
+        out = np.empty((q.shape[0], n), dtype=np.float32)
+        for start in range(0, n, SCORE_BLOCK_ROWS):
+            sl = slice(start, start + SCORE_BLOCK_ROWS)
+            idx = sl if rows is None else rows[sl]
+            block = self.codes[idx].astype(np.float32)
+            s = q @ block.T
+            if self.scales is not None:
+                s *= self.scales[idx]
+            out[:, sl] = s
+        return out
+
+    def search(self, query_vec: np.ndarray, k: int = 10,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        return self.search_batch(normalize_query(query_vec)[None, :], k, mask)[0]
+
+    def search_batch(self, query_mat: np.ndarray, k: int = 10,
+                     mask: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        queries = normalize_rows(np.array(query_mat, dtype=np.float32, copy=True).reshape(len(query_mat), -1))
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        if len(self) == 0 or k <= 0:
+            return [empty] * len(queries)
+
+        ids, rows = self.ids, None
+        if mask is not None:
+            admitted = np.flatnonzero(mask)
+            if len(admitted) == 0:
+                return [empty] * len(queries)
+            k = min(k, len(admitted))
+            if len(admitted) < SELECTIVE_FRACTION * len(self):
+                ids, rows, mask = ids[admitted], admitted, None
+
+        scores = self._scores(queries, rows)
+        if mask is not None:
+            scores[:, ~mask] = -np.inf
+        out = []
+        for row in scores:
+            top = top_k(row, k)
+            out.append((ids[top], row[top]))
+        return out
+
+
+def load_resident_index(db_path: Path, table: str, id_col: str, encoding: str = EMBED_RESIDENT):
+    """Resident search index for `table` in `encoding`, decoding whatever storage encoding is recorded."""
+    with read_snapshot(read_conn(db_path)) as conn:
+        if encoding == "float32":
+            stored = stored_encoding(conn, table)
+            return VectorIndex.from_db(conn, table, id_col, decode=lambda blob: decode(blob, stored))
+        return QuantizedIndex.from_db(conn, table, id_col, encoding)
+
+
+# -------------------------------------------------------------------
+# Exact rescoring
+# -------------------------------------------------------------------
+Vectors = Callable[[np.ndarray], Tuple[np.ndarray, np.ndarray]]
+
+
+def sqlite_vectors(table: str, id_col: str) -> Vectors:
+    """ids -> (found ids, stored vectors) in rank order, via the shared read-only connection."""
+    def fetch(ids: np.ndarray):
+        with read_snapshot(read_conn()) as conn:
+            stored = stored_encoding(conn, table)
+            rows = fetch_by_ids(table, ("embedding",), ids, id_col=id_col, conn=conn)
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+        return (np.array([r[0] for r in rows], dtype=np.int64),
+                np.stack([decode(blob, stored) for _, blob in rows]))
+    return fetch
+
+
+class RescoringIndex:
+    """
+    Wraps a compact index (int8/float16 resident or IVF-PQ): over-fetch
+    k * factor candidates, then re-rank them against `vectors(ids)`, the
+    higher precision stored embeddings.
+    """
+
+    def __init__(self, base, vectors: Vectors, factor: int = EMBED_RESCORE):
+        self.base = base
+        self.vectors = vectors
+        self.factor = max(1, factor)
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self.base.ids
+
+    def __len__(self) -> int:
+        return len(self.base)
+
+    @property
+    def dim(self) -> int:
+        return self.base.dim
+
+    def _rerank(self, q: np.ndarray, cand: Tuple[np.ndarray, np.ndarray], k: int):
+        if len(cand[0]) == 0:
+            return cand
+        ids, vecs = self.vectors(cand[0])
+        if len(ids) == 0:
+            return ids, np.empty(0, dtype=np.float32)
+        scores = normalize_rows(np.array(vecs, dtype=np.float32, copy=True)) @ q
+        top = top_k(scores, k)
+        return ids[top], scores[top]
+
+    def search(self, query_vec: np.ndarray, k: int = 10,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        q = normalize_query(query_vec)
+        return self._rerank(q, self.base.search(q, k * self.factor, mask), k)
+
+    def search_batch(self, query_mat: np.ndarray, k: int = 10,
+                     mask: Optional[np.ndarray] = None) -> List[Tuple[np.ndarray, np.ndarray]]:
+        queries = normalize_rows(np.array(query_mat, dtype=np.float32, copy=True).reshape(len(query_mat), -1))
+        cands = self.base.search_batch(queries, k * self.factor, mask)
+        return [self._rerank(q, c, k) for q, c in zip(queries, cands)]
+
+
+def compact(index: VectorIndex, encoding: str = EMBED_RESIDENT):
+    """`index` re-held in the resident encoding."""
+    return index if encoding == "float32" else QuantizedIndex.from_matrix(index.ids, index.matrix, encoding)
+
+
+def with_rescoring(index, table: str, id_col: str, factor: int = EMBED_RESCORE):
+    """Wrap `index` in exact rescoring when enabled and it is not already exact float32."""
+    if factor <= 0 or isinstance(index, VectorIndex) or getattr(index, "kind", None) == "flat":
+        return index
+    return RescoringIndex(index, sqlite_vectors(table, id_col), factor)
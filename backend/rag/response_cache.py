@@ -0,0 +1,170 @@
+# backend/rag/response_cache.py
+import hashlib
+import os
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from .embed_cache import normalize_text
+from .index import normalize_query
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE", "on").lower() not in ("0", "off", "false")
+RESPONSE_CACHE_ITEMS = int(os.getenv("RESPONSE_CACHE_ITEMS", "1024"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))            # seconds
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.93"))  # cosine
+
+
+def constraint_key(calories=None, diet=None, allergens=None, k_ing=None, k_rec=None) -> str:
+    """Canonical form of everything besides the query that shapes a response."""
+    allergens = sorted({normalize_text(a) for a in (allergens or []) if a.strip()})
+    return "|".join([
+        str(int(calories)) if calories else "",
+        normalize_text(diet or ""),
+        ",".join(allergens),
+        f"{k_ing}:{k_rec}",
+    ])
+
+
+def _exact_key(query: str, ckey: str) -> bytes:
+    return hashlib.sha1(f"{normalize_text(query)}\0{ckey}".encode("utf-8")).digest()
+
+
+@dataclass
+class _Entry:
+    ckey: str
+    vec: Optional[np.ndarray]
+    value: dict
+    expires: float
+
+
+class ResponseCache:
+    """
+    In-process cache of generated responses. Lookups try the exact key
+    (normalized query + constraints) first, then the nearest cached query
+    embedding with identical constraints above `threshold`. Entries expire
+    after `ttl` seconds and the least recently used are evicted past
+    `max_items`.
+    """
+
+    def __init__(self, max_items: int = RESPONSE_CACHE_ITEMS, ttl: float = RESPONSE_CACHE_TTL,
+                 threshold: float = RESPONSE_CACHE_THRESHOLD):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: "OrderedDict[bytes, _Entry]" = OrderedDict()
+        # constraint key -> (entry keys, stacked unit query vectors); rebuilt lazily
+        self._groups: Dict[str, Tuple[List[bytes], Optional[np.ndarray]]] = {}
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    # ---------------------------------------------------------------
+    # Lookup / store
+    # ---------------------------------------------------------------
+    def get_exact(self, query: str, ckey: str) -> Optional[dict]:
+        """Exact hit or None; does not count a miss (a semantic lookup may follow)."""
+        key = _exact_key(query, ckey)
+        with self._lock:
+            entry = self._live(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry.value
+
+    def get_similar(self, query_vec: np.ndarray, ckey: str) -> Optional[dict]:
+        """Best cached response for a query embedding with the same constraints."""
+        with self._lock:
+            keys, mat = self._group_matrix(ckey)
+            if mat is not None:
+                sims = mat @ normalize_query(query_vec)
+                for row in np.argsort(-sims):
+                    if sims[row] < self.threshold:
+                        break
+                    entry = self._live(keys[row])
+                    if entry is not None:
+                        self._entries.move_to_end(keys[row])
+                        self.semantic_hits += 1
+                        return entry.value
+            self.misses += 1
+            return None
+
+    def put(self, query: str, ckey: str, value: dict, query_vec: Optional[np.ndarray] = None):
+        key = _exact_key(query, ckey)
+        vec = None if query_vec is None else normalize_query(query_vec).copy()
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(ckey, vec, value, time.monotonic() + self.ttl)
+            if vec is not None:
+                keys = self._groups.get(ckey, ([], None))[0]
+                self._groups[ckey] = (keys + [key], None)
+            while len(self._entries) > self.max_items:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "items": len(self._entries),
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+
+    # ---------------------------------------------------------------
+    # Internals (caller holds self._lock)
+    # ---------------------------------------------------------------
+    def _live(self, key: bytes) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires <= time.monotonic():
+            self._drop(key)
+            self.expired += 1
+            return None
+        return entry
+
+    def _drop(self, key: bytes):
+        entry = self._entries.pop(key)
+        group = self._groups.get(entry.ckey)
+        if entry.vec is not None and group is not None:
+            keys = [k for k in group[0] if k != key]
+            if keys:
+                self._groups[entry.ckey] = (keys, None)
+            else:
+                del self._groups[entry.ckey]
+
+    def _group_matrix(self, ckey: str):
+        group = self._groups.get(ckey)
+        if group is None:
+            return [], None
+        keys, mat = group
+        if mat is None:
+            mat = np.stack([self._entries[k].vec for k in keys])
+            self._groups[ckey] = (keys, mat)
+        return keys, mat
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Process-wide response cache, or None when RESPONSE_CACHE=off."""
+    global _cache
+    if _cache is None and RESPONSE_CACHE_ENABLED:
+        _cache = ResponseCache()
+    return _cache
@@ -0,0 +1,159 @@
+# backend/rag/shared_index.py
+import mmap
+import os
+import struct
+import threading
+import time
+import numpy as np
+from pathlib import Path
+from typing import Callable, Dict, NamedTuple, Optional, Tuple
+
+from .index import VectorIndex
+from .quantize import EMBED_RESIDENT, QuantizedIndex, compact
+
+# -------------------------------------------------------------------
+# Config
+# -------------------------------------------------------------------
+# Serve exact search from one memory-mapped matrix file shared by every worker process
+SHARED_INDEX = os.getenv("SHARED_INDEX", "on").lower() not in ("0", "off", "false")
+# How often (seconds) a worker re-reads the published version to notice a rebuild
+SHARED_CHECK_S = float(os.getenv("SHARED_CHECK_S", "1.0"))
+
+# Layout: 64-byte header | int64 ids | rows (dtype, dim) | float32 scales (int8 only).
+# Sections start on 64-byte boundaries so every array view is aligned.
+MAGIC = b"RAGVEC01"
+HEADER = struct.Struct("<8sQQI8s")   # magic, version, count, dim, dtype
+HEADER_BYTES = 64
+ALIGN = 64
+DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+
+class Header(NamedTuple):
+    version: int
+    count: int
+    dim: int
+    dtype: str
+
+
+def shared_path(index_dir: Path, table: str) -> Path:
+    return Path(index_dir) / f"{table}.vectors"
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _offsets(h: Header) -> Tuple[int, int, int, int]:
+    """Byte offsets of ids, rows and scales, and the total file size."""
+    ids_at = HEADER_BYTES
+    rows_at = _aligned(ids_at + 8 * h.count)
+    scales_at = _aligned(rows_at + np.dtype(DTYPES[h.dtype]).itemsize * h.count * h.dim)
+    end = scales_at + (4 * h.count if h.dtype == "int8" else 0)
+    return ids_at, rows_at, scales_at, end
+
+
+def read_header(path: Path) -> Optional[Header]:
+    """Header of a published matrix file, or None if missing or not one of ours."""
+    try:
+        with open(path, "rb") as f:
+            raw = f.read(HEADER.size)
+    except FileNotFoundError:
+        return None
+    if len(raw) < HEADER.size:
+        return None
+    magic, version, count, dim, dtype = HEADER.unpack(raw)
+    dtype = dtype.rstrip(b"\0").decode("ascii", "replace")
+    if magic != MAGIC or dtype not in DTYPES:
+        return None
+    return Header(version, count, dim, dtype)
+
+
+# -------------------------------------------------------------------
+# Publish
+# -------------------------------------------------------------------
+def write_shared_index(index_dir: Path, table: str, ids: np.ndarray, matrix: np.ndarray,
+                       version: int, encoding: str = EMBED_RESIDENT) -> Header:
+    """
+    Write L2-normalized float32 rows in the resident `encoding` stamped
+    with `version`, then atomically rename over the previous file.
+    Workers still mapping the old file keep it until they remap.
+    """
+    path = shared_path(index_dir, table)
+    dense = VectorIndex(ids, matrix)
+    resident = compact(dense, encoding) if len(dense) else dense
+    rows = resident.matrix if isinstance(resident, VectorIndex) else resident.codes
+    h = Header(version, len(dense), dense.dim, encoding)
+    ids_at, rows_at, scales_at, end = _offsets(h)
+
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, h.version, h.count, h.dim, h.dtype.encode("ascii")).ljust(HEADER_BYTES, b"\0"))
+        for at, arr in ((ids_at, dense.ids), (rows_at, rows),
+                        (scales_at, getattr(resident, "scales", None))):
+            if arr is None:
+                continue
+            f.write(b"\0" * (at - f.tell()))
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(end)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return h
+
+
+# -------------------------------------------------------------------
+# Map
+# -------------------------------------------------------------------
+def map_shared_index(index_dir: Path, table: str) -> Optional[Tuple[Header, object]]:
+    """
+    Map a published file read-only and wrap it without copying: a
+    VectorIndex for float32, a QuantizedIndex for float16 / int8. Pages
+    come from the OS page cache, so every process mapping the same file
+    shares one physical copy.
+    """
+    path = shared_path(index_dir, table)
+    h = read_header(path)
+    if h is None:
+        return None
+    ids_at, rows_at, scales_at, end = _offsets(h)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < end:
+            print(f"Shared index {path} is truncated; ignoring")
+            return None
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)  # stays valid after close / replace
+
+    ids = np.frombuffer(buf, dtype=np.int64, count=h.count, offset=ids_at)
+    rows = np.frombuffer(buf, dtype=DTYPES[h.dtype], count=h.count * h.dim, offset=rows_at)
+    rows = rows.reshape(h.count, h.dim)
+    if h.dtype == "float32":
+        return h, VectorIndex(ids, rows)
+    scales = np.frombuffer(buf, dtype=np.float32, count=h.count, offset=scales_at) if h.dtype == "int8" else None
+    return h, QuantizedIndex(ids, rows, scales)
+
+
+class VersionWatch:
+    """
+    Per-table published version this process has loaded, and a throttled
+    check (at most one read per SHARED_CHECK_S) for a newer one.
+    """
+
+    def __init__(self, interval: float = SHARED_CHECK_S):
+        self.interval = interval
+        self._loaded: Dict[str, int] = {}
+        self._checked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def loaded(self, table: str, version: int):
+        with self._lock:
+            self._loaded[table] = version
+            self._checked[table] = time.monotonic()
+
+    def changed(self, table: str, current: Callable[[], int]) -> bool:
+        """True (for one caller per interval) when `current()` differs from the loaded version."""
+        now = time.monotonic()
+        with self._lock:
+            if table not in self._loaded or now - self._checked.get(table, 0.0) < self.interval:
+                return False
+            self._checked[table] = now
+            loaded = self._loaded[table]
+        return current() != loaded
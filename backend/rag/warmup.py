@@ -0,0 +1,118 @@
+# backend/rag/warmup.py
+import os
+import threading
+import time
+import numpy as np
+from typing import Dict, Optional
+
+from .embeddings import (get_ingredient_index, get_ingredient_postings, get_recipe_filters,
+                         get_recipe_index, missing_index_tables, search_recipes_lexical)
+from .context import get_snippets
+from .index import VectorIndex
+from .quantize import QuantizedIndex, RescoringIndex
+
+WARMUP_ENABLED = os.getenv("WARMUP", "on").lower() not in ("0", "off", "false")
+WARMUP_QUERIES = int(os.getenv("WARMUP_QUERIES", "8"))
+WARMUP_TEXT = "easy chicken soup with carrots"
+TOUCH_BLOCK_BYTES = 64 * 1024 * 1024
+
+
+def touch(index) -> int:
+    """
+    Fault in the pages behind a resident index; returns bytes read. FAISS
+    indexes expose only ids here; their codes are paged in by _probe().
+    """
+    if isinstance(index, RescoringIndex):
+        return touch(index.base)
+    arrays = [index.ids]
+    if isinstance(index, VectorIndex):
+        arrays.append(index.matrix)
+    elif isinstance(index, QuantizedIndex):
+        arrays += [index.codes] + ([index.scales] if index.scales is not None else [])
+    total = 0
+    for arr in arrays:
+        flat = np.asarray(arr).reshape(-1)
+        step = max(1, TOUCH_BLOCK_BYTES // max(flat.itemsize, 1))
+        for start in range(0, len(flat), step):
+            flat[start:start + step].max()
+        total += flat.nbytes
+    return total
+
+
+def _probe(index, n: int) -> int:
+    """A few searches with random queries: exercises the FAISS / BLAS paths and their memory."""
+    if len(index) == 0 or n <= 0:
+        return 0
+    rng = np.random.default_rng(0)
+    queries = rng.normal(size=(n, index.dim)).astype(np.float32)
+    index.search_batch(queries, 10)
+    index.search(queries[0], 10)
+    return n
+
+
+# -------------------------------------------------------------------
+# Readiness state
+# -------------------------------------------------------------------
+_state: Dict[str, object] = {"status": "starting", "error": None, "timings": {}}
+_lock = threading.Lock()
+
+
+def status() -> dict:
+    with _lock:
+        return dict(_state)
+
+
+def _set(**values):
+    with _lock:
+        _state.update(values)
+
+
+def warm_up(queries: int = WARMUP_QUERIES) -> dict:
+    """
+    Load every resident index, touch its pages, run dummy searches and a
+    lexical query, and pre-parse the snippets they return. Marks the
+    process ready when done; a failure leaves it not ready with the error.
+    With no embedding tables yet the status is "not_built" until a rebuild
+    runs warm-up again. A process that is already ready stays ready while
+    it re-warms.
+    """
+    if status()["status"] != "ready":
+        _set(status="warming", error=None)
+    timings: Dict[str, float] = {}
+
+    def step(name, fn):
+        t0 = time.perf_counter()
+        out = fn()
+        timings[name] = round((time.perf_counter() - t0) * 1000, 1)
+        return out
+
+    try:
+        missing = missing_index_tables()
+        if missing:
+            _set(status="not_built", error=f"missing embedding tables: {', '.join(missing)}; "
+                                           "run /rebuild_indices", timings={})
+            print(f"Warm-up skipped: indexes not built ({', '.join(missing)})")
+            return status()
+        recipes = step("load_recipe_index", get_recipe_index)
+        ingredients = step("load_ingredient_index", get_ingredient_index)
+        step("load_filters", get_recipe_filters)
+        step("load_postings", get_ingredient_postings)
+        touched = step("touch_pages", lambda: touch(recipes) + touch(ingredients))
+        step("probe_search", lambda: (_probe(recipes, queries), _probe(ingredients, queries)))
+        hits = step("probe_lexical", lambda: search_recipes_lexical(WARMUP_TEXT, 10))
+        step("probe_snippets", lambda: get_snippets([h[0] for h in hits]))
+    except Exception as e:
+        _set(status="failed", error=f"{type(e).__name__}: {e}", timings=timings)
+        print(f"Warm-up failed: {type(e).__name__}: {e}")
+        return status()
+
+    _set(status="ready", timings={**timings, "touched_mb": round(touched / 2**20, 1),
+                                  "recipes": len(recipes), "ingredients": len(ingredients)})
+    print(f"Warm-up complete: {len(recipes)} recipes, {touched / 2**20:.0f} MB touched "
+          f"in {sum(timings.values()):.0f} ms")
+    return status()
+
+
+def mark_ready(reason: Optional[str] = None):
+    """Skip warm-up (WARMUP=off): ready immediately, indexes load on first query."""
+    _set(status="ready", error=None, timings={"skipped": reason or "warm-up disabled"})
@@ -0,0 +1,153 @@
+# backend/utils/db.py
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+DB_PATH = Path(os.getenv("RECIPES_DB", str(ROOT_DIR / "db" / "recipes.sqlite")))
+
+MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "1024"))
+CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+STATEMENT_CACHE = 256      # prepared statements kept per connection
+MAX_VARS = 900             # stay under SQLITE_MAX_VARIABLE_NUMBER on old builds
+
+READ_PRAGMAS = (
+    f"PRAGMA mmap_size={MMAP_MB * 1024 * 1024}",
+    f"PRAGMA cache_size=-{CACHE_MB * 1024}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA query_only=ON",
+)
+
+# -------------------------------------------------------------------
+# Connections
+# -------------------------------------------------------------------
+_local = threading.local()
+_wal_checked: set = set()
+_generation = 0
+_lock = threading.Lock()
+
+
+def set_db_path(path) -> None:
+    """Point every module at another database; per-thread readers reconnect lazily."""
+    global DB_PATH, _generation
+    with _lock:
+        DB_PATH = Path(path)
+        _generation += 1
+
+
+def _ensure_wal(path: Path) -> None:
+    """Switch the file to WAL once so readers never block the index builders."""
+    key = str(path)
+    if key in _wal_checked:
+        return
+    with _lock:
+        if key in _wal_checked or not path.exists():
+            return
+        try:
+            conn = sqlite3.connect(key, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.close()
+        except sqlite3.OperationalError:
+            pass  # read-only file system: readers still work in rollback mode
+        _wal_checked.add(key)
+
+
+def connect(path=None) -> sqlite3.Connection:
+    """New read-write connection (WAL) owned by the caller; used by builders."""
+    path = Path(path or DB_PATH)
+    conn = sqlite3.connect(str(path), timeout=30, cached_statements=STATEMENT_CACHE)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_MB * 1024}")
+    _wal_checked.add(str(path))
+    return conn
+
+
+def _open_reader(path: Path) -> sqlite3.Connection:
+    _ensure_wal(path)
+    conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True, timeout=30,
+                           cached_statements=STATEMENT_CACHE)
+    for pragma in READ_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def read_conn(path=None) -> sqlite3.Connection:
+    """
+    This thread's pooled read-only connection to `path` (default DB_PATH).
+    Connections are shared across calls; callers must not close them.
+    """
+    path = Path(path or DB_PATH)
+    pool: Dict[str, sqlite3.Connection] = getattr(_local, "pool", None)
+    if pool is None or getattr(_local, "generation", None) != _generation:
+        close_thread_conns()
+        pool = _local.pool = {}
+        _local.generation = _generation
+
+    key = str(path)
+    conn = pool.get(key)
+    if conn is not None:
+        try:
+            conn.total_changes  # raises if a caller closed it anyway
+            return conn
+        except sqlite3.ProgrammingError:
+            pass
+    conn = pool[key] = _open_reader(path)
+    return conn
+
+
+def close_thread_conns() -> None:
+    """Close this thread's pooled readers (e.g. at worker shutdown)."""
+    for conn in getattr(_local, "pool", {}).values():
+        conn.close()
+    _local.pool = {}
+
+
+# -------------------------------------------------------------------
+# Rank-preserving bulk fetches
+# -------------------------------------------------------------------
+def _bucket(n: int) -> int:
+    """Round placeholder counts up to a power of two so statements are reused."""
+    b = 8
+    while b < n:
+        b *= 2
+    return min(b, MAX_VARS)
+
+
+def fetch_by_ids(table: str, columns: Sequence[str], ids: Iterable[int],
+                 id_col: str = "id", conn: Optional[sqlite3.Connection] = None) -> List[Tuple]:
+    """
+    Rows of `table` for `ids`, returned in the caller's order (ids not found
+    are skipped, duplicates collapsed). Each row is (id, *columns).
+    """
+    ids = list(dict.fromkeys(int(i) for i in ids))
+    if not ids:
+        return []
+    conn = conn or read_conn()
+    select = ", ".join(columns)
+    found = {}
+    for start in range(0, len(ids), MAX_VARS):
+        chunk = ids[start:start + MAX_VARS]
+        size = _bucket(len(chunk))
+        params = chunk + [chunk[-1]] * (size - len(chunk))
+        rows = conn.execute(
+            f"SELECT {id_col}, {select} FROM {table} WHERE {id_col} IN ({','.join('?' * size)})",
+            params,
+        )
+        for row in rows:
+            found[row[0]] = row
+    return [found[i] for i in ids if i in found]
+
+
+def fetch_recipes(ids: Iterable[int], columns: Sequence[str] = ("title", "COALESCE(text, '')", "COALESCE(tags, '')"),
+                  conn: Optional[sqlite3.Connection] = None) -> List[Tuple]:
+    """(id, title, text, tags) for `ids` in rank order."""
+    return fetch_by_ids("recipes", columns, ids, conn=conn)
+
+
+def fetch_ingredients(ids: Iterable[int], columns: Sequence[str] = ("canonical_name", "name"),
+                      conn: Optional[sqlite3.Connection] = None) -> List[Tuple]:
+    """(id, canonical_name, name) for `ids` in rank order."""
+    return fetch_by_ids("ingredients", columns, ids, conn=conn)
@@ -1,13 +1,24 @@
 # backend/utils/nutrition.py
 import sqlite3
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from backend.utils.db import read_conn
+
+# pandas is imported inside the functions that use it (as in text_norm):
+# backend.rag.embeddings imports this module on the API start-up path.
+if TYPE_CHECKING:
+    import pandas as pd
 
 CAL_ID = 1008  # USDA nutrient id for Energy (kcal)
 PROT_ID = 1003
 FAT_ID  = 1004
 CARB_ID = 1005
 
-def get_db(path="recipes.sqlite"):
-    return sqlite3.connect(path)
+def get_db(path=None):
+    """This thread's pooled read-only connection (shared; do not close)."""
+    return read_conn(path)
 
 def nutrition_for_ingredient(conn, canonical_name: str) -> dict | None:
     cur = conn.cursor()
@@ -33,15 +44,250 @@ def nutrition_for_ingredient(conn, canonical_name: str) -> dict | None:
     return out
 
 def macros_kcal(conn, canonical_name: str) -> dict | None:
-    n = nutrition_for_ingredient(conn, canonical_name)
+    n = get_nutrient_matrix(conn).per_100g(canonical_name)
     if not n:
         return None
-    def g(nut_id):
-        d = n.get(nut_id, {})
-        return d.get("per_100g", 0.0)
     return {
-        "kcal_per_100g": n.get(CAL_ID, {}).get("per_100g", 0.0),
-        "protein_g_per_100g": g(PROT_ID),
-        "fat_g_per_100g": g(FAT_ID),
-        "carb_g_per_100g": g(CARB_ID),
+        "kcal_per_100g": n["kcal"],
+        "protein_g_per_100g": n["protein_g"],
+        "fat_g_per_100g": n["fat_g"],
+        "carb_g_per_100g": n["carb_g"],
     }
+
+# -------------------------------------------------------------------
+# Dense nutrient matrix engine
+# -------------------------------------------------------------------
+TRACKED = (CAL_ID, PROT_ID, FAT_ID, CARB_ID)
+MACRO_KEYS = ("kcal", "protein_g", "fat_g", "carb_g")
+
+# Rough grams per unit; recipe_ingredients has no parsed quantities, so
+# these turn "1 1/2 c. sugar" into an estimate good enough for filtering.
+UNIT_GRAMS = {
+    "g": 1, "gram": 1, "grams": 1, "kg": 1000, "mg": 0.001,
+    "ml": 1, "l": 1000, "liter": 1000, "liters": 1000,
+    "oz": 28.35, "ounce": 28.35, "ounces": 28.35,
+    "lb": 453.6, "lbs": 453.6, "pound": 453.6, "pounds": 453.6,
+    "c": 240, "cup": 240, "cups": 240,
+    "tbsp": 15, "tablespoon": 15, "tablespoons": 15, "tbs": 15,
+    "tsp": 5, "teaspoon": 5, "teaspoons": 5, "t": 5,  # RecipeNLG "t." / "t" = teaspoon
+    "pt": 473, "pint": 473, "qt": 946, "quart": 946,
+    "stick": 113, "sticks": 113, "can": 400, "cans": 400,
+    "pkg": 250, "package": 250, "packages": 250, "clove": 5, "cloves": 5,
+}
+PIECE_GRAMS = 50.0    # "2 eggs", "1 onion"
+DEFAULT_GRAMS = 15.0  # no quantity at all ("salt", "pepper to taste")
+
+QTY_RE = (r"^\s*(?:(?:(?P<whole>\d+)\s+)?(?P<num>\d+)/(?P<den>\d+)|(?P<dec>\d+(?:\.\d+)?))?"
+          r"\s*(?P<unit>[A-Za-z]+)?")
+
+
+def estimate_grams(raw_lines) -> np.ndarray:
+    """Vectorized gram estimate per raw ingredient line (quantity x unit weight)."""
+    import pandas as pd
+
+    s = pd.Series(list(raw_lines), dtype=object).fillna("").astype(str)
+    if s.empty:
+        return np.empty(0, dtype=np.float32)
+    m = s.str.extract(QTY_RE)
+    den = pd.to_numeric(m["den"], errors="coerce").replace(0, np.nan)
+    frac = pd.to_numeric(m["whole"], errors="coerce").fillna(0) + pd.to_numeric(m["num"], errors="coerce") / den
+    qty = pd.to_numeric(m["dec"], errors="coerce").fillna(frac).fillna(0).to_numpy()
+    unit = m["unit"].where(m["unit"] != "T", "tbsp").str.lower()  # "T" tablespoon, "t" teaspoon
+    unit_g = unit.map(UNIT_GRAMS).to_numpy(dtype=np.float64, na_value=np.nan)
+    grams = np.where(np.isnan(unit_g), qty * PIECE_GRAMS, qty * unit_g)
+    return np.where(qty > 0, grams, DEFAULT_GRAMS).astype(np.float32)
+
+
+class NutrientMatrix:
+    """
+    ingredient_nutrients loaded once into a dense float32 matrix
+    (ingredients x TRACKED nutrients, per 100 g) with id and
+    canonical-name row indexes, so nutrition for any number of
+    ingredients or recipes is a gather plus a dot over gram quantities.
+    """
+
+    def __init__(self, ingredient_ids: np.ndarray, names: list[str], matrix: np.ndarray,
+                 has_data: np.ndarray | None = None):
+        self.ingredient_ids = np.asarray(ingredient_ids, dtype=np.int64)  # sorted
+        self.matrix = np.asarray(matrix, dtype=np.float32)
+        # rows with any ingredient_nutrients entry (tracked or not)
+        self.has_data = (np.ones(len(self.ingredient_ids), dtype=bool) if has_data is None
+                         else np.asarray(has_data, dtype=bool))
+        self.name_rows = {}
+        for row, name in enumerate(names):
+            self.name_rows.setdefault(name, row)
+
+    def __len__(self) -> int:
+        return len(self.ingredient_ids)
+
+    @classmethod
+    def from_db(cls, conn: sqlite3.Connection) -> "NutrientMatrix":
+        ing = conn.execute("SELECT id, canonical_name FROM ingredients ORDER BY id").fetchall()
+        ids = np.array([r[0] for r in ing], dtype=np.int64)
+        matrix = np.zeros((len(ids), len(TRACKED)), dtype=np.float32)
+        engine = cls(ids, [r[1] for r in ing], matrix)
+
+        vals = np.array(conn.execute(f"""
+            SELECT inut.ingredient_id, n.nutrient_id, inut.amount_per_100g
+            FROM ingredient_nutrients inut
+            JOIN nutrients n ON n.id = inut.nutrient_id
+            WHERE n.nutrient_id IN ({','.join('?' * len(TRACKED))})
+        """, TRACKED).fetchall(), dtype=np.float64).reshape(-1, 3)
+        rows = engine.rows_for_ids(vals[:, 0].astype(np.int64))
+        cols = np.argmax(vals[:, 1:2] == np.array(TRACKED)[None, :], axis=1)
+        ok = rows >= 0
+        engine.matrix[rows[ok], cols[ok]] = vals[ok, 2]
+
+        with_data = np.array([r[0] for r in conn.execute(
+            "SELECT DISTINCT ingredient_id FROM ingredient_nutrients")], dtype=np.int64)
+        engine.has_data = np.zeros(len(ids), dtype=bool)
+        rows = engine.rows_for_ids(with_data)
+        engine.has_data[rows[rows >= 0]] = True
+        return engine
+
+    # ---------------------------------------------------------------
+    # Row lookup
+    # ---------------------------------------------------------------
+    def rows_for_ids(self, ingredient_ids) -> np.ndarray:
+        """Matrix rows for ingredient ids; -1 where unknown."""
+        ids = np.asarray(ingredient_ids, dtype=np.int64)
+        if len(self) == 0:
+            return np.full(ids.shape, -1, dtype=np.int64)
+        pos = np.clip(np.searchsorted(self.ingredient_ids, ids), 0, len(self) - 1)
+        return np.where(self.ingredient_ids[pos] == ids, pos, -1)
+
+    def rows_for_names(self, names) -> np.ndarray:
+        return np.array([self.name_rows.get(n, -1) for n in names], dtype=np.int64)
+
+    def rows_for_lines(self, lines: "pd.DataFrame") -> np.ndarray:
+        """Rows for recipe_ingredients lines: USDA link first, canonical name second."""
+        rows = self.rows_for_ids(lines["ingredient_id"].fillna(-1).to_numpy(dtype=np.int64))
+        miss = rows < 0
+        if miss.any():
+            rows[miss] = self.rows_for_names(lines["canonical_ingredient"].to_numpy()[miss])
+        return rows
+
+    # ---------------------------------------------------------------
+    # Computation
+    # ---------------------------------------------------------------
+    def per_100g(self, canonical_name: str) -> dict | None:
+        """Tracked macros per 100 g; None for unknown names and ingredients with no nutrient rows."""
+        row = self.name_rows.get(canonical_name)
+        if row is None or not self.has_data[row]:
+            return None
+        return dict(zip(MACRO_KEYS, self.matrix[row].tolist()))
+
+    def totals(self, rows: np.ndarray, grams: np.ndarray) -> np.ndarray:
+        """Macros (len(TRACKED),) for one ingredient list; unknown rows count as zero."""
+        rows = np.asarray(rows)
+        known = rows >= 0
+        g = np.asarray(grams, dtype=np.float32)[known] / 100.0
+        return g @ self.matrix[rows[known]]
+
+    def totals_by_group(self, groups: np.ndarray, rows: np.ndarray, grams: np.ndarray,
+                        n_groups: int) -> np.ndarray:
+        """
+        Macros for many recipes at once: `groups[i]` is the recipe position
+        (0..n_groups-1) of ingredient line i. Returns (n_groups, len(TRACKED)).
+        """
+        rows = np.asarray(rows)
+        known = rows >= 0
+        g = np.asarray(grams, dtype=np.float32)[known] / 100.0
+        contrib = self.matrix[rows[known]] * g[:, None]
+        grp = np.asarray(groups)[known]
+        return np.stack([np.bincount(grp, weights=contrib[:, j], minlength=n_groups)
+                         for j in range(len(TRACKED))], axis=1).astype(np.float32)
+
+    def lines_totals(self, lines: "pd.DataFrame", recipe_ids: np.ndarray):
+        """(totals (n, len(TRACKED)), matched line counts, total line counts) per recipe id."""
+        recipe_ids = np.asarray(recipe_ids, dtype=np.int64)
+        if len(recipe_ids) == 0:
+            return np.zeros((0, len(TRACKED)), dtype=np.float32), np.zeros(0, np.int64), np.zeros(0, np.int64)
+        order = np.argsort(recipe_ids)
+        line_ids = lines["recipe_id"].to_numpy(dtype=np.int64)
+        pos = np.clip(np.searchsorted(recipe_ids[order], line_ids), 0, len(order) - 1)
+        ours = recipe_ids[order][pos] == line_ids  # orphaned / out-of-set lines belong to no recipe
+        lines = lines[ours]
+        groups = order[pos[ours]]
+        rows = self.rows_for_lines(lines)
+        totals = self.totals_by_group(groups, rows, estimate_grams(lines["raw_ingredient"]), len(recipe_ids))
+        matched = np.bincount(groups, weights=rows >= 0, minlength=len(recipe_ids)).astype(np.int64)
+        total = np.bincount(groups, minlength=len(recipe_ids))
+        return totals, matched, total
+
+    def recipe_macros(self, conn: sqlite3.Connection, recipe_ids) -> dict[int, dict]:
+        """{recipe_id: {kcal, protein_g, fat_g, carb_g}} for the given recipes."""
+        recipe_ids = list(recipe_ids)
+        if not recipe_ids:
+            return {}
+        totals, _, _ = self.lines_totals(recipe_lines(conn, recipe_ids), recipe_ids)
+        return {rid: dict(zip(MACRO_KEYS, t.tolist())) for rid, t in zip(recipe_ids, totals)}
+
+
+def recipe_lines(conn, recipe_ids=None, id_range=None) -> "pd.DataFrame":
+    """recipe_ingredients rows for some recipes (or an inclusive id range)."""
+    import pandas as pd
+
+    cols = {r[1] for r in conn.execute("PRAGMA table_info(recipe_ingredients)")}
+    link = "ingredient_id" if "ingredient_id" in cols else "NULL AS ingredient_id"
+    q = f"SELECT recipe_id, raw_ingredient, canonical_ingredient, {link} FROM recipe_ingredients"
+    if id_range is not None:
+        return pd.read_sql_query(q + " WHERE recipe_id BETWEEN ? AND ?", conn, params=list(id_range))
+    if recipe_ids is not None:
+        q += f" WHERE recipe_id IN ({','.join('?' * len(recipe_ids))})"
+        return pd.read_sql_query(q, conn, params=list(recipe_ids))
+    return pd.read_sql_query(q, conn)
+
+
+_ENGINES: dict[str, NutrientMatrix] = {}
+
+
+def _db_path(conn: sqlite3.Connection) -> str:
+    """File behind `conn`'s main database ("" for in-memory)."""
+    for _, name, path in conn.execute("PRAGMA database_list"):
+        if name == "main":
+            return path or ""
+    return ""
+
+
+def get_nutrient_matrix(conn: sqlite3.Connection) -> NutrientMatrix:
+    """Process-wide NutrientMatrix per database file, loaded from `conn` on first use."""
+    path = _db_path(conn)
+    engine = _ENGINES.get(path) if path else None
+    if engine is None:
+        engine = NutrientMatrix.from_db(conn)
+        if path:  # an in-memory database is private to its connection: never shared
+            _ENGINES[path] = engine
+    return engine
+
+
+def reset_nutrient_matrix():
+    """Drop the loaded matrices; the next call reloads (after nutrition data changes)."""
+    _ENGINES.clear()
+
+
+def build_recipe_nutrition(conn: sqlite3.Connection, chunk: int = 50_000) -> int:
+    """Materialize recipe_nutrition (per-recipe macro estimates) for fast filtering."""
+    reset_nutrient_matrix()
+    engine = NutrientMatrix.from_db(conn)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS recipe_nutrition (
+          recipe_id INTEGER PRIMARY KEY,
+          kcal REAL, protein_g REAL, fat_g REAL, carb_g REAL,
+          matched_lines INTEGER, total_lines INTEGER,
+          FOREIGN KEY (recipe_id) REFERENCES recipes(id)
+        )
+    """)
+    all_ids = np.array([r[0] for r in conn.execute("SELECT id FROM recipes ORDER BY id")], dtype=np.int64)
+    for i in range(0, len(all_ids), chunk):
+        ids = all_ids[i:i + chunk]
+        lines = recipe_lines(conn, id_range=(int(ids[0]), int(ids[-1])))
+        totals, matched, total = engine.lines_totals(lines, ids)
+        with conn:
+            conn.executemany("""
+              INSERT OR REPLACE INTO recipe_nutrition
+                (recipe_id, kcal, protein_g, fat_g, carb_g, matched_lines, total_lines)
+              VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [(int(r), *map(float, t), int(m), int(n))
+                  for r, t, m, n in zip(ids, totals, matched, total)])
+    return len(all_ids)
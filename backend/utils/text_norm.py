@@ -1,6 +1,12 @@
 # backend/utils/text_norm.py
+import os
 import re
-from rapidfuzz import process, fuzz
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Iterable
+
+# pandas and rapidfuzz are imported inside the functions that use them: the
+# serving path only needs TOKEN_RE, and API start-up time matters.
 
 STOPWORDS = {"fresh", "chopped", "sliced", "diced", "ground", "minced",
              "large", "small", "medium", "organic", "ripe", "skinless",
@@ -17,7 +23,63 @@ def canonicalize_name(name: str) -> str:
     return " ".join(tokens).strip()
 
 def fuzzy_match(query: str, choices: list[str], score_cutoff: int = 88) -> str | None:
+    from rapidfuzz import process, fuzz
+
     if not choices:
         return None
     match, score, _ = process.extractOne(query, choices, scorer=fuzz.WRatio)
     return match if score >= score_cutoff else None
+
+# -------------------------------------------------------------------
+# Batch canonicalization
+# -------------------------------------------------------------------
+CANON_CACHE_SIZE = 1 << 20
+_DROP_TOKENS = frozenset(STOPWORDS | UNIT_WORDS)
+
+_canonicalize_cached = lru_cache(maxsize=CANON_CACHE_SIZE)(canonicalize_name)
+
+
+def _canonicalize_pandas(names: list[str]) -> list[str]:
+    """canonicalize_name as a pandas string pipeline over distinct names."""
+    import pandas as pd
+
+    s = pd.Series(names, dtype=object)
+    toks = s.str.lower().str.findall(TOKEN_RE).explode()
+    toks = toks[toks.notna() & ~toks.isin(_DROP_TOKENS)]
+    joined = toks.groupby(level=0, sort=False).agg(" ".join)
+    return joined.reindex(s.index, fill_value="").tolist()
+
+
+def _canonicalize_chunk(names: list[str]) -> list[str]:
+    return [canonicalize_name(n) for n in names]
+
+
+def canonicalize_many(names: Iterable[str], method: str = "auto", workers: int | None = None) -> list[str]:
+    """
+    canonicalize_name over many inputs, same output, one entry per input.
+    Inputs are deduplicated first; `method` picks how the distinct names
+    are processed: "cached" (bounded LRU shared across calls), "pandas"
+    (vectorized string ops) or "process" (process pool). "auto" uses the
+    cache for small batches and a process pool for very large ones.
+    """
+    values = names if isinstance(names, list) else list(names)
+    uniq = list(dict.fromkeys(values))
+    if method == "auto":
+        method = "process" if len(uniq) >= 500_000 and (workers or os.cpu_count() or 1) > 1 else "cached"
+
+    if method == "cached":
+        out = [_canonicalize_cached(n) for n in uniq]
+    elif method == "pandas":
+        out = _canonicalize_pandas(uniq)
+    elif method == "process":
+        size = max(1, len(uniq) // ((workers or os.cpu_count() or 1) * 4))
+        chunks = [uniq[i:i + size] for i in range(0, len(uniq), size)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            out = [c for part in pool.map(_canonicalize_chunk, chunks) for c in part]
+    else:
+        raise ValueError(f"Unknown canonicalization method: {method}")
+
+    if len(uniq) == len(values):
+        return out
+    canon = dict(zip(uniq, out))
+    return [canon[v] for v in values]
@@ -1,13 +1,29 @@
 import streamlit as st
 import requests
+import json
 import re
 
 # ==== CONFIG ====
 API_BASE = "http://localhost:8000"  # Your FastAPI host
 GENERATE_ENDPOINT = f"{API_BASE}/generate_recipe"
+STREAM_ENDPOINT = f"{API_BASE}/generate_recipe/stream"
 
 st.set_page_config(page_title="Nutrition & Recipe Guide", page_icon="🍎", layout="wide")
 
+
+def stream_events(payload):
+    """Yield (event, data) pairs from the SSE stream endpoint."""
+    with requests.post(STREAM_ENDPOINT, json=payload, stream=True, timeout=(5, 120)) as res:
+        if res.status_code != 200:
+            yield "error", {"detail": f"{res.status_code} {res.text}"}
+            return
+        event = "message"
+        for line in res.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                yield event, json.loads(line[len("data: "):])
+
 # ==== SESSION STATE ====
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -25,7 +41,7 @@ Ask me about:
 with st.sidebar:
     st.header("Your Preferences")
     calories = st.number_input("Calories (max)", min_value=0, step=50)
-    diet = st.text_input("Diet type (e.g., vegan, keto, vegetarian)")
+    diet = st.text_input("Diet type (e.g., vegan, vegetarian, gluten-free)")
     allergens = st.text_input("Allergens to avoid (comma-separated)")
 
 # ==== CHAT DISPLAY ====
@@ -46,25 +62,36 @@ if prompt := st.chat_input("What meal or recipe would you like guidance on?"):
     # Parse allergens into a list
     allergen_list = [a.strip() for a in allergens.split(",") if a.strip()]
 
-    # Call API
-    try:
-        payload = {
-            "query": prompt,
-            "calories": calories if calories > 0 else None,
-            "diet": diet if diet else None,
-            "allergens": allergen_list,
-            "k_ing": 15,
-            "k_rec": 8
-        }
-        res = requests.post(GENERATE_ENDPOINT, json=payload)
-        if res.status_code == 200:
-            bot_reply = res.json()
-            bot_text = bot_reply.get("generated_text", str(bot_reply))
-        else:
-            bot_text = f"⚠ Error: {res.status_code} {res.text}"
-    except Exception as e:
-        bot_text = f"⚠ Exception: {e}"
+    # Call API, rendering text as it streams in
+    payload = {
+        "query": prompt,
+        "calories": calories if calories > 0 else None,
+        "diet": diet if diet else None,
+        "allergens": allergen_list,
+        "k_ing": 15,
+        "k_rec": 8
+    }
+    with st.chat_message("assistant"):
+        status = st.empty()
+        status.caption("Searching recipes…")
+        errors = []
+
+        def text_chunks():
+            try:
+                for event, data in stream_events(payload):
+                    if event == "meta":
+                        status.caption(f"Found {len(data.get('retrieved_recipe_ids', []))} related recipes")
+                    elif event == "chunk":
+                        yield data["text"]
+                    elif event == "error":
+                        errors.append(f"⚠ Error: {data.get('detail')}")
+            except Exception as e:
+                errors.append(f"⚠ Exception: {e}")
+
+        bot_text = st.write_stream(text_chunks()) or ""
+        if errors:
+            st.markdown(errors[0])
+            bot_text = f"{bot_text}\n\n{errors[0]}".strip()
 
     # Append bot reply
     st.session_state.messages.append({"role": "assistant", "content": bot_text})
-    st.chat_message("assistant").markdown(bot_text)